@@ -3,7 +3,8 @@ pragma solidity ^0.8.2;
 import "./TicketManager.sol";
 
 interface ITicketManager {
-    function setTicketInLottery(address _player, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _lotteryRound) external returns (bool);
+    function setTicketInLottery(address _player, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _lotteryRound) external returns (bool, uint256);
+    function setTicketsInLottery(address _player, uint256[] calldata _ticketIds, bytes32[] calldata _ticketHashes, bytes32[] calldata _ticketHashesWithStrong, uint256 _lotteryRound) external returns (bool, uint256[] memory);
     function markTicketAsStatus(address _player, uint256 _ticketId, TicketStatus _status) external returns (bool) ;
     function getTicketData(address _player, uint256 _ticketId) external view returns (
         uint256 id,
@@ -14,15 +15,66 @@ interface ITicketManager {
         bytes32 ticketHash,
         bytes32 ticketHashWithStrong
     );
+    function getTicketEntryState(address _player, uint256 _ticketId) external view returns (uint256 creationTimestamp, TicketStatus status);
+    function finalizeRound(uint256 _lotteryRound) external;
 }
 
 enum lotteryStatus { OPEN, CLOSED, FINALIZED }
 
+// Reference to a ticket entered in a round, packed in a single slot
+struct TicketEntry {
+    address participant;
+    uint96 ticketId;
+}
+
+// Cursor of a draw that is processed in bounded steps
+struct DrawProgress {
+    uint8 phase;              // One of the DRAW_* phases of LotteryStore
+    uint64 drawTime;          // Timestamp of the first step, used for every hold time
+    uint64 cursor;            // Next bucket entry, participant or prize credit to process
+    uint32 miniWinners;       // Mini prize winners drawn so far
+    uint64 maxWeight;         // Largest hold-time weight of the round
+    uint64 topCount;          // Participants weighing at most SOFTMAX_SPAN below maxWeight, counted by the tree pass
+    uint64 eligibleCount;     // Participants with a ticket left for the mini prize
+    uint64 phaseSlot;         // Next phase slot of the participant at cursor being weighed
+    bytes32 argsHash;         // Hash of the draw arguments pinned by the first step
+}
+
+// Mini prize tree of a draw settled in a single step, see loadDrawTally
+struct DrawTally {
+    uint256[] tree;           // Fenwick node by 1-based participant index
+    uint256 topCount;
+    uint256 eligibleCount;
+}
+
+// Winners credited by one draw step, the ticket system announces them in PrizesCredited
+struct PrizeCredits {
+    address[] smallPrizeWinners;
+    address[] bigPrizeWinners;
+    address[] miniPrizeWinners;
+}
+
+// Scalars are packed: round number, blocks, status and strong number share one slot, the prize
+// pool and ticket count updated by every entry share another, and the prizes fill two more.
+// Amounts in wei fit comfortably in 128 bits
 struct LotteryRound {
-    uint256 roundNumber;
+    uint64 roundNumber;
+    uint64 openBlock;
+    uint64 closeBlock;
+    lotteryStatus status;
+    uint8 strongNumber;
 
+    uint128 totalPrizePool;
+    uint64 totalTickets;
+    uint64 phaseSlots;        // Slots of packed ticket phases over all participants, see recordEntry
+
+    uint128 smallPrize;
+    uint128 bigPrize;
+    uint128 miniPrize;
+    uint128 commission;
+
+    uint8[6] randomNumbers;
 
-    uint256 totalPrizePool;
     address[] participants;
     mapping(address => uint256[]) participantTickets; // Store ticket IDs for each participant
 
@@ -30,62 +82,150 @@ struct LotteryRound {
     address[] bigPrizeWinners;    // Winners of big prize
     address[] miniPrizeWinners;
 
-    lotteryStatus status;
-
-    uint256 openBlock;
-    uint256 closeBlock;
+    // Tickets bucketed by hash so the draw only touches the matching ones
+    mapping(bytes32 => TicketEntry[]) numbersBuckets;  // ticketHash => tickets
+    mapping(bytes32 => TicketEntry[]) strongBuckets;   // ticketHashWithStrong => tickets
 
-    uint256 smallPrize;
-    uint256 bigPrize;
-    uint256 miniPrize;
+    // Per participant data the mini prize weighs participants by, see participantWeight
+    mapping(address => uint256) participantHourSums;      // Sum of the creation hours (timestamp / 1 hours) of its tickets
+    mapping(address => mapping(uint256 => uint256)) participantPhases; // Seconds past the hour of each ticket's creation, 16 to a slot
+    mapping(address => uint256) participantWins;          // Tickets of the participant that won a prize
 
-    uint256 commission;
+    // Mini prize tree of a draw that spans several steps, see processMiniPrizeTree
+    mapping(uint256 => uint256) drawWeights;              // Participant index => weight, Fenwick node above it
 
-    uint256 totalTickets;
+    // Resumable draw state, the draw may be split over several transactions
+    DrawProgress drawProgress;
+}
 
-    uint8[6] randomNumbers;
-    uint8 strongNumber;
+// Lottery operations the ticket system drives. LotteryStore implements them in place, a ticket
+// system fronting a separate LotteryManager forwards them as external calls
+abstract contract LotteryOperations {
+    uint256 internal constant SMALL_PRIZE_PERCENTAGE = 30; //prize pool for small prize the rest if for the big (80%)
+    uint256 internal constant FLEX_COMMISSION = 5;       // commission for owner
+    uint256 internal constant MINI_PRIZE_PERCENTAGE = 10; //mini prize
+
+    function openNextRound() internal virtual returns (uint256);
+    function closeRound() internal virtual;
+    function roundCanClose() internal view virtual returns (bool);
+    function roundIsActive() internal view virtual returns (bool);
+    function roundBlockStatus() internal view virtual returns (uint256 blocksUntilClose, uint256 blocksUntilDraw);
+    function enterRound(address _participant, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _ticketPrice)
+        internal virtual returns (bool);
+    function enterRoundBatch(
+        address _participant,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _ticketPrice
+    ) internal virtual returns (bool);
+    function drawRoundStep(
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber,
+        uint256 maxTickets
+    ) internal virtual returns (bool finalized, PrizeCredits memory credits);
+    function roundInfo(uint256 _index) internal view virtual returns (
+        uint256 roundNumber,
+        uint256 totalPrizePool,
+        address[][] memory addressArrays,
+        lotteryStatus status,
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint256 totalTickets,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    );
+    function currentRoundWinners() internal view virtual returns (
+        address[] memory smallPrizeWinners,
+        address[] memory bigPrizeWinners,
+        address[] memory miniPrizeWinners
+    );
+    // Prizes and drawn numbers of a round, without its participant and winner lists
+    function roundDraw(uint256 _index) internal view virtual returns (
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    );
+    function roundParticipantPage(uint256 _index, uint256 _offset, uint256 _limit)
+        internal view virtual returns (address[] memory participants, uint256 total);
+    function currentRoundNumber() internal view virtual returns (uint256);
+    function currentRoundPrizePool() internal view virtual returns (uint256);
+    function currentRoundTotalTickets() internal view virtual returns (uint256);
+    function blocksWait() internal view virtual returns (uint256, uint256);
+    function changeBlocksWait(uint256 _blocksToClose, uint256 _blocksToDraw) internal virtual;
+    function miniPrizeWinnerCount() internal view virtual returns (uint256);
+    function changeMiniPrizeWinners(uint256 _winners) internal virtual;
+    function claimPendingPrize(address winner) internal virtual returns (uint256);
+    function pendingPrizeOf(address winner) internal view virtual returns (uint256);
 }
 
-contract LotteryManager {
+// Round storage and draw logic, shared by LotteryManager and the single-contract UnifiedTicketSystem.
+// Tickets are reached through the TicketRoundOperations hooks
+abstract contract LotteryStore is TicketRoundOperations, LotteryOperations {
     mapping(uint256 => LotteryRound) private lotteryRounds;
     uint256 private currentLotteryRound;
-    address private immutable i_owner;
+    address private immutable i_commissionRecipient; // Credited with the commission of every round
     bool private activeRound;
-    ITicketManager private ticketManager;
 
-    uint256 private constant SCALE_FACTOR = 1e18;
     uint256 private BLOCKS_TO_WAIT_fOR_CLOSE = 4;
     uint256 private BLOCKS_TO_WAIT_fOR_DRAW = 1;
+    uint256 private MINI_PRIZE_WINNERS = 1;
+
+    // Phases of a draw, see drawRoundStep
+    uint8 private constant DRAW_NOT_STARTED = 0;
+    uint8 private constant DRAW_BIG_WINNERS = 1;
+    uint8 private constant DRAW_SMALL_WINNERS = 2;
+    uint8 private constant DRAW_MINI_WEIGHTS = 3;
+    uint8 private constant DRAW_MINI_TREE = 4;
+    uint8 private constant DRAW_MINI_WINNERS = 5;
+    uint8 private constant DRAW_SETTLE = 6;
+    uint8 private constant DRAW_PAYOUT = 7;
+    uint8 private constant DRAW_DONE = 8;
 
-    uint256 private constant SMALL_PRIZE_PERCENTAGE = 30; //prize pool for small prize the rest if for the big (80%)
-    uint256 private constant FLEX_COMMISSION = 5;       // commission for owner
-    uint256 private constant MINI_PRIZE_PERCENTAGE = 10; //mini prize
+    uint256 private constant SCALE_FACTOR = 1e18;
+    uint256 private constant PHASES_PER_SLOT = 16; // Ticket phases (seconds past the hour) packed in a slot, 16 bits each
+    uint256 private constant SOFTMAX_SPAN = 10; // Weights further below the maximum count as 1 in the softmax
+    uint256 private constant NODE_ELIGIBLE = 1 << 64; // A tree node counts eligible participants above its top class ones
+    uint256 private constant NODE_SHIFT = 128; // Stored tree nodes sit above the weights in drawWeights
 
     // Mapping to store pending prizes for winners (address => prize amount)
     mapping(address => uint256) private pendingPrizes;
 
-    constructor(address _ticketManagerAddress) 
+    constructor(address _commissionRecipient)
     {
-        i_owner = tx.origin;
+        i_commissionRecipient = _commissionRecipient;
         activeRound = false;
-        ticketManager = ITicketManager(_ticketManagerAddress);
-        startNewLotteryRound();
+        openNextRound();
     }
-    function getMINI_PRIZE_PERCENTAGE() external pure returns (uint256) {
-        return MINI_PRIZE_PERCENTAGE;
+
+    function blocksWait() internal view override returns (uint256, uint256) {
+        return (BLOCKS_TO_WAIT_fOR_CLOSE, BLOCKS_TO_WAIT_fOR_DRAW);
     }
-    function getSMALL_PRIZE_PERCENTAGE() external pure returns (uint256) {
-        return SMALL_PRIZE_PERCENTAGE;
+
+    function changeBlocksWait(uint256 _blocksToClose, uint256 _blocksToDraw) internal override {
+        require(_blocksToClose > 0 && _blocksToDraw > 0, "Block waits must be positive");
+        BLOCKS_TO_WAIT_fOR_CLOSE = _blocksToClose;
+        BLOCKS_TO_WAIT_fOR_DRAW = _blocksToDraw;
     }
-    function getFLEX_COMMISSION() external pure returns (uint256) {
-        return FLEX_COMMISSION;
+
+    function miniPrizeWinnerCount() internal view override returns (uint256) {
+        return MINI_PRIZE_WINNERS;
     }
-    function getBlocksWait() external view returns (uint256, uint256) {
-        return (BLOCKS_TO_WAIT_fOR_CLOSE, BLOCKS_TO_WAIT_fOR_DRAW);
+
+    // Number of mini prize draws, the prize is split evenly between the participants drawn
+    function changeMiniPrizeWinners(uint256 _winners) internal override {
+        require(_winners > 0, "Mini prize needs at least one winner");
+        MINI_PRIZE_WINNERS = _winners;
     }
 
-  function getLotteryBlockStatus() external view returns (
+    function roundBlockStatus() internal view override returns (
         uint256 blocksUntilClose,
         uint256 blocksUntilDraw
     ) {
@@ -108,26 +248,26 @@ contract LotteryManager {
             return ( blocksUntilClose, blocksUntilDraw);
     }
     
-    function canCloseLottery () public view returns (bool) {
+    function roundCanClose() internal view override returns (bool) {
         LotteryRound storage round = lotteryRounds[currentLotteryRound];
         return round.openBlock + BLOCKS_TO_WAIT_fOR_CLOSE < block.number;
     }
 
-    function canDrawWinner() public view returns (bool) {
+    function roundCanDraw() internal view returns (bool) {
         LotteryRound storage round = lotteryRounds[currentLotteryRound];
         return round.closeBlock + BLOCKS_TO_WAIT_fOR_DRAW < block.number;
     }
 
-    function closeLotteryRound() external {
+    function closeRound() internal override {
         LotteryRound storage round = lotteryRounds[currentLotteryRound];
         require(round.status == lotteryStatus.OPEN, "Current lottery round is not open");
-        require(canCloseLottery (), "Wait for some time to close the lottery round");
+        require(roundCanClose(), "Wait for some time to close the lottery round");
         round.status = lotteryStatus.CLOSED;
-        round.closeBlock = block.number;
+        round.closeBlock = uint64(block.number);
         activeRound = false;
     }
 
-    function startNewLotteryRound() public returns (uint256) {
+    function openNextRound() internal override returns (uint256) {
         require(!activeRound, "There is a lottery active");
 
         LotteryRound storage currentRound = lotteryRounds[currentLotteryRound];
@@ -136,7 +276,7 @@ contract LotteryManager {
         currentLotteryRound++;
 
         LotteryRound storage newRound = lotteryRounds[currentLotteryRound];
-        newRound.roundNumber = currentLotteryRound;
+        newRound.roundNumber = uint64(currentLotteryRound);
         newRound.totalPrizePool = 0;
         // newRound.smallPrizeWinners = [];
         // newRound.bigPrizeWinners = [];
@@ -144,103 +284,547 @@ contract LotteryManager {
         
         activeRound = true;
 
-        newRound.openBlock = block.number;
+        newRound.openBlock = uint64(block.number);
         newRound.closeBlock = 0 ;
         return currentLotteryRound;
     }
 
-    function addParticipantAndPrizePool(address _participant, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong ,uint256 _ticketPrice) external returns (bool) {
+    function enterRound(address _participant, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong ,uint256 _ticketPrice) internal override returns (bool) {
         LotteryRound storage round = lotteryRounds[currentLotteryRound];
 
         require(round.status == lotteryStatus.OPEN, "Current lottery round is closed");
         
         // Set ticket status to IN_LOTTERY
-        require(ticketManager.setTicketInLottery(_participant, _ticketId, _ticketHash, _ticketHashWithStrong ,currentLotteryRound), 
-                "Failed to set ticket status");
+        (bool entered, uint256 creationTimestamp) =
+            enterTicket(_participant, _ticketId, _ticketHash, _ticketHashWithStrong ,currentLotteryRound);
+        require(entered, "Failed to set ticket status");
 
         // Add participant if first ticket
         if (round.participantTickets[_participant].length == 0) {
             round.participants.push(_participant);
         }
         
-        round.participantTickets[_participant].push(_ticketId);
-        round.totalPrizePool += _ticketPrice;
+        recordEntry(round, _participant, _ticketId, _ticketHash, _ticketHashWithStrong, creationTimestamp);
+
+        round.totalPrizePool += uint128(_ticketPrice);
         round.totalTickets += 1;
         return true;
     }
 
-    // Calculate softmax weights based on ticket holding time with reduced stack depth
-    function calculateSoftmaxWeights(LotteryRound storage round) private view returns (uint256[] memory) {
+    // Enter several tickets of one participant with a single call into the ticket store
+    function enterRoundBatch(
+        address _participant,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _ticketPrice
+    ) internal override returns (bool) {
+        LotteryRound storage round = lotteryRounds[currentLotteryRound];
+
+        require(round.status == lotteryStatus.OPEN, "Current lottery round is closed");
+
+        // Set ticket statuses to IN_LOTTERY
+        (bool entered, uint256[] memory creationTimestamps) =
+            enterTickets(_participant, _ticketIds, _ticketHashes, _ticketHashesWithStrong, currentLotteryRound);
+        require(entered, "Failed to set ticket status");
+
+        // Add participant if first ticket
+        if (round.participantTickets[_participant].length == 0) {
+            round.participants.push(_participant);
+        }
+
+        uint256 count = _ticketIds.length;
+        for (uint256 i = 0; i < count; i++) {
+            recordEntry(round, _participant, _ticketIds[i], _ticketHashes[i], _ticketHashesWithStrong[i], creationTimestamps[i]);
+        }
+
+        round.totalPrizePool += uint128(_ticketPrice * count);
+        round.totalTickets += uint64(count);
+        return true;
+    }
+
+    // Store the ticket under its participant and in the hash buckets, and split its creation time
+    // into the participant's sum of creation hours and the ticket's phase past the hour, packed
+    // with the phases of its other tickets. The mini prize weight is derived from both
+    function recordEntry(
+        LotteryRound storage round,
+        address _participant,
+        uint256 _ticketId,
+        bytes32 _ticketHash,
+        bytes32 _ticketHashWithStrong,
+        uint256 _creationTimestamp
+    ) private {
+        uint256 ticketIndex = round.participantTickets[_participant].length;
+        round.participantTickets[_participant].push(_ticketId);
+
+        TicketEntry memory entry = TicketEntry({ participant: _participant, ticketId: uint96(_ticketId) });
+        round.numbersBuckets[_ticketHash].push(entry);
+        round.strongBuckets[_ticketHashWithStrong].push(entry);
+
+        round.participantHourSums[_participant] += _creationTimestamp / 1 hours;
+        round.participantPhases[_participant][ticketIndex / PHASES_PER_SLOT] |=
+            (_creationTimestamp % 1 hours) << (16 * (ticketIndex % PHASES_PER_SLOT));
+        if (ticketIndex % PHASES_PER_SLOT == 0) {
+            round.phaseSlots++;
+        }
+    }
+
+    // Start the draw of a closed round, or check that a resumed draw keeps its hashes and numbers
+    function beginDraw(
+        LotteryRound storage round,
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) private returns (DrawProgress storage progress) {
+        progress = round.drawProgress;
+        bytes32 argsHash = keccak256(abi.encode(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber));
+        if (progress.phase == DRAW_NOT_STARTED) {
+            round.randomNumbers = randomNumbers;
+            round.strongNumber = strongNumber;
+            progress.argsHash = argsHash;
+            // Hold times are measured against the first step so every slice weighs tickets alike
+            progress.drawTime = uint64(block.timestamp);
+            progress.phase = DRAW_BIG_WINNERS;
+        } else {
+            require(progress.phase != DRAW_DONE, "Lottery round already finalized");
+            require(progress.argsHash == argsHash, "Draw already started with other arguments");
+        }
+    }
+
+    // Walk at most `budget` entries of a hash bucket from the cursor, crediting the tickets
+    // still IN_LOTTERY with `prize`, and move on to `nextPhase` once the bucket is exhausted
+    function processBucketWinners(
+        LotteryRound storage round,
+        DrawProgress storage progress,
+        TicketEntry[] storage entries,
+        address[] storage winners,
+        TicketStatus prize,
+        uint8 nextPhase,
+        uint256 budget
+    ) private returns (uint256) {
+        uint256 cursor = progress.cursor;
+        uint256 end = entries.length - cursor > budget ? cursor + budget : entries.length;
+
+        for (uint256 i = cursor; i < end; i++) {
+            TicketEntry memory entry = entries[i];
+            // A ticket matching both hashes already won the big prize
+            (, TicketStatus status) = ticketEntryState(entry.participant, entry.ticketId);
+            if (status == TicketStatus.IN_LOTTERY) {
+                winners.push(entry.participant);
+                round.participantWins[entry.participant]++;
+                markTicket(entry.participant, entry.ticketId, prize);
+            }
+        }
+
+        if (end == entries.length) {
+            progress.phase = nextPhase;
+            progress.cursor = 0;
+        } else {
+            progress.cursor = uint64(end);
+        }
+        return budget - (end - cursor);
+    }
+
+    // Hold-time weight of a participant: 1 + the whole hours each of its tickets was held. A ticket
+    // created at t was held drawTime / 1 hours - t / 1 hours whole hours, one less when t is further
+    // past its hour than drawTime, so the weight comes from the sum of creation hours and a pass
+    // over the packed phases. The participant is eligible for the mini prize while one of its
+    // tickets won no prize
+    function participantWeight(LotteryRound storage round, address participant, uint256 drawTime)
+        private
+        view
+        returns (uint256 weight, bool eligible)
+    {
+        uint256 ticketCount = round.participantTickets[participant].length;
+        uint256 late = countLatePhases(round, participant, 0, phaseSlotCount(ticketCount), ticketCount, drawTime);
+        weight = holdTimeWeight(round, participant, ticketCount, late, drawTime);
+        eligible = ticketCount > round.participantWins[participant];
+    }
+
+    function holdTimeWeight(LotteryRound storage round, address participant, uint256 ticketCount, uint256 late, uint256 drawTime)
+        private
+        view
+        returns (uint256)
+    {
+        return 1 + ticketCount * (drawTime / 1 hours) - round.participantHourSums[participant] - late;
+    }
+
+    function phaseSlotCount(uint256 ticketCount) private pure returns (uint256) {
+        return (ticketCount + PHASES_PER_SLOT - 1) / PHASES_PER_SLOT;
+    }
+
+    // Tickets of the participant in phase slots [fromSlot, toSlot) created further past the hour
+    // than drawTime
+    function countLatePhases(
+        LotteryRound storage round,
+        address participant,
+        uint256 fromSlot,
+        uint256 toSlot,
+        uint256 ticketCount,
+        uint256 drawTime
+    ) private view returns (uint256 late) {
+        uint256 drawPhase = drawTime % 1 hours;
+        for (uint256 slot = fromSlot; slot < toSlot; slot++) {
+            uint256 phases = round.participantPhases[participant][slot];
+            uint256 lanes = ticketCount - slot * PHASES_PER_SLOT;
+            if (lanes > PHASES_PER_SLOT) {
+                lanes = PHASES_PER_SLOT;
+            }
+            for (uint256 lane = 0; lane < lanes; lane++) {
+                if (((phases >> (16 * lane)) & 0xffff) > drawPhase) {
+                    late++;
+                }
+            }
+        }
+    }
+
+    // Store the weights of the participants for a draw that spans several steps, reading at most
+    // `budget` phase slots. A participant whose slots do not fit is resumed from phaseSlot by the
+    // next step, its late tickets counted so far kept in its drawWeights entry. An eligible
+    // participant's entry already counts it in its tree node, see processMiniPrizeTree
+    function processMiniPrizeWeights(
+        LotteryRound storage round,
+        DrawProgress storage progress,
+        uint256 budget
+    ) private returns (uint256) {
         uint256 participantCount = round.participants.length;
-        if (participantCount == 0) return new uint256[](0);
-        
-        uint256[] memory weights = new uint256[](participantCount);
-        
-        // First calculate raw weights
-        calculateRawWeights(weights,round);
-        
-        // Then apply softmax transformation
-        applySoftmaxTransformation(weights);
-        
-        return weights;
+        uint256 cursor = progress.cursor;
+        uint256 slot = progress.phaseSlot;
+        uint256 maxWeight = progress.maxWeight;
+        uint256 eligibleCount = progress.eligibleCount;
+
+        while (cursor < participantCount && budget > 0) {
+            address participant = round.participants[cursor];
+            uint256 ticketCount = round.participantTickets[participant].length;
+            uint256 slots = phaseSlotCount(ticketCount);
+            uint256 end = slots - slot > budget ? slot + budget : slots;
+            uint256 late = (slot == 0 ? 0 : round.drawWeights[cursor])
+                + countLatePhases(round, participant, slot, end, ticketCount, progress.drawTime);
+            budget -= end - slot;
+            if (end < slots) {
+                round.drawWeights[cursor] = late;
+                slot = end;
+                break;
+            }
+
+            uint256 weight = holdTimeWeight(round, participant, ticketCount, late, progress.drawTime);
+            if (ticketCount > round.participantWins[participant]) {
+                round.drawWeights[cursor] = NODE_ELIGIBLE << NODE_SHIFT | weight;
+                eligibleCount++;
+            } else {
+                round.drawWeights[cursor] = weight;
+            }
+            if (weight > maxWeight) {
+                maxWeight = weight;
+            }
+            cursor++;
+            slot = 0;
+        }
+
+        progress.maxWeight = uint64(maxWeight);
+        progress.eligibleCount = uint64(eligibleCount);
+        progress.phaseSlot = uint64(slot);
+        if (cursor == participantCount) {
+            progress.cursor = 0;
+            progress.phase = MINI_PRIZE_WINNERS > 0 && eligibleCount > 0 ? DRAW_MINI_TREE : DRAW_SETTLE;
+        } else {
+            progress.cursor = uint64(cursor);
+        }
+        return budget;
     }
 
-    // Split function to reduce stack depth - calculate raw time-based weights
-    function calculateRawWeights(uint256[] memory weights, LotteryRound storage round) private view {
-        uint256 maxTime = block.timestamp;
-        
-        for (uint256 i = 0; i < weights.length; i++) {
-            address participant = round.participants[i];
-            weights[i] = calculateParticipantWeight(participant, maxTime, round);
+    // Build the Fenwick tree the mini prize draws descend over at most `budget` participants.
+    // Node i (1-based) covers the nodeSpan(i) participants up to index i - 1 and counts those with
+    // a ticket left in NODE_ELIGIBLE units plus those in the top softmax class. Node i is kept
+    // above the weight of participant i - 1, nodes are completed in index order and added to their
+    // parent, which comes later
+    function processMiniPrizeTree(LotteryRound storage round, DrawProgress storage progress, uint256 budget)
+        private
+        returns (uint256)
+    {
+        uint256 participantCount = round.participants.length;
+        uint256 cursor = progress.cursor;
+        uint256 end = participantCount - cursor > budget ? cursor + budget : participantCount;
+        uint256 topCount = progress.topCount;
+
+        for (uint256 i = cursor; i < end; i++) {
+            uint256 entry = round.drawWeights[i];
+            uint256 node = entry >> NODE_SHIFT;
+            if (inTopClass(entry % (1 << NODE_SHIFT), progress.maxWeight)) {
+                node++;
+                topCount++;
+            }
+            round.drawWeights[i] = node << NODE_SHIFT;
+            uint256 parent = i + 1 + nodeSpan(i + 1);
+            if (parent <= participantCount) {
+                round.drawWeights[parent - 1] += node << NODE_SHIFT;
+            }
         }
+
+        progress.topCount = uint64(topCount);
+        if (end == participantCount) {
+            progress.cursor = 0;
+            progress.phase = DRAW_MINI_WINNERS;
+        } else {
+            progress.cursor = uint64(end);
+        }
+        return budget - (end - cursor);
     }
 
-    // Calculate weight for a single participant
-    function calculateParticipantWeight(address participant, uint256 maxTime,LotteryRound storage round) private view returns (uint256) {
-        uint256[] storage ticketIds = round.participantTickets[participant];
-        uint256 totalHoldTime = 1;
-        
-        for (uint256 j = 0; j < ticketIds.length; j++) {
-            (,, uint256 creationTimestamp,,,,) = ticketManager.getTicketData(participant, ticketIds[j]);
-            totalHoldTime += (maxTime - creationTimestamp) / 1 hours;
+    // Make at most `budget` mini prize draws on the stored tree, a unit each: every draw descends
+    // the tree twice and removes a winner left without tickets, see findMiniPrizePosition
+    function processMiniPrizeDraws(
+        LotteryRound storage round,
+        DrawProgress storage progress,
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint256 budget
+    ) private returns (uint256) {
+        uint256 participantCount = round.participants.length;
+        (uint256 high, uint256 low) = softmaxWeights(progress.topCount, participantCount);
+
+        while (budget > 0 && progress.miniWinners < MINI_PRIZE_WINNERS && progress.eligibleCount > 0) {
+            uint256 draw = progress.miniWinners;
+            uint256 target = miniPrizeTarget(keccak256HashNumbers, keccak256HashFull, draw);
+            uint256 position = findMiniPrizePosition(round, participantCount, target, high, low);
+            if (position >= progress.eligibleCount) {
+                position = miniPrizeFallback(keccak256HashNumbers, keccak256HashFull, progress.drawTime, draw) % progress.eligibleCount;
+            }
+            uint256 winner = findEligibleParticipant(round, participantCount, position);
+            if (!awardMiniPrize(round, winner)) {
+                removeEligibleParticipant(round, participantCount, winner);
+                progress.eligibleCount--;
+            }
+            progress.miniWinners++;
+            budget--;
         }
-        
-        return totalHoldTime;
+        if (progress.miniWinners >= MINI_PRIZE_WINNERS || progress.eligibleCount == 0) {
+            progress.phase = DRAW_SETTLE;
+        }
+        return budget;
     }
 
-    // Apply softmax transformation to weights
-    function applySoftmaxTransformation(uint256[] memory weights) private pure {
-        // Find maximum weight to prevent overflow
+    // Make every mini prize draw on a tree built in memory, straight from the participant
+    // aggregates, when the whole selection fits in this step
+    function drawMiniPrizeWinners(
+        LotteryRound storage round,
+        DrawProgress storage progress,
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull
+    ) private {
+        DrawTally memory tally = loadDrawTally(round, progress.drawTime);
+        (uint256 high, uint256 low) = softmaxWeights(tally.topCount, round.participants.length);
+
+        for (uint256 draw = 0; draw < MINI_PRIZE_WINNERS && tally.eligibleCount > 0; draw++) {
+            uint256 target = miniPrizeTarget(keccak256HashNumbers, keccak256HashFull, draw);
+            uint256 position = findMiniPrizePosition(tally.tree, target, high, low);
+            if (position >= tally.eligibleCount) {
+                position = miniPrizeFallback(keccak256HashNumbers, keccak256HashFull, progress.drawTime, draw) % tally.eligibleCount;
+            }
+            uint256 winner = findEligibleParticipant(tally.tree, position);
+            if (!awardMiniPrize(round, winner)) {
+                // The winner has no ticket left, the later draws skip it
+                removeEligibleParticipant(tally.tree, winner);
+                tally.eligibleCount--;
+            }
+        }
+        progress.phase = DRAW_SETTLE;
+    }
+
+    // Tree of the round from the participant aggregates, nodes as processMiniPrizeTree builds them
+    function loadDrawTally(LotteryRound storage round, uint256 drawTime) private view returns (DrawTally memory tally) {
+        uint256 participantCount = round.participants.length;
+        uint256[] memory weights = new uint256[](participantCount);
         uint256 maxWeight = 0;
-        for (uint256 i = 0; i < weights.length; i++) {
-            if (weights[i] > maxWeight) {
-                maxWeight = weights[i];
+        tally.tree = new uint256[](participantCount + 1);
+
+        for (uint256 i = 0; i < participantCount; i++) {
+            (uint256 weight, bool eligible) = participantWeight(round, round.participants[i], drawTime);
+            weights[i] = weight;
+            if (weight > maxWeight) {
+                maxWeight = weight;
+            }
+            if (eligible) {
+                tally.tree[i + 1] = NODE_ELIGIBLE;
+                tally.eligibleCount++;
             }
         }
-        
-        // Calculate exp and sum
-        uint256 sumExp = 0;
-        for (uint256 i = 0; i < weights.length; i++) {
-            // Normalize by subtracting max (prevents overflow)
-            weights[i] = fastExp(weights[i], maxWeight);
-            sumExp += weights[i];
+        for (uint256 i = 1; i <= participantCount; i++) {
+            if (inTopClass(weights[i - 1], maxWeight)) {
+                tally.tree[i]++;
+                tally.topCount++;
+            }
+            uint256 parent = i + nodeSpan(i);
+            if (parent <= participantCount) {
+                tally.tree[parent] += tally.tree[i];
+            }
         }
-        
-        // Normalize to get final weights
-        if (sumExp > 0) {
-            for (uint256 i = 0; i < weights.length; i++) {
-                weights[i] = (weights[i] * SCALE_FACTOR) / sumExp;
+    }
+
+    // Position among the eligible participants of the first whose cumulative softmax weight passes
+    // `target`, or the participant count when none does. As in select_mini_prize_winners of the
+    // reference model, eligible position k takes the weight of participant index k: `high` in the top class, `low` otherwise, so a
+    // node weighs its span in `low` plus its top class count in `high - low`
+    function findMiniPrizePosition(
+        LotteryRound storage round,
+        uint256 participantCount,
+        uint256 target,
+        uint256 high,
+        uint256 low
+    ) private view returns (uint256 position) {
+        uint256 cumulative = 0;
+        for (uint256 span = highestSpan(participantCount); span > 0; span >>= 1) {
+            if (position + span <= participantCount) {
+                uint256 node = round.drawWeights[position + span - 1] >> NODE_SHIFT;
+                uint256 weight = span * low + (node % NODE_ELIGIBLE) * (high - low);
+                if (cumulative + weight <= target) {
+                    cumulative += weight;
+                    position += span;
+                }
+            }
+        }
+    }
+
+    function findMiniPrizePosition(uint256[] memory tree, uint256 target, uint256 high, uint256 low)
+        private
+        pure
+        returns (uint256 position)
+    {
+        uint256 participantCount = tree.length - 1;
+        uint256 cumulative = 0;
+        for (uint256 span = highestSpan(participantCount); span > 0; span >>= 1) {
+            if (position + span <= participantCount) {
+                uint256 weight = span * low + (tree[position + span] % NODE_ELIGIBLE) * (high - low);
+                if (cumulative + weight <= target) {
+                    cumulative += weight;
+                    position += span;
+                }
+            }
+        }
+    }
+
+    // Index of the participant at eligible position `position`
+    function findEligibleParticipant(LotteryRound storage round, uint256 participantCount, uint256 position)
+        private
+        view
+        returns (uint256 index)
+    {
+        for (uint256 span = highestSpan(participantCount); span > 0; span >>= 1) {
+            if (index + span <= participantCount) {
+                uint256 eligible = (round.drawWeights[index + span - 1] >> NODE_SHIFT) / NODE_ELIGIBLE;
+                if (eligible <= position) {
+                    position -= eligible;
+                    index += span;
+                }
+            }
+        }
+    }
+
+    function findEligibleParticipant(uint256[] memory tree, uint256 position) private pure returns (uint256 index) {
+        uint256 participantCount = tree.length - 1;
+        for (uint256 span = highestSpan(participantCount); span > 0; span >>= 1) {
+            if (index + span <= participantCount) {
+                uint256 eligible = tree[index + span] / NODE_ELIGIBLE;
+                if (eligible <= position) {
+                    position -= eligible;
+                    index += span;
+                }
+            }
+        }
+    }
+
+    // Take the participant at `index` out of the eligible counts of the nodes covering it
+    function removeEligibleParticipant(LotteryRound storage round, uint256 participantCount, uint256 index) private {
+        for (uint256 i = index + 1; i <= participantCount; i += nodeSpan(i)) {
+            round.drawWeights[i - 1] -= NODE_ELIGIBLE << NODE_SHIFT;
+        }
+    }
+
+    function removeEligibleParticipant(uint256[] memory tree, uint256 index) private pure {
+        for (uint256 i = index + 1; i < tree.length; i += nodeSpan(i)) {
+            tree[i] -= NODE_ELIGIBLE;
+        }
+    }
+
+    // Participants covered by tree node `i`, its lowest set bit
+    function nodeSpan(uint256 i) private pure returns (uint256) {
+        return i & (~i + 1);
+    }
+
+    // Span of the first node a descent over `participantCount` participants looks at, the largest
+    // power of two not above it
+    function highestSpan(uint256 participantCount) private pure returns (uint256 span) {
+        if (participantCount == 0) {
+            return 0;
+        }
+        span = 1;
+        while (span <= participantCount >> 1) {
+            span <<= 1;
+        }
+    }
+
+    // Whether fastExp gives `weight` the top class's SCALE_FACTOR rather than 1
+    function inTopClass(uint256 weight, uint256 maxWeight) private pure returns (bool) {
+        return fastExp(weight, maxWeight) == SCALE_FACTOR;
+    }
+
+    // Softmax weight of a participant in the top class and of any other, SCALE_FACTOR and 1
+    // normalized by their sum over the round
+    function softmaxWeights(uint256 topCount, uint256 participantCount) private pure returns (uint256 high, uint256 low) {
+        uint256 sumExp = topCount * SCALE_FACTOR + (participantCount - topCount);
+        high = SCALE_FACTOR * SCALE_FACTOR / sumExp;
+        low = SCALE_FACTOR / sumExp;
+    }
+
+    // Random point of mini prize draw `draw` on the softmax scale, the first draw keeps the seed
+    // of the single winner draw
+    function miniPrizeTarget(bytes32 keccak256HashNumbers, bytes32 keccak256HashFull, uint256 draw) private pure returns (uint256) {
+        bytes32 seed = draw == 0
+            ? keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull))
+            : keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull, draw));
+        return uint256(seed) % SCALE_FACTOR;
+    }
+
+    // Random value picking the winner of mini prize draw `draw` when its descent finds none
+    function miniPrizeFallback(bytes32 keccak256HashNumbers, bytes32 keccak256HashFull, uint256 drawTime, uint256 draw)
+        private
+        pure
+        returns (uint256)
+    {
+        bytes32 seed = draw == 0
+            ? keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull, drawTime))
+            : keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull, drawTime, draw));
+        return uint256(seed);
+    }
+
+    // Credit the participant at `participantIndex` with a mini prize on its first ticket left,
+    // returns whether it still holds a ticket for the next draws
+    function awardMiniPrize(LotteryRound storage round, uint256 participantIndex) private returns (bool) {
+        address winner = round.participants[participantIndex];
+        round.miniPrizeWinners.push(winner);
+        markTicket(winner, findMiniPrizeTicket(round, winner), TicketStatus.WON_MINI_PRIZE);
+        return round.participantTickets[winner].length > ++round.participantWins[winner];
+    }
+
+    // First ticket of the participant still IN_LOTTERY, which is its entry for the mini prize
+    function findMiniPrizeTicket(LotteryRound storage round, address participant) private view returns (uint256) {
+        uint256[] storage ticketIds = round.participantTickets[participant];
+        for (uint256 j = 0; j < ticketIds.length; j++) {
+            (, TicketStatus status) = ticketEntryState(participant, ticketIds[j]);
+            if (status == TicketStatus.IN_LOTTERY) {
+                return ticketIds[j];
             }
         }
+        revert("No ticket left for the mini prize");
     }
 
-    // Optimized exponential approximation
     function fastExp(uint256 x, uint256 maxVal) private pure returns (uint256) {
         // Normalize x by subtracting the max value (all values become <= 0)
         // which prevents overflow in the exp calculation
         if (x < maxVal) {
             // For values much smaller than max, return near-zero
-            if (maxVal - x > 10) {
+            if (maxVal - x > SOFTMAX_SPAN) {
                 return 1; // Very small but not zero
             }
             
@@ -252,7 +836,6 @@ contract LotteryManager {
         return SCALE_FACTOR;
     }
 
-    // Simple exp approximation with reduced terms
     function expApprox(uint256 x) private pure returns (uint256) {
         // Using only 4 terms for taylor series
         // e^x ≈ 1 + x + x²/2! + x³/3! + x⁴/4!
@@ -281,179 +864,8 @@ contract LotteryManager {
         return result;
     }
 
-
-      // Helper function to identify small and big prize winners
-    function identifyWinners(
-        bytes32 keccak256HashNumbers,
-        bytes32 keccak256HashFull,
-        LotteryRound storage round
-    ) private returns (uint256 smallWinnerCount1, uint256 bigWinnerCount1) {
-         // First pass to count winners
-        uint256 smallWinnerCount = 0;
-        uint256 bigWinnerCount = 0;
-        
-        for (uint256 i = 0; i < round.participants.length; i++) {
-            address participant = round.participants[i];
-            uint256[] storage ticketIds = round.participantTickets[participant];
-            
-            for (uint256 j = 0; j < ticketIds.length; j++) {
-                (,,,, , bytes32 ticketHash, bytes32 ticketHashWithStrong) = 
-                    ticketManager.getTicketData(participant, ticketIds[j]);
-                
-                if (ticketHashWithStrong == keccak256HashFull) {
-                    bigWinnerCount++;
-                } else if (ticketHash == keccak256HashNumbers) {
-                    smallWinnerCount++;
-                }
-            }
-        }
-        
-        // Create arrays of exact size
-        address [] memory  smallWinners = new address[](smallWinnerCount);
-        address [] memory bigWinners = new address[](bigWinnerCount);
-        
-        // Second pass to fill arrays and mark tickets
-        smallWinnerCount = 0;
-        bigWinnerCount = 0;
-        
-        for (uint256 i = 0; i < round.participants.length; i++) {
-            address participant = round.participants[i];
-            uint256[] storage ticketIds = round.participantTickets[participant];
-            
-            for (uint256 j = 0; j < ticketIds.length; j++) {
-                (,,,, , bytes32 ticketHash, bytes32 ticketHashWithStrong) = 
-                    ticketManager.getTicketData(participant, ticketIds[j]);
-                
-                if (ticketHashWithStrong == keccak256HashFull) {
-                    bigWinners[bigWinnerCount] = participant;
-                    bigWinnerCount++;
-                    ticketManager.markTicketAsStatus(participant, ticketIds[j], TicketStatus.WON_BIG_PRIZE);
-                } else if (ticketHash == keccak256HashNumbers) {
-                    smallWinners[smallWinnerCount] = participant;
-                    smallWinnerCount++;
-                    ticketManager.markTicketAsStatus(participant, ticketIds[j], TicketStatus.WON_SMALL_PRIZE);
-                } 
-            }
-        }
-        round.bigPrizeWinners = bigWinners;
-        round.smallPrizeWinners = smallWinners;
-        return (smallWinnerCount, bigWinnerCount);
-    }
-
-    // Helper function to select mini prize winners
-    function selectMiniPrizeWinners(
-        LotteryRound storage round,
-        bytes32 keccak256HashNumbers,
-        bytes32 keccak256HashFull
-    ) private returns (uint256 miniWinnerCount) {
-        miniWinnerCount = 0;
-        round.miniPrizeWinners = new address[](1);
-
-        address[] memory eligibleParticipants = new address[](round.participants.length);
-        uint256 eligibleCount = 0;
-
-        for (uint256 i = 0; i < round.participants.length; i++) {
-            address participant = round.participants[i];
-            uint256[] storage ticketIds = round.participantTickets[participant];
-            bool hasEligibleTicket = false;
-            for (uint256 j = 0; j < ticketIds.length; j++) {
-                (, , , TicketStatus status, , ,) = ticketManager.getTicketData(participant, ticketIds[j]);
-                if (status == TicketStatus.IN_LOTTERY) {
-                    hasEligibleTicket = true;
-                    break;
-                }
-            }
-            if (hasEligibleTicket) {
-                eligibleParticipants[eligibleCount] = participant;
-                eligibleCount++;
-            }
-        }
-        
-        if(eligibleCount == 0) {
-            return 0; // No eligible participants for mini prize
-        }
-            bool winnerSelected = false;
-            uint256[] memory weights = calculateSoftmaxWeights(round);
-            uint256 randomValue = uint256(keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull))) % SCALE_FACTOR;
-            uint256 cumulativeWeight = 0;
-
-            for (uint256 i = 0; i < eligibleCount; i++) 
-            {
-                if (weights[i] > 0) 
-                {
-                    cumulativeWeight += weights[i];
-                    if (randomValue < cumulativeWeight) 
-                    {
-                        uint256[] storage ticketIds = round.participantTickets[eligibleParticipants[i]];
-                        for (uint256 j = 0; j < ticketIds.length; j++) {
-                            (, , , TicketStatus status, , ,) = ticketManager.getTicketData(eligibleParticipants[i], ticketIds[j]);
-                            if (status == TicketStatus.IN_LOTTERY) {
-                                round.miniPrizeWinners[miniWinnerCount] = eligibleParticipants[i];
-                                miniWinnerCount++;
-                                winnerSelected = true;
-                                ticketManager.markTicketAsStatus(eligibleParticipants[i], ticketIds[j], TicketStatus.WON_MINI_PRIZE);
-                                break;
-                            }
-                        }
-                        break;
-                    }
-                }
-        }
-        // Fallback: If no winner selected due to zero weights, pick randomly
-        if (!winnerSelected && eligibleCount > 0) {
-            uint256 randomIndex = uint256(keccak256(abi.encodePacked(keccak256HashNumbers, keccak256HashFull, block.timestamp))) % eligibleCount;
-            uint256[] storage ticketIds = round.participantTickets[eligibleParticipants[randomIndex]];
-            for (uint256 j = 0; j < ticketIds.length; j++) {
-                (, , , TicketStatus status, , ,) = ticketManager.getTicketData(eligibleParticipants[randomIndex], ticketIds[j]);
-                if (status == TicketStatus.IN_LOTTERY) 
-                {
-                    round.miniPrizeWinners[miniWinnerCount] = eligibleParticipants[randomIndex];
-                    miniWinnerCount++;
-                    ticketManager.markTicketAsStatus(eligibleParticipants[randomIndex], ticketIds[j], TicketStatus.WON_MINI_PRIZE);
-                    break;
-                }
-            }
-        }
-        return miniWinnerCount;
-    }
-
-    // Helper function to resize winner arrays
-    function resizeWinnerArrays(
-        LotteryRound storage round,
-        uint256 smallWinnerCount,
-        uint256 bigWinnerCount,
-        uint256 miniWinnerCount
-    ) private returns (
-        address[] memory finalSmallPrizeWinners,
-        address[] memory finalBigPrizeWinners,
-        address[] memory finalMiniPrizeWinners
-    ) {
-        finalSmallPrizeWinners = new address[](smallWinnerCount);
-        finalBigPrizeWinners = new address[](bigWinnerCount);
-        finalMiniPrizeWinners = new address[](miniWinnerCount);
-
-        for (uint256 i = 0; i < smallWinnerCount; i++) {
-            finalSmallPrizeWinners[i] = round.smallPrizeWinners[i];
-        }
-        for (uint256 i = 0; i < bigWinnerCount; i++) {
-            finalBigPrizeWinners[i] = round.bigPrizeWinners[i];
-        }
-        for (uint256 i = 0; i < miniWinnerCount; i++) {
-            finalMiniPrizeWinners[i] = round.miniPrizeWinners[i];
-        }
-
-        round.smallPrizeWinners = finalSmallPrizeWinners;
-        round.bigPrizeWinners = finalBigPrizeWinners;
-        round.miniPrizeWinners = finalMiniPrizeWinners;
-    }
-
-    // Helper function to calculate and distribute prizes
-    function calculateAndDistributePrizes(
-        LotteryRound storage round,
-        uint256 smallWinnerCount,
-        uint256 bigWinnerCount,
-        uint256 miniWinnerCount
-    ) private {
+    // Split the prize pool of the drawn round, a pool without winners goes to the commission
+    function splitPrizePool(LotteryRound storage round) private {
         uint256 totalPrizePool = round.totalPrizePool;
         require(address(this).balance >= totalPrizePool, "Prize pool mismatch");
         uint256 commission = (totalPrizePool * FLEX_COMMISSION) / 100;
@@ -461,128 +873,137 @@ contract LotteryManager {
         uint256 smallPrizePool = (totalPrizePool * SMALL_PRIZE_PERCENTAGE) / 100;
         uint256 bigPrizePool = totalPrizePool - commission - smallPrizePool - miniPrizePool;
 
-        round.smallPrize = smallPrizePool;
-        round.bigPrize = bigPrizePool;
-        round.miniPrize = miniPrizePool;
-        round.commission = commission;
-
-        if (smallWinnerCount > 0) {
-            uint256 smallPrizePerWinner = smallPrizePool / smallWinnerCount;
-            for (uint256 i = 0; i < smallWinnerCount; i++) {
-                // payable(round.smallPrizeWinners[i]).transfer(smallPrizePerWinner);
-                pendingPrizes[round.smallPrizeWinners[i]] += smallPrizePerWinner;
-            }
-        } else if (smallPrizePool > 0) {
-            round.commission += smallPrizePool;
-            round.smallPrize = 0;
+        if (round.smallPrizeWinners.length == 0) {
+            commission += smallPrizePool;
+            smallPrizePool = 0;
         }
-
-        if (bigWinnerCount > 0) {
-            uint256 bigPrizePerWinner = bigPrizePool / bigWinnerCount;
-            for (uint256 i = 0; i < bigWinnerCount; i++) {
-                // payable(round.bigPrizeWinners[i]).transfer(bigPrizePerWinner);
-                pendingPrizes[round.bigPrizeWinners[i]] += bigPrizePerWinner;
-            }
-        } else if (bigPrizePool > 0) {
-            round.commission += bigPrizePool;
-            round.bigPrize = 0;
+        if (round.bigPrizeWinners.length == 0) {
+            commission += bigPrizePool;
+            bigPrizePool = 0;
         }
+        if (round.miniPrizeWinners.length == 0) {
+            commission += miniPrizePool;
+            miniPrizePool = 0;
+        }
+
+        // The four prize fields share two slots, write them once
+        round.smallPrize = uint128(smallPrizePool);
+        round.bigPrize = uint128(bigPrizePool);
+        round.miniPrize = uint128(miniPrizePool);
+        round.commission = uint128(commission);
+    }
 
-        if (miniWinnerCount > 0) {
-            uint256 miniPrizePerWinner = miniPrizePool / miniWinnerCount;
-            for (uint256 i = 0; i < miniWinnerCount; i++) {
-                // payable(round.miniPrizeWinners[i]).transfer(miniPrizePerWinner);
-                pendingPrizes[round.miniPrizeWinners[i]] += miniPrizePerWinner;
+    // Credit the small, big and mini prize winners in turn, a unit of the budget each. Once all are
+    // credited the commission is credited and the round's tickets are retired. Returns the winners
+    // credited by this call
+    function processPayouts(LotteryRound storage round, DrawProgress storage progress, uint256 budget)
+        private
+        returns (PrizeCredits memory credits)
+    {
+        uint256 smallWinnerCount = round.smallPrizeWinners.length;
+        uint256 bigWinnerCount = round.bigPrizeWinners.length;
+        uint256 totalWinners = smallWinnerCount + bigWinnerCount + round.miniPrizeWinners.length;
+        uint256 cursor = progress.cursor;
+        uint256 end = totalWinners - cursor < budget ? totalWinners : cursor + budget;
+
+        credits.smallPrizeWinners = creditWinners(round.smallPrizeWinners, round.smallPrize, 0, cursor, end);
+        credits.bigPrizeWinners = creditWinners(round.bigPrizeWinners, round.bigPrize, smallWinnerCount, cursor, end);
+        credits.miniPrizeWinners = creditWinners(round.miniPrizeWinners, round.miniPrize,
+            smallWinnerCount + bigWinnerCount, cursor, end);
+
+        if (end == totalWinners) {
+            if (round.commission > 0) {
+                pendingPrizes[i_commissionRecipient] += round.commission;
             }
-        } else if (miniPrizePool > 0) {
-            round.commission += miniPrizePool;
-            round.miniPrize = 0;
+            // Every other ticket of the round becomes USED at once
+            finalizeTicketsRound(currentLotteryRound);
+            progress.phase = DRAW_DONE;
+        } else {
+            progress.cursor = uint64(end);
         }
+    }
 
-        if (round.commission > 0) {
-            // payable(i_owner).transfer(round.commission);
-            pendingPrizes[i_owner] += round.commission;
+    // Credit the share of `prize` of the winners whose place in the payout order is in [cursor, end),
+    // the first of `winners` being at place `offset`. Returns the winners credited
+    function creditWinners(address[] storage winners, uint256 prize, uint256 offset, uint256 cursor, uint256 end)
+        private
+        returns (address[] memory credited)
+    {
+        uint256 count = winners.length;
+        uint256 from = cursor > offset ? cursor - offset : 0;
+        uint256 to = end > offset ? end - offset : 0;
+        if (from > count) from = count;
+        if (to > count) to = count;
+
+        credited = new address[](to - from);
+        for (uint256 i = from; i < to; i++) {
+            pendingPrizes[winners[i]] += prize / count;
+            credited[i - from] = winners[i];
         }
     }
 
-    function drawLotteryWinner(
+    // Advance the draw of the closed round by at most `maxTickets` bucket entries, phase slots,
+    // participants, mini prize draws or prize credits and return true once the round is finalized, with the winners this step credited.
+    // The round stays CLOSED between steps, so a round too large for a single transaction can be
+    // drawn across several ones
+    function drawRoundStep(
         bytes32 keccak256HashNumbers,
         bytes32 keccak256HashFull,
         uint8[6] memory randomNumbers,
-        uint8 strongNumber
-    ) external returns (address[] memory, address[] memory, address[] memory) {
-        require(canDrawWinner(), "Wait for some time to draw the winner");
+        uint8 strongNumber,
+        uint256 maxTickets
+    ) internal override returns (bool finalized, PrizeCredits memory credits) {
+        require(roundCanDraw(), "Wait for some time to draw the winner");
+        require(maxTickets > 0, "Draw step must process at least one ticket");
         LotteryRound storage currentRound = lotteryRounds[currentLotteryRound];
         require(currentRound.status == lotteryStatus.CLOSED, "Lottery round already finalized");
-        currentRound.randomNumbers = randomNumbers;
-        currentRound.strongNumber = strongNumber;
-        if (currentRound.participants.length == 0) {
-            address[] memory emptyArray = new address[](0);
-            currentRound.smallPrizeWinners = emptyArray;
-            currentRound.bigPrizeWinners = emptyArray;
-            currentRound.miniPrizeWinners = emptyArray;
-            return (emptyArray, emptyArray, emptyArray);
-        }
-
-        // Identify small and big prize winners
-        (uint256 smallWinnerCount, uint256 bigWinnerCount) = identifyWinners(
-            keccak256HashNumbers,
-            keccak256HashFull,
-            currentRound
-        );
-
-        // Select mini prize winners
-        uint256 miniWinnerCount = selectMiniPrizeWinners(
-            currentRound,
-            keccak256HashNumbers,
-            keccak256HashFull
-        );
-
-        // Resize winner arrays
-        (
-            address[] memory finalSmallPrizeWinners,
-            address[] memory finalBigPrizeWinners,
-            address[] memory finalMiniPrizeWinners
-        ) = resizeWinnerArrays(
-            currentRound,
-            smallWinnerCount,
-            bigWinnerCount,
-            miniWinnerCount
-        );
-
-        markTicketsAsUsed(currentRound);
-
-        // Calculate and distribute prizes
-        calculateAndDistributePrizes(
-            currentRound,
-            smallWinnerCount,
-            bigWinnerCount,
-            miniWinnerCount
-        );
 
-        return (
-            finalSmallPrizeWinners,
-            finalBigPrizeWinners,
-            finalMiniPrizeWinners
-        );
-    }
+        DrawProgress storage progress = beginDraw(currentRound, keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber);
+        uint256 budget = maxTickets;
 
-    function markTicketsAsUsed(LotteryRound storage round) private {
-        for (uint256 i = 0; i < round.participants.length; i++) {
-            address participant = round.participants[i];
-            uint256[] storage ticketIds = round.participantTickets[participant];
-            for (uint256 j = 0; j < ticketIds.length; j++) 
-            {
-                (, , , TicketStatus status, , ,) = ticketManager.getTicketData(participant, ticketIds[j]);
-                if (status == TicketStatus.IN_LOTTERY) 
-                {
-                    ticketManager.markTicketAsStatus(participant, ticketIds[j], TicketStatus.USED);
-                }
+        // Big and small winners come from the hash buckets, only the matching tickets are touched
+        if (progress.phase == DRAW_BIG_WINNERS) {
+            budget = processBucketWinners(currentRound, progress, currentRound.strongBuckets[keccak256HashFull],
+                currentRound.bigPrizeWinners, TicketStatus.WON_BIG_PRIZE, DRAW_SMALL_WINNERS, budget);
+        }
+        if (progress.phase == DRAW_SMALL_WINNERS && budget > 0) {
+            budget = processBucketWinners(currentRound, progress, currentRound.numbersBuckets[keccak256HashNumbers],
+                currentRound.smallPrizeWinners, TicketStatus.WON_SMALL_PRIZE, DRAW_MINI_WEIGHTS, budget);
+        }
+        // Weigh the participants and make every mini prize draw on a tree in memory when the
+        // selection fits in this step: a unit per phase slot (16 tickets of a participant) weighed,
+        // per participant put in the tree and per draw. Otherwise the weights and the tree are
+        // stored over as many steps as they take, then each draw takes a unit
+        if (progress.phase == DRAW_MINI_WEIGHTS && budget > 0) {
+            uint256 tickets = currentRound.totalTickets;
+            uint256 draws = MINI_PRIZE_WINNERS < tickets ? MINI_PRIZE_WINNERS : tickets;
+            uint256 selection = currentRound.phaseSlots + currentRound.participants.length + draws;
+            if (progress.cursor == 0 && progress.phaseSlot == 0 && budget >= selection) {
+                drawMiniPrizeWinners(currentRound, progress, keccak256HashNumbers, keccak256HashFull);
+                budget -= selection;
+            } else {
+                budget = processMiniPrizeWeights(currentRound, progress, budget);
             }
         }
+        if (progress.phase == DRAW_MINI_TREE && budget > 0) {
+            budget = processMiniPrizeTree(currentRound, progress, budget);
+        }
+        if (progress.phase == DRAW_MINI_WINNERS && budget > 0) {
+            budget = processMiniPrizeDraws(currentRound, progress, keccak256HashNumbers, keccak256HashFull, budget);
+        }
+        // The pool split takes no budget, every prize credited takes a unit
+        if (progress.phase == DRAW_SETTLE) {
+            splitPrizePool(currentRound);
+            progress.cursor = 0;
+            progress.phase = DRAW_PAYOUT;
+        }
+        if (progress.phase == DRAW_PAYOUT) {
+            credits = processPayouts(currentRound, progress, budget);
+        }
+        finalized = progress.phase == DRAW_DONE;
     }
 
-    function claimPrize(address winner) external {
+    function claimPendingPrize(address winner) internal override returns (uint256) {
         uint256 prizeAmount = pendingPrizes[winner];
         require(prizeAmount > 0, "No prize to claim");
         require(address(this).balance >= prizeAmount, "Insufficient contract balance");
@@ -590,23 +1011,24 @@ contract LotteryManager {
         pendingPrizes[winner] = 0;
         (bool success, ) = winner.call{value: prizeAmount}("");
         require(success, "Prize transfer failed");
+        return prizeAmount;
     }
 
-    function getPendingPrize(address winner) external view returns (uint256) {
+    function pendingPrizeOf(address winner) internal view override returns (uint256) {
         return pendingPrizes[winner];
     }
 
 
 
-    function getCurrentRound() external view returns (uint256) {
+    function currentRoundNumber() internal view override returns (uint256) {
         return currentLotteryRound;
     }
 
-    function isLotteryActive() external view returns (bool) {
+    function roundIsActive() internal view override returns (bool) {
         return activeRound;
     }
 
- function getLotteryRoundInfo(uint256 _index) external view returns (
+    function roundInfo(uint256 _index) internal view override returns (
         uint256 roundNumber,
         uint256 totalPrizePool,
         address[][] memory addressArrays,
@@ -644,23 +1066,257 @@ contract LotteryManager {
 
 
     // Modified getCurrentWinners to include mini prize winners
-    function getCurrentWinners() external view returns (
+    function currentRoundWinners() internal view override returns (
         address[] memory smallPrizeWinners,
         address[] memory bigPrizeWinners,
         address[] memory miniPrizeWinners
     ) {
-        LotteryRound storage currentRound = lotteryRounds[currentLotteryRound-1];
-        return (currentRound.smallPrizeWinners, currentRound.bigPrizeWinners, currentRound.miniPrizeWinners);
+        return roundWinners(currentLotteryRound-1);
     }
 
-    function getCurrentPrizePool() external view returns (uint256) {
+    function roundDraw(uint256 _index) internal view override returns (
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) {
+        LotteryRound storage round = lotteryRounds[_index];
+        return (round.bigPrize, round.smallPrize, round.miniPrize, round.commission, round.randomNumbers, round.strongNumber);
+    }
+
+    // Participants `_offset` to `_offset + _limit` of a round, and the number of participants
+    function roundParticipantPage(uint256 _index, uint256 _offset, uint256 _limit)
+        internal
+        view
+        override
+        returns (address[] memory participants, uint256 total)
+    {
+        require(_index <= currentLotteryRound && _index >= 1, "Invalid lottery round index");
+        address[] storage roundParticipants = lotteryRounds[_index].participants;
+        total = roundParticipants.length;
+        uint256 end = _offset >= total ? _offset : (total - _offset > _limit ? _offset + _limit : total);
+
+        participants = new address[](end - _offset);
+        for (uint256 i = _offset; i < end; i++) {
+            participants[i - _offset] = roundParticipants[i];
+        }
+    }
+
+    function roundWinners(uint256 _index) internal view returns (
+        address[] memory smallPrizeWinners,
+        address[] memory bigPrizeWinners,
+        address[] memory miniPrizeWinners
+    ) {
+        LotteryRound storage round = lotteryRounds[_index];
+        return (round.smallPrizeWinners, round.bigPrizeWinners, round.miniPrizeWinners);
+    }
+
+    function currentRoundPrizePool() internal view override returns (uint256) {
         LotteryRound storage currentRound = lotteryRounds[currentLotteryRound];
         return currentRound.totalPrizePool;
     }
 
-    function getCurrentTotalTickets() external view returns (uint256) {
+    function currentRoundTotalTickets() internal view override returns (uint256) {
         LotteryRound storage currentRound = lotteryRounds[currentLotteryRound];
         return currentRound.totalTickets;
     }
+}
+contract LotteryManager is LotteryStore {
+    address private immutable i_ticketSystem; // Contract that deployed this manager
+    ITicketManager private ticketManager;
+
+    constructor(address _ticketManagerAddress) LotteryStore(tx.origin)
+    {
+        i_ticketSystem = msg.sender;
+        ticketManager = ITicketManager(_ticketManagerAddress);
+    }
+
+    // Tickets live in the separate TicketManager, every ticket hook is an external call
+
+    function enterTicket(address _player, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _lotteryRound)
+        internal
+        override
+        returns (bool, uint256)
+    {
+        return ticketManager.setTicketInLottery(_player, _ticketId, _ticketHash, _ticketHashWithStrong, _lotteryRound);
+    }
+
+    function enterTickets(
+        address _player,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _lotteryRound
+    ) internal override returns (bool, uint256[] memory) {
+        return ticketManager.setTicketsInLottery(_player, _ticketIds, _ticketHashes, _ticketHashesWithStrong, _lotteryRound);
+    }
+
+    function markTicket(address _player, uint256 _ticketId, TicketStatus _status) internal override returns (bool) {
+        return ticketManager.markTicketAsStatus(_player, _ticketId, _status);
+    }
+
+    function ticketEntryState(address _player, uint256 _ticketId) internal view override returns (uint256, TicketStatus) {
+        return ticketManager.getTicketEntryState(_player, _ticketId);
+    }
+
+    function finalizeTicketsRound(uint256 _lotteryRound) internal override {
+        ticketManager.finalizeRound(_lotteryRound);
+    }
+
+    function getMINI_PRIZE_PERCENTAGE() external pure returns (uint256) {
+        return MINI_PRIZE_PERCENTAGE;
+    }
+    function getSMALL_PRIZE_PERCENTAGE() external pure returns (uint256) {
+        return SMALL_PRIZE_PERCENTAGE;
+    }
+    function getFLEX_COMMISSION() external pure returns (uint256) {
+        return FLEX_COMMISSION;
+    }
+    function getBlocksWait() external view returns (uint256, uint256) {
+        return blocksWait();
+    }
+
+    function setBlocksWait(uint256 _blocksToClose, uint256 _blocksToDraw) external {
+        require(msg.sender == i_ticketSystem, "Only the ticket system can change the block waits");
+        changeBlocksWait(_blocksToClose, _blocksToDraw);
+    }
+
+    function getMiniPrizeWinners() external view returns (uint256) {
+        return miniPrizeWinnerCount();
+    }
+
+    function setMiniPrizeWinners(uint256 _winners) external {
+        require(msg.sender == i_ticketSystem, "Only the ticket system can change the mini prize winners");
+        changeMiniPrizeWinners(_winners);
+    }
+
+    function getLotteryBlockStatus() external view returns (uint256 blocksUntilClose, uint256 blocksUntilDraw) {
+        return roundBlockStatus();
+    }
+
+    function canCloseLottery() external view returns (bool) {
+        return roundCanClose();
+    }
+
+    function canDrawWinner() external view returns (bool) {
+        return roundCanDraw();
+    }
+
+    function closeLotteryRound() external {
+        closeRound();
+    }
+
+    function startNewLotteryRound() external returns (uint256) {
+        return openNextRound();
+    }
+
+    function addParticipantAndPrizePool(address _participant, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong ,uint256 _ticketPrice) external returns (bool) {
+        return enterRound(_participant, _ticketId, _ticketHash, _ticketHashWithStrong, _ticketPrice);
+    }
+
+    function addParticipantAndPrizePoolBatch(
+        address _participant,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _ticketPrice
+    ) external returns (bool) {
+        return enterRoundBatch(_participant, _ticketIds, _ticketHashes, _ticketHashesWithStrong, _ticketPrice);
+    }
+
+    function drawLotteryWinner(
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) external returns (address[] memory, address[] memory, address[] memory) {
+        require(msg.sender == i_ticketSystem, "Only the ticket system can draw the round");
+        (bool finalized, ) = drawRoundStep(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber, type(uint256).max);
+        require(finalized, "Draw not finalized");
+        return roundWinners(currentRoundNumber());
+    }
+
+    // Advance the draw of the closed round by at most `maxTickets` units of work, true once finalized,
+    // with the winners the step credited
+    function drawLotteryWinnerStep(
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber,
+        uint256 maxTickets
+    ) external returns (bool finalized, PrizeCredits memory credits) {
+        require(msg.sender == i_ticketSystem, "Only the ticket system can draw the round");
+        return drawRoundStep(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber, maxTickets);
+    }
+
+    function claimPrize(address winner) external returns (uint256) {
+        return claimPendingPrize(winner);
+    }
+
+    function getPendingPrize(address winner) external view returns (uint256) {
+        return pendingPrizeOf(winner);
+    }
+
+    function getCurrentRound() external view returns (uint256) {
+        return currentRoundNumber();
+    }
+
+    function isLotteryActive() external view returns (bool) {
+        return roundIsActive();
+    }
+
+    function getLotteryRoundInfo(uint256 _index) external view returns (
+        uint256 roundNumber,
+        uint256 totalPrizePool,
+        address[][] memory addressArrays,
+        lotteryStatus status,
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint256 totalTickets,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) {
+        return roundInfo(_index);
+    }
+
+    function getCurrentWinners() external view returns (
+        address[] memory smallPrizeWinners,
+        address[] memory bigPrizeWinners,
+        address[] memory miniPrizeWinners
+    ) {
+        return currentRoundWinners();
+    }
+
+    function getRoundParticipants(uint256 _index, uint256 _offset, uint256 _limit)
+        external
+        view
+        returns (address[] memory participants, uint256 total)
+    {
+        return roundParticipantPage(_index, _offset, _limit);
+    }
+
+    function getLotteryRoundDraw(uint256 _index) external view returns (
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) {
+        return roundDraw(_index);
+    }
+
+    function getCurrentPrizePool() external view returns (uint256) {
+        return currentRoundPrizePool();
+    }
+
+    function getCurrentTotalTickets() external view returns (uint256) {
+        return currentRoundTotalTickets();
+    }
+
     receive() external payable {}
-}
\ No newline at end of file
+}
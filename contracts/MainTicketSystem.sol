@@ -3,152 +3,112 @@ pragma solidity ^0.8.2;
 
 import "./TicketManager.sol";
 import "./LotteryManager.sol";
+import "./TicketSystemBase.sol";
 
-contract MainTicketSystem {
+// Ticket system fronting a TicketManager and a LotteryManager, every operation is an external call
+contract MainTicketSystem is TicketSystemBase {
     TicketManager private ticketManager;
     LotteryManager private lotteryManager;
 
-    event LotteryRoundStatusChanged(bool isOpen);
-    event BlockStatusUpdated(uint256 blocksUntilClose, uint256 blocksUntilDraw);
-    event TicketEnteredLottery(uint256 roundNumber, uint256 totalTickets, uint256 prizePool);
-    
-
-    event TicketSelected(address indexed user, uint256 ticketId, bool success);
-
-
     constructor() {
         // Deploy sub-contracts
         ticketManager = new TicketManager(1 ether);
         lotteryManager = new LotteryManager(address(ticketManager));
+        ticketManager.setLotteryManager(address(lotteryManager));
     }
 
-    function updateBlockStatus() public {
-        (uint256 blocksUntilClose, uint256 blocksUntilDraw) = lotteryManager.getLotteryBlockStatus();
-        emit BlockStatusUpdated(blocksUntilClose, blocksUntilDraw);
+    function fundPrizePool(uint256 _amount) internal override {
+        // Forward the ticket payments to LotteryManager
+        (bool success, ) = address(lotteryManager).call{value: _amount}("");
+        require(success, "Failed to forward Ether to LotteryManager");
     }
 
-    function startNewLotteryRound() private {
-        lotteryManager.startNewLotteryRound();
-        updateBlockStatus();
-        emit LotteryRoundStatusChanged(true);
+    function prizePoolBalance() internal view override returns (uint256) {
+        return address(lotteryManager).balance;
     }
 
-    function closeLotteryRound() public {
-        lotteryManager.closeLotteryRound();
-        updateBlockStatus();
-        emit LotteryRoundStatusChanged(false);
+    function issueTickets(address _buyer, uint256 _count) internal override returns (uint256) {
+        return ticketManager.purchaseTickets(_buyer, _count);
     }
 
-    function canCloseLottery() private returns (bool) {
-        if (lotteryManager.canCloseLottery()){
-            closeLotteryRound(); 
-            return true;
-        }
-        return false;
+    function ticketsByStatus(address _player, TicketStatus _status) internal view override returns (uint256[] memory) {
+        return ticketManager.getTicketsByStatus(_player, _status);
     }
 
+    function ticketData(address _player, uint256 _ticketId) internal view override returns (TicketData memory) {
+        return ticketManager.getTicketData(_player, _ticketId);
+    }
 
-    // Ticket Purchase Functions
-    function purchaseTicket() external payable returns (uint256) {        
-        uint256 ticketPrice = ticketManager.getTicketPrice();
-        require(msg.value >= ticketPrice, "Insufficient payment for ticket");
+    function playerTicketList(address _player) internal view override returns (TicketData[] memory) {
+        return ticketManager.getPlayerTickets(_player);
+    }
 
-        uint256 ticketId = ticketManager.purchaseTicket(msg.sender);
-        
-        // Forward the ticket price to LotteryManager
-        (bool success, ) = address(lotteryManager).call{value: ticketPrice}("");
-        require(success, "Failed to forward Ether to LotteryManager");
+    function playerTicketPage(address _player, uint256 _offset, uint256 _limit)
+        internal
+        view
+        override
+        returns (TicketData[] memory tickets, uint256 total)
+    {
+        return ticketManager.getPlayerTicketsPage(_player, _offset, _limit);
+    }
 
-        if (msg.value > ticketPrice) {
-            (bool sent, ) = msg.sender.call{value: msg.value - ticketPrice}("");
-            require(sent, "Refund failed");
-        }
+    function ticketCountsByStatus(address _player) internal view override returns (uint256[6] memory) {
+        return ticketManager.getTicketCountsByStatus(_player);
+    }
 
-        if (isLotteryActive()) {
-            canCloseLottery();
-        } 
-           
-        updateBlockStatus();
-        return ticketId;
+    function currentTicketPrice() internal view override returns (uint256) {
+        return ticketManager.getTicketPrice();
     }
 
-    function selectTicketsForLottery(uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong) 
-        external  
-        returns (bool) 
-    {
-        require(_ticketHash != bytes32(0), "Ticket hash cannot be empty");
-        require(_ticketHashWithStrong != bytes32(0), "Strong ticket hash cannot be empty");
-   
-        bool success = false;
-        if (isLotteryActive()) {
-            if(canCloseLottery())
-            {
-                updateBlockStatus();
-                emit TicketSelected(msg.sender, _ticketId, false);
-                return false;
-            } 
-        } 
-        // Verify ticket status is ACTIVE before entering lottery
-        require( ticketManager.getTicketData(msg.sender, _ticketId).status == TicketStatus.ACTIVE,
-            "Invalid ticket status"
-        );
-
-        updateBlockStatus();
-        // Add ticket to lottery round
-        success = lotteryManager.addParticipantAndPrizePool(msg.sender, _ticketId, _ticketHash, _ticketHashWithStrong, ticketManager.getTicketPrice());
-
-        if (success) {
-            emit TicketEnteredLottery(
-                lotteryManager.getCurrentRound(), 
-                lotteryManager.getCurrentTotalTickets(),
-                lotteryManager.getCurrentPrizePool() 
-        );
-        } 
-        emit TicketSelected(msg.sender, _ticketId, success);
-  
-        return success;
-    }
-
-    function drawLotteryWinner(bytes32 keccak256HashNumbers, bytes32 keccak256HashFull, uint8[6] memory randomNumbers, uint8 strongNumber) public  
-    {
-        require(validate(randomNumbers, strongNumber), "Invalid input data");
-        lotteryManager.drawLotteryWinner(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber);
-        startNewLotteryRound();
-        emit TicketEnteredLottery(
-            lotteryManager.getCurrentRound(), 
-            lotteryManager.getCurrentTotalTickets(),
-            lotteryManager.getCurrentPrizePool()
-        );
-    }
-
-    function validate(
-        uint8[6] memory randomNumbers, 
-        uint8 strongNumber
-    ) private pure returns (bool) {
-        if(strongNumber < 1 || strongNumber > 7) {
-            return false; // Strong number must be between 1 and 7
-        }
-        for (uint8 i = 0; i < 6; i++) {
-            if (randomNumbers[i] < 1 || randomNumbers[i] > 37) {
-                return false; // Each number must be between 1 and 37
-            }
-        }
-        return true; // All numbers are valid
-    }
-
-    function getActiveTickets() external view returns (uint256[] memory) {
-        return ticketManager.getTicketsByStatus(msg.sender, TicketStatus.ACTIVE);
-    } 
-
-    function isLotteryActive() public view  returns (bool) {
+    function openNextRound() internal override returns (uint256) {
+        return lotteryManager.startNewLotteryRound();
+    }
+
+    function closeRound() internal override {
+        lotteryManager.closeLotteryRound();
+    }
+
+    function roundCanClose() internal view override returns (bool) {
+        return lotteryManager.canCloseLottery();
+    }
+
+    function roundIsActive() internal view override returns (bool) {
         return lotteryManager.isLotteryActive();
     }
 
-    function getTicketPrice() external view returns (uint256) {
-        return ticketManager.getTicketPrice();
+    function roundBlockStatus() internal view override returns (uint256 blocksUntilClose, uint256 blocksUntilDraw) {
+        return lotteryManager.getLotteryBlockStatus();
+    }
+
+    function enterRound(address _participant, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _ticketPrice)
+        internal
+        override
+        returns (bool)
+    {
+        return lotteryManager.addParticipantAndPrizePool(_participant, _ticketId, _ticketHash, _ticketHashWithStrong, _ticketPrice);
     }
 
-    function getLotteryRoundInfo(uint256 _index) external view returns (
+    function enterRoundBatch(
+        address _participant,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _ticketPrice
+    ) internal override returns (bool) {
+        return lotteryManager.addParticipantAndPrizePoolBatch(_participant, _ticketIds, _ticketHashes, _ticketHashesWithStrong, _ticketPrice);
+    }
+
+    function drawRoundStep(
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber,
+        uint256 maxTickets
+    ) internal override returns (bool finalized, PrizeCredits memory credits) {
+        return lotteryManager.drawLotteryWinnerStep(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber, maxTickets);
+    }
+
+    function roundInfo(uint256 _index) internal view override returns (
         uint256 roundNumber,
         uint256 totalPrizePool,
         address[][] memory addressArrays,
@@ -164,64 +124,67 @@ contract MainTicketSystem {
         return lotteryManager.getLotteryRoundInfo(_index);
     }
 
-    function getPlayerTickets(address _player) external view returns (TicketData[] memory) {
-        return ticketManager.getPlayerTickets(_player);
+    function currentRoundWinners() internal view override returns (
+        address[] memory smallPrizeWinners,
+        address[] memory bigPrizeWinners,
+        address[] memory miniPrizeWinners
+    ) {
+        return lotteryManager.getCurrentWinners();
     }
 
-    function getLotteryBlockStatus() public view returns (uint256 blocksUntilClose, uint256 blocksUntilDraw) {
-        return lotteryManager.getLotteryBlockStatus();
+    function roundDraw(uint256 _index) internal view override returns (
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) {
+        return lotteryManager.getLotteryRoundDraw(_index);
     }
 
-    function getContractBlance() public view returns (uint balance)
+    function roundParticipantPage(uint256 _index, uint256 _offset, uint256 _limit)
+        internal
+        view
+        override
+        returns (address[] memory participants, uint256 total)
     {
-        return address(lotteryManager).balance;
+        return lotteryManager.getRoundParticipants(_index, _offset, _limit);
     }
 
-    function getCurrentWinners() external view returns (
-    address[] memory smallPrizeWinners,
-    address[] memory bigPrizeWinners,
-    address[] memory miniPrizeWinners
-    ) {
-        return lotteryManager.getCurrentWinners();
+    function currentRoundNumber() internal view override returns (uint256) {
+        return lotteryManager.getCurrentRound();
     }
 
-    function getCurrentPrizePool() external view returns (uint256) {
+    function currentRoundPrizePool() internal view override returns (uint256) {
         return lotteryManager.getCurrentPrizePool();
     }
 
-    function getCurrentTotalTickets() external view returns (uint256) {
+    function currentRoundTotalTickets() internal view override returns (uint256) {
         return lotteryManager.getCurrentTotalTickets();
     }
 
-    function getCurrentRound() external view returns (uint256) {
-        return lotteryManager.getCurrentRound();
+    function blocksWait() internal view override returns (uint256, uint256) {
+        return lotteryManager.getBlocksWait();
     }
 
-    function getSMALL_PRIZE_PERCENTAGE() external view returns (uint256) {
-        return lotteryManager.getSMALL_PRIZE_PERCENTAGE();
-    }
-    function getFLEX_COMMISSION() external view returns (uint256) {
-        return lotteryManager.getFLEX_COMMISSION();
+    function changeBlocksWait(uint256 _blocksToClose, uint256 _blocksToDraw) internal override {
+        lotteryManager.setBlocksWait(_blocksToClose, _blocksToDraw);
     }
-    function getMINI_PRIZE_PERCENTAGE() external view returns (uint256) {
-        return lotteryManager.getMINI_PRIZE_PERCENTAGE();
-    }
-    function getBlocksWait() external view returns (uint256, uint256) {
-        return lotteryManager.getBlocksWait();
+
+    function miniPrizeWinnerCount() internal view override returns (uint256) {
+        return lotteryManager.getMiniPrizeWinners();
     }
-    
-    receive() external payable {
-        (bool success, ) = address(lotteryManager).call{value: msg.value}("");
-        require(success, "Failed to forward Ether to LotteryManager");
+
+    function changeMiniPrizeWinners(uint256 _winners) internal override {
+        lotteryManager.setMiniPrizeWinners(_winners);
     }
 
-    // Function to claimPrize from the contract
-    function claimPrize(address user) external {
-        lotteryManager.claimPrize(user);
-        updateBlockStatus();
+    function claimPendingPrize(address winner) internal override returns (uint256) {
+        return lotteryManager.claimPrize(winner);
     }
 
-    function getPendingPrize(address user) external view returns (uint256) {
-        return lotteryManager.getPendingPrize(user);
+    function pendingPrizeOf(address winner) internal view override returns (uint256) {
+        return lotteryManager.getPendingPrize(winner);
     }
-}
\ No newline at end of file
+}
@@ -20,117 +20,416 @@ pragma solidity ^0.8.2;
         bytes32 ticketHashWithStrong; // Hash of the ticket data with strong
     }
     
-contract TicketManager {
+// Ticket operations the lottery relies on while entering and drawing tickets
+abstract contract TicketRoundOperations {
+    function enterTicket(address _player, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _lotteryRound)
+        internal virtual returns (bool, uint256);
+    function enterTickets(
+        address _player,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _lotteryRound
+    ) internal virtual returns (bool, uint256[] memory);
+    function markTicket(address _player, uint256 _ticketId, TicketStatus _status) internal virtual returns (bool);
+    function ticketEntryState(address _player, uint256 _ticketId) internal view virtual returns (uint256, TicketStatus);
+    function finalizeTicketsRound(uint256 _lotteryRound) internal virtual;
+}
+
+// Ticket operations the ticket system uses to sell and show tickets. TicketStore implements them
+// in place, a ticket system fronting a separate TicketManager forwards them as external calls
+abstract contract TicketOperations {
+    function issueTickets(address _buyer, uint256 _count) internal virtual returns (uint256);
+    function ticketsByStatus(address _player, TicketStatus _status) internal view virtual returns (uint256[] memory);
+    function ticketData(address _player, uint256 _ticketId) internal view virtual returns (TicketData memory);
+    function playerTicketList(address _player) internal view virtual returns (TicketData[] memory);
+    function playerTicketPage(address _player, uint256 _offset, uint256 _limit)
+        internal view virtual returns (TicketData[] memory tickets, uint256 total);
+    function ticketCountsByStatus(address _player) internal view virtual returns (uint256[6] memory counts);
+    function currentTicketPrice() internal view virtual returns (uint256);
+}
+
+// Ticket storage and logic, shared by TicketManager and the single-contract UnifiedTicketSystem
+abstract contract TicketStore is TicketRoundOperations, TicketOperations {
+
+    // Storage layout of a ticket: id, timestamp, round, status and index position share a single
+    // slot and the owner is the player whose list holds the ticket. Exposed to callers as TicketData
+    struct StoredTicket {
+        uint64 id;
+        uint64 creationTimestamp;
+        uint64 lotteryRound;
+        TicketStatus status;
+        uint32 indexPosition;  // Position of the ticket in the status or round index that holds it
+        bytes32 ticketHash;
+        bytes32 ticketHashWithStrong;
+    }
+
+    struct TicketLocation {
+        address owner;  // Player whose ticket list holds the ticket
+        uint96 slot;    // Index of the ticket inside playerTickets[owner]
+    }
 
 
     address[] private players; // Store all addresses
 
-    mapping(address => TicketData[]) private playerTickets;
+    mapping(address => StoredTicket[]) private playerTickets;
+    mapping(uint256 => TicketLocation) private ticketLocations; // Ticket ID => owner and array slot
+
+    // Slots in playerTickets of a player's tickets per status, unordered. Tickets entered in a round
+    // are indexed per round instead, so the tickets of a finalized round turn USED without moving
+    mapping(address => mapping(TicketStatus => uint32[])) private slotsByStatus;
+    mapping(address => mapping(uint256 => uint32[])) private slotsByRound;
+    mapping(address => uint64[]) private playerRounds; // Rounds the player entered tickets in, ascending
     uint256 private ticketIDCounter; // Counter for ticket IDs
     // address private immutable i_owner;
     uint256 private ticketPrice;
 
+    uint256 private lastFinalizedRound;       // Tickets still IN_LOTTERY in a round up to this one count as USED
+
     constructor(uint256 _initialTicketPrice) {
         // i_owner = msg.sender;
         ticketPrice = _initialTicketPrice;
         ticketIDCounter = 1;
     }
 
+    function finalizeTicketsRound(uint256 _lotteryRound) internal override {
+        if (_lotteryRound > lastFinalizedRound) {
+            lastFinalizedRound = _lotteryRound;
+        }
+    }
 
-    // Purchase a ticket and store the time of purchase
-    function purchaseTicket(address _buyer) external payable returns (uint256) {
-        uint256 ticketId = ticketIDCounter;
+    // Issue `_count` tickets to the buyer, IDs are consecutive starting from the returned one
+    function issueTickets(address _buyer, uint256 _count) internal override returns (uint256 firstTicketId) {
+        firstTicketId = ticketIDCounter;
+        StoredTicket[] storage tickets = playerTickets[_buyer];
 
-        if (playerTickets[_buyer].length == 0)
+        uint256 slot = tickets.length;
+        if (slot == 0)
             players.push(_buyer); // Store only new addresses
 
-        playerTickets[_buyer].push(TicketData({
-            id: ticketId,
-            owner: _buyer,
-            creationTimestamp: block.timestamp,  // Store the timestamp of ticket purchase
-            status: TicketStatus.ACTIVE,
-            lotteryRound: 0,
-            ticketHash: 0,
-            ticketHashWithStrong: 0
-        }));
+        uint32[] storage activeSlots = slotsByStatus[_buyer][TicketStatus.ACTIVE];
+        uint256 position = activeSlots.length;
+        for (uint256 i = 0; i < _count; i++) {
+            uint256 ticketId = firstTicketId + i;
+            ticketLocations[ticketId] = TicketLocation({ owner: _buyer, slot: uint96(slot + i) });
+            activeSlots.push(uint32(slot + i));
+            tickets.push(StoredTicket({
+                id: uint64(ticketId),
+                creationTimestamp: uint64(block.timestamp),  // Store the timestamp of ticket purchase
+                lotteryRound: 0,
+                status: TicketStatus.ACTIVE,
+                indexPosition: uint32(position + i),
+                ticketHash: 0,
+                ticketHashWithStrong: 0
+            }));
+        }
 
-        ticketIDCounter++;
+        ticketIDCounter = firstTicketId + _count;
+    }
 
-        return ticketId;
+    function enterTickets(
+        address _player,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _lotteryRound
+    ) internal override returns (bool, uint256[] memory creationTimestamps) {
+        creationTimestamps = new uint256[](_ticketIds.length);
+        for (uint256 i = 0; i < _ticketIds.length; i++) {
+            (bool entered, uint256 creationTimestamp) =
+                enterTicket(_player, _ticketIds[i], _ticketHashes[i], _ticketHashesWithStrong[i], _lotteryRound);
+            if (!entered) {
+                return (false, new uint256[](0));
+            }
+            creationTimestamps[i] = creationTimestamp;
+        }
+        return (true, creationTimestamps);
     }
 
-    // Set the ticket in a lottery round
-    function setTicketInLottery(address _player, uint256 _ticketId, bytes32 _ticketHash,bytes32 _ticketHashWithStrong,uint256 _lotteryRound) 
-        external 
-        returns (bool) 
+    function enterTicket(address _player, uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong, uint256 _lotteryRound)
+        internal
+        override
+        returns (bool, uint256)
     {
-        TicketData[] storage tickets = playerTickets[_player];
-        uint256 length = tickets.length;
+        (bool found, uint256 slot) = findTicket(_player, _ticketId);
+        if (!found) return (false, 0);
 
-        for (uint256 i; i < length; ++i) { // Preload length and use ++i for gas savings
-            if (tickets[i].id == _ticketId) {
-                require(tickets[i].status == TicketStatus.ACTIVE, "Ticket must be active to enter lottery");
+        StoredTicket[] storage tickets = playerTickets[_player];
+        StoredTicket storage ticket = tickets[slot];
+        require(ticket.status == TicketStatus.ACTIVE, "Ticket must be active to enter lottery");
 
-                tickets[i].status = TicketStatus.IN_LOTTERY;
-                tickets[i].lotteryRound = _lotteryRound;
-                tickets[i].ticketHash = _ticketHash;
-                tickets[i].ticketHashWithStrong = _ticketHashWithStrong;
-
-                return true;
-            }
+        removeFromIndex(slotsByStatus[_player][TicketStatus.ACTIVE], tickets, ticket);
+        uint64[] storage rounds = playerRounds[_player];
+        if (rounds.length == 0 || rounds[rounds.length - 1] != _lotteryRound) {
+            rounds.push(uint64(_lotteryRound));
         }
+        addToIndex(slotsByRound[_player][_lotteryRound], ticket, slot);
 
-        return false;
+        ticket.status = TicketStatus.IN_LOTTERY;
+        ticket.lotteryRound = uint64(_lotteryRound);
+        ticket.ticketHash = _ticketHash;
+        ticket.ticketHashWithStrong = _ticketHashWithStrong;
+
+        return (true, ticket.creationTimestamp);
     }
 
-    function markTicketAsStatus(address _player, uint256 _ticketId, TicketStatus _status) 
-        external 
+    function markTicket(address _player, uint256 _ticketId, TicketStatus _status) 
+        internal 
+        override
         returns (bool) 
     {
-        TicketData[] storage tickets = playerTickets[_player];
-        uint256 length = tickets.length;
+        (bool found, uint256 slot) = findTicket(_player, _ticketId);
+        if (!found) return false;
 
-        for (uint256 i; i < length; ++i) { // Use preloaded length and ++i for gas optimization
-            if (tickets[i].id == _ticketId) {
-                require(tickets[i].status == TicketStatus.IN_LOTTERY, "Ticket is not in the lottery");
+        StoredTicket[] storage tickets = playerTickets[_player];
+        StoredTicket storage ticket = tickets[slot];
+        require(effectiveStatus(ticket) == TicketStatus.IN_LOTTERY, "Ticket is not in the lottery");
+        require(_status != TicketStatus.IN_LOTTERY, "Ticket is already in the lottery");
 
-                tickets[i].status = _status;
-                return true;
-            }
+        removeFromIndex(slotsByRound[_player][ticket.lotteryRound], tickets, ticket);
+        addToIndex(slotsByStatus[_player][_status], ticket, slot);
+        ticket.status = _status;
+        return true;
+    }
+
+    // IDs of the player's tickets in `_status`, read from the indexes in O(matching tickets).
+    // USED tickets also walk the rounds the player entered
+    function ticketsByStatus(address _player, TicketStatus _status) 
+        internal 
+        view 
+        override
+        returns (uint256[] memory ticketIds) 
+    {
+        StoredTicket[] storage tickets = playerTickets[_player];
+        if (_status == TicketStatus.IN_LOTTERY) {
+            uint256 round = lastEnteredRound(_player);
+            if (round <= lastFinalizedRound) return new uint256[](0);
+            uint32[] storage entered = slotsByRound[_player][round];
+            ticketIds = new uint256[](entered.length);
+            copyIds(entered, tickets, ticketIds, 0);
+            return ticketIds;
+        }
+
+        uint32[] storage slots = slotsByStatus[_player][_status];
+        if (_status != TicketStatus.USED) {
+            ticketIds = new uint256[](slots.length);
+            copyIds(slots, tickets, ticketIds, 0);
+            return ticketIds;
         }
 
-        return false;
+        // Tickets marked USED, then the tickets left in every finalized round the player entered
+        ticketIds = new uint256[](ticketCountsByStatus(_player)[uint256(TicketStatus.USED)]);
+        uint256 filled = copyIds(slots, tickets, ticketIds, 0);
+        uint64[] storage rounds = playerRounds[_player];
+        for (uint256 i = 0; i < rounds.length && rounds[i] <= lastFinalizedRound; i++) {
+            filled = copyIds(slotsByRound[_player][rounds[i]], tickets, ticketIds, filled);
+        }
     }
 
-    // Get tickets by a specific status
-    function getTicketsByStatus(address _player, TicketStatus _status) 
-        external 
+    function ticketData(address _player, uint256 _ticketId) 
+        internal 
         view 
-        returns (uint256[] memory) 
+        override
+        returns (TicketData memory) 
     {
-        TicketData[] storage tickets = playerTickets[_player];
-        uint256 count = 0;
+        (bool found, uint256 slot) = findTicket(_player, _ticketId);
+        require(found, "Ticket not found");
 
-        // First, count matching tickets
-        for (uint256 i = 0; i < tickets.length; i++) {
-            if (tickets[i].status == _status) {
-                count++;
-            }
+        return toTicketData(playerTickets[_player][slot], _player);
+    }
+
+    function ticketEntryState(address _player, uint256 _ticketId)
+        internal
+        view
+        override
+        returns (uint256, TicketStatus)
+    {
+        (bool found, uint256 slot) = findTicket(_player, _ticketId);
+        require(found, "Ticket not found");
+
+        StoredTicket storage ticket = playerTickets[_player][slot];
+        return (ticket.creationTimestamp, effectiveStatus(ticket));
+    }
+
+    function playerTicketList(address _player) internal view override returns (TicketData[] memory) {
+        StoredTicket[] storage storedTickets = playerTickets[_player];
+        TicketData[] memory tickets = new TicketData[](storedTickets.length);
+
+        for (uint256 i = 0; i < storedTickets.length; i++) {
+            tickets[i] = toTicketData(storedTickets[i], _player);
         }
+        return tickets;
+    }
 
-        // Create array with the exact size
-        uint256[] memory filteredTickets = new uint256[](count);
-        uint256 index = 0;
+    // Tickets `_offset` to `_offset + _limit` of the player's list, and the length of the whole list
+    function playerTicketPage(address _player, uint256 _offset, uint256 _limit)
+        internal
+        view
+        override
+        returns (TicketData[] memory tickets, uint256 total)
+    {
+        StoredTicket[] storage storedTickets = playerTickets[_player];
+        total = storedTickets.length;
+        uint256 end = _offset >= total ? _offset : (total - _offset > _limit ? _offset + _limit : total);
+
+        tickets = new TicketData[](end - _offset);
+        for (uint256 i = _offset; i < end; i++) {
+            tickets[i - _offset] = toTicketData(storedTickets[i], _player);
+        }
+    }
 
-        // Populate the array
-        for (uint256 i = 0; i < tickets.length; i++) {
-            if (tickets[i].status == _status) {
-                filteredTickets[index] = tickets[i].id;
-                index++;
+    // Number of the player's tickets in every status, indexed by TicketStatus, in constant time.
+    // Tickets that are in no other status are USED
+    function ticketCountsByStatus(address _player) internal view override returns (uint256[6] memory counts) {
+        uint256 round = lastEnteredRound(_player);
+        uint256 counted;
+        for (uint256 status = 0; status < counts.length; status++) {
+            if (status == uint256(TicketStatus.IN_LOTTERY)) {
+                counts[status] = round > lastFinalizedRound ? slotsByRound[_player][round].length : 0;
+            } else if (status != uint256(TicketStatus.USED)) {
+                counts[status] = slotsByStatus[_player][TicketStatus(status)].length;
             }
+            counted += counts[status];
+        }
+        counts[uint256(TicketStatus.USED)] = playerTickets[_player].length - counted;
+    }
+
+    function currentTicketPrice() internal view override returns (uint256) {
+        return ticketPrice;
+    }
+
+    // Resolve a ticket ID to its slot in the player's ticket list in constant time
+    function findTicket(address _player, uint256 _ticketId) private view returns (bool found, uint256 slot) {
+        TicketLocation storage location = ticketLocations[_ticketId];
+        if (location.owner != _player || _player == address(0)) {
+            return (false, 0);
+        }
+        return (true, location.slot);
+    }
+
+    // Latest round the player entered tickets in, 0 if none
+    function lastEnteredRound(address _player) private view returns (uint256) {
+        uint64[] storage rounds = playerRounds[_player];
+        return rounds.length == 0 ? 0 : rounds[rounds.length - 1];
+    }
+
+    // Add the ticket at `_slot` to an index and remember where it sits
+    function addToIndex(uint32[] storage index, StoredTicket storage ticket, uint256 _slot) private {
+        ticket.indexPosition = uint32(index.length);
+        index.push(uint32(_slot));
+    }
+
+    // Remove a ticket from the index holding it by moving the last entry into its place
+    function removeFromIndex(uint32[] storage index, StoredTicket[] storage tickets, StoredTicket storage ticket) private {
+        uint256 position = ticket.indexPosition;
+        uint256 last = index.length - 1;
+        if (position != last) {
+            uint32 movedSlot = index[last];
+            index[position] = movedSlot;
+            tickets[movedSlot].indexPosition = uint32(position);
         }
+        index.pop();
+    }
+
+    // Write the IDs of the indexed tickets into `ticketIds` from `start`, returns the next free position
+    function copyIds(uint32[] storage index, StoredTicket[] storage tickets, uint256[] memory ticketIds, uint256 start)
+        private
+        view
+        returns (uint256)
+    {
+        for (uint256 i = 0; i < index.length; i++) {
+            ticketIds[start + i] = tickets[index[i]].id;
+        }
+        return start + index.length;
+    }
+
+    // Status of a ticket, with tickets left in an already drawn round reported as USED
+    function effectiveStatus(StoredTicket storage ticket) private view returns (TicketStatus) {
+        TicketStatus status = ticket.status;
+        if (status == TicketStatus.IN_LOTTERY && ticket.lotteryRound <= lastFinalizedRound) {
+            return TicketStatus.USED;
+        }
+        return status;
+    }
+
+    // Unpack a stored ticket into the TicketData returned to callers
+    function toTicketData(StoredTicket storage ticket, address _owner) private view returns (TicketData memory) {
+        return TicketData({
+            id: ticket.id,
+            owner: _owner,
+            creationTimestamp: ticket.creationTimestamp,
+            status: effectiveStatus(ticket),
+            lotteryRound: ticket.lotteryRound,
+            ticketHash: ticket.ticketHash,
+            ticketHashWithStrong: ticket.ticketHashWithStrong
+        });
+    }
+}
+
+contract TicketManager is TicketStore {
+    address private immutable i_ticketSystem; // Contract that deployed this manager
+    address private lotteryManager;           // Only contract allowed to finalize rounds
+
+    constructor(uint256 _initialTicketPrice) TicketStore(_initialTicketPrice) {
+        i_ticketSystem = msg.sender;
+    }
+
+    function setLotteryManager(address _lotteryManager) external {
+        require(msg.sender == i_ticketSystem, "Only the ticket system can set the lottery manager");
+        require(lotteryManager == address(0), "Lottery manager already set");
+        lotteryManager = _lotteryManager;
+    }
+
+    // Retire every ticket left IN_LOTTERY in rounds up to `_lotteryRound` without touching them one by one
+    function finalizeRound(uint256 _lotteryRound) external {
+        require(msg.sender == lotteryManager, "Only the lottery manager can finalize rounds");
+        finalizeTicketsRound(_lotteryRound);
+    }
+
+    // Purchase a ticket and store the time of purchase
+    function purchaseTicket(address _buyer) external payable returns (uint256) {
+        return issueTickets(_buyer, 1);
+    }
+
+    // Purchase several tickets at once, IDs are consecutive starting from the returned one
+    function purchaseTickets(address _buyer, uint256 _count) external payable returns (uint256) {
+        return issueTickets(_buyer, _count);
+    }
 
-        return filteredTickets;
+    // Set the ticket in a lottery round
+    // Returns the ticket's creation timestamp so the lottery can keep its hold-time weights
+    function setTicketInLottery(address _player, uint256 _ticketId, bytes32 _ticketHash,bytes32 _ticketHashWithStrong,uint256 _lotteryRound) 
+        external 
+        returns (bool, uint256) 
+    {
+        return enterTicket(_player, _ticketId, _ticketHash, _ticketHashWithStrong, _lotteryRound);
+    }
+
+    // Set several tickets of one player in a lottery round, returns their creation timestamps
+    function setTicketsInLottery(
+        address _player,
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong,
+        uint256 _lotteryRound
+    ) external returns (bool, uint256[] memory) {
+        return enterTickets(_player, _ticketIds, _ticketHashes, _ticketHashesWithStrong, _lotteryRound);
+    }
+
+    function markTicketAsStatus(address _player, uint256 _ticketId, TicketStatus _status) 
+        external 
+        returns (bool) 
+    {
+        return markTicket(_player, _ticketId, _status);
+    }
+
+    // Get tickets by a specific status, in no particular order
+    function getTicketsByStatus(address _player, TicketStatus _status) 
+        external 
+        view 
+        returns (uint256[] memory) 
+    {
+        return ticketsByStatus(_player, _status);
     }
 
     // Get detailed ticket information
@@ -139,25 +438,39 @@ contract TicketManager {
         view 
         returns (TicketData memory) 
     {
-        TicketData[] storage tickets = playerTickets[_player];
-        uint256 length = tickets.length;
-
-        for (uint256 i; i < length; ++i) { // Use preloaded length and ++i for gas optimization
-            if (tickets[i].id == _ticketId) {
-                return tickets[i];
-            }
-        }
+        return ticketData(_player, _ticketId);
+    }
 
-        revert("Ticket not found");
+    // Get only what the draw needs to weight and classify a ticket
+    function getTicketEntryState(address _player, uint256 _ticketId)
+        external
+        view
+        returns (uint256 creationTimestamp, TicketStatus status)
+    {
+        return ticketEntryState(_player, _ticketId);
     }
 
     // Get all tickets for a player
     function getPlayerTickets(address _player) external view returns (TicketData[] memory) {
-        return playerTickets[_player];
+        return playerTicketList(_player);
+    }
+
+    // Get a page of a player's tickets and the total number of tickets
+    function getPlayerTicketsPage(address _player, uint256 _offset, uint256 _limit)
+        external
+        view
+        returns (TicketData[] memory tickets, uint256 total)
+    {
+        return playerTicketPage(_player, _offset, _limit);
+    }
+
+    // Get how many tickets of a player are in each status
+    function getTicketCountsByStatus(address _player) external view returns (uint256[6] memory) {
+        return ticketCountsByStatus(_player);
     }
 
     // Get the ticket price
     function getTicketPrice() external view returns (uint256) {
-        return ticketPrice;
+        return currentTicketPrice();
     }
 }
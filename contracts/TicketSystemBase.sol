@@ -0,0 +1,445 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.2;
+
+import "./TicketManager.sol";
+import "./LotteryManager.sol";
+
+// Everything the dashboard shows on a refresh, returned by getDashboardSnapshot
+struct DashboardSnapshot {
+    uint256 ticketPrice;
+    TicketData[] playerTickets;
+    uint256 blocksUntilClose;
+    uint256 blocksUntilDraw;
+    uint256 currentPrizePool;
+    uint256 totalTickets;
+    uint256 currentRound;
+    uint256 flexCommission;
+    uint256 smallPrizePercentage;
+    uint256 miniPrizePercentage;
+}
+
+// Public API of the ticket system, written against the ticket and lottery operations.
+// MainTicketSystem forwards the operations to its TicketManager and LotteryManager, while
+// UnifiedTicketSystem inherits their storage so every operation is an internal call
+abstract contract TicketSystemBase is TicketOperations, LotteryOperations {
+    address private immutable i_owner;
+
+    event LotteryRoundStatusChanged(bool isOpen);
+    event BlockStatusUpdated(uint256 blocksUntilClose, uint256 blocksUntilDraw);
+    event TicketEnteredLottery(uint256 roundNumber, uint256 totalTickets, uint256 prizePool);
+
+
+    event TicketSelected(address indexed user, uint256 ticketId, bool success);
+    event TicketsSelected(address indexed user, uint256[] ticketIds, bool success);
+
+    // History of purchases, draws and claims, enough to rebuild rounds and prizes from logs. The
+    // winners are announced by every draw step in the batch it credited, so no step emits more
+    // winners than its work bound, and RoundDrawn closes the draw with the prizes and numbers
+    event TicketPurchased(address indexed player, uint256 firstTicketId, uint256 count, uint256 ticketPrice);
+    event PrizesCredited(
+        uint256 indexed roundNumber,
+        address[] smallPrizeWinners,
+        address[] bigPrizeWinners,
+        address[] miniPrizeWinners
+    );
+    event RoundDrawn(
+        uint256 indexed roundNumber,
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint8[6] randomNumbers,
+        uint8 strongNumber
+    );
+    event PrizeClaimed(address indexed winner, uint256 amount);
+
+
+    constructor() {
+        i_owner = msg.sender;
+    }
+
+    // Move ticket payments to wherever the prize pool is held
+    function fundPrizePool(uint256 _amount) internal virtual;
+
+    // Ether backing the prize pool and the pending prizes
+    function prizePoolBalance() internal view virtual returns (uint256);
+
+    function updateBlockStatus() public {
+        (uint256 blocksUntilClose, uint256 blocksUntilDraw) = roundBlockStatus();
+        emit BlockStatusUpdated(blocksUntilClose, blocksUntilDraw);
+    }
+
+    function startNewLotteryRound() private {
+        openNextRound();
+        updateBlockStatus();
+        emit LotteryRoundStatusChanged(true);
+        emitRoundDrawn();
+    }
+
+    // Announce the prizes and numbers of the round the draw just finalized, the next one is open
+    function emitRoundDrawn() private {
+        uint256 drawnRound = currentRoundNumber() - 1;
+        (uint256 bigPrize, uint256 smallPrize, uint256 miniPrize, uint256 commission, uint8[6] memory randomNumbers, uint8 strongNumber) =
+            roundDraw(drawnRound);
+        emit RoundDrawn(
+            drawnRound,
+            bigPrize,
+            smallPrize,
+            miniPrize,
+            commission,
+            randomNumbers,
+            strongNumber
+        );
+    }
+
+    // Announce the winners a draw step credited, if any
+    function emitPrizesCredited(uint256 _round, PrizeCredits memory _credits) private {
+        if (_credits.smallPrizeWinners.length + _credits.bigPrizeWinners.length + _credits.miniPrizeWinners.length > 0) {
+            emit PrizesCredited(_round, _credits.smallPrizeWinners, _credits.bigPrizeWinners, _credits.miniPrizeWinners);
+        }
+    }
+
+    function closeLotteryRound() public {
+        closeRound();
+        updateBlockStatus();
+        emit LotteryRoundStatusChanged(false);
+    }
+
+    function canCloseLottery() private returns (bool) {
+        if (roundCanClose()){
+            closeLotteryRound();
+            return true;
+        }
+        return false;
+    }
+
+
+    // Ticket Purchase Functions
+    function purchaseTicket() external payable returns (uint256) {
+        uint256 ticketPrice = currentTicketPrice();
+        require(msg.value >= ticketPrice, "Insufficient payment for ticket");
+
+        uint256 ticketId = issueTickets(msg.sender, 1);
+        emit TicketPurchased(msg.sender, ticketId, 1, ticketPrice);
+
+        fundPrizePool(ticketPrice);
+
+        if (msg.value > ticketPrice) {
+            (bool sent, ) = msg.sender.call{value: msg.value - ticketPrice}("");
+            require(sent, "Refund failed");
+        }
+
+        if (isLotteryActive()) {
+            canCloseLottery();
+        }
+
+        updateBlockStatus();
+        return ticketId;
+    }
+
+    // Purchase several tickets with a single Ether forward, refund and status update
+    function purchaseTickets(uint256 _count) external payable returns (uint256[] memory ticketIds) {
+        require(_count > 0, "Must purchase at least one ticket");
+        uint256 ticketPrice = currentTicketPrice();
+        uint256 totalPrice = ticketPrice * _count;
+        require(msg.value >= totalPrice, "Insufficient payment for tickets");
+
+        uint256 firstTicketId = issueTickets(msg.sender, _count);
+        emit TicketPurchased(msg.sender, firstTicketId, _count, ticketPrice);
+
+        // Fund the prize pool with the price of all tickets at once
+        fundPrizePool(totalPrice);
+
+        if (msg.value > totalPrice) {
+            (bool sent, ) = msg.sender.call{value: msg.value - totalPrice}("");
+            require(sent, "Refund failed");
+        }
+
+        if (isLotteryActive()) {
+            canCloseLottery();
+        }
+
+        updateBlockStatus();
+
+        ticketIds = new uint256[](_count);
+        for (uint256 i = 0; i < _count; i++) {
+            ticketIds[i] = firstTicketId + i;
+        }
+    }
+
+    function selectTicketsForLottery(uint256 _ticketId, bytes32 _ticketHash, bytes32 _ticketHashWithStrong)
+        external
+        returns (bool)
+    {
+        require(_ticketHash != bytes32(0), "Ticket hash cannot be empty");
+        require(_ticketHashWithStrong != bytes32(0), "Strong ticket hash cannot be empty");
+
+        bool success = false;
+        if (isLotteryActive()) {
+            if(canCloseLottery())
+            {
+                updateBlockStatus();
+                emit TicketSelected(msg.sender, _ticketId, false);
+                return false;
+            }
+        }
+        // Verify ticket status is ACTIVE before entering lottery
+        require( ticketData(msg.sender, _ticketId).status == TicketStatus.ACTIVE,
+            "Invalid ticket status"
+        );
+
+        updateBlockStatus();
+        // Add ticket to lottery round
+        success = enterRound(msg.sender, _ticketId, _ticketHash, _ticketHashWithStrong, currentTicketPrice());
+
+        if (success) {
+            emit TicketEnteredLottery(
+                currentRoundNumber(),
+                currentRoundTotalTickets(),
+                currentRoundPrizePool()
+        );
+        }
+        emit TicketSelected(msg.sender, _ticketId, success);
+
+        return success;
+    }
+
+    // Enter several tickets at once, the ticket operations check every ticket is ACTIVE and owned by the sender
+    function selectTicketsForLotteryBatch(
+        uint256[] calldata _ticketIds,
+        bytes32[] calldata _ticketHashes,
+        bytes32[] calldata _ticketHashesWithStrong
+    ) external returns (bool) {
+        uint256 count = _ticketIds.length;
+        require(count > 0, "No tickets selected");
+        require(_ticketHashes.length == count && _ticketHashesWithStrong.length == count, "Ticket data length mismatch");
+        for (uint256 i = 0; i < count; i++) {
+            require(_ticketHashes[i] != bytes32(0), "Ticket hash cannot be empty");
+            require(_ticketHashesWithStrong[i] != bytes32(0), "Strong ticket hash cannot be empty");
+        }
+
+        if (isLotteryActive()) {
+            if(canCloseLottery())
+            {
+                updateBlockStatus();
+                emit TicketsSelected(msg.sender, _ticketIds, false);
+                return false;
+            }
+        }
+
+        updateBlockStatus();
+        bool success = enterRoundBatch(msg.sender, _ticketIds, _ticketHashes, _ticketHashesWithStrong, currentTicketPrice());
+
+        if (success) {
+            emit TicketEnteredLottery(
+                currentRoundNumber(),
+                currentRoundTotalTickets(),
+                currentRoundPrizePool()
+            );
+        }
+        emit TicketsSelected(msg.sender, _ticketIds, success);
+
+        return success;
+    }
+
+    function drawLotteryWinner(bytes32 keccak256HashNumbers, bytes32 keccak256HashFull, uint8[6] memory randomNumbers, uint8 strongNumber) public
+    {
+        require(validate(randomNumbers, strongNumber), "Invalid input data");
+        uint256 drawnRound = currentRoundNumber();
+        (bool finalized, PrizeCredits memory credits) =
+            drawRoundStep(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber, type(uint256).max);
+        require(finalized, "Draw not finalized");
+        emitPrizesCredited(drawnRound, credits);
+        startNewLotteryRound();
+        emit TicketEnteredLottery(
+            currentRoundNumber(),
+            currentRoundTotalTickets(),
+            currentRoundPrizePool()
+        );
+    }
+
+    // Draw the closed round in slices of at most `maxTickets` bucket entries, phase slots,
+    // participants, mini prize draws or prize credits (the phase slots of every 16 tickets of a
+    // participant are weighed once, each participant is put once in the tree the draws descend,
+    // each winner credited once), the next round is opened by the step that finalizes the draw. Every step announces
+    // the winners it credited in PrizesCredited
+    function drawLotteryWinnerStep(
+        bytes32 keccak256HashNumbers,
+        bytes32 keccak256HashFull,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber,
+        uint256 maxTickets
+    ) public returns (bool finalized) {
+        require(validate(randomNumbers, strongNumber), "Invalid input data");
+        uint256 drawnRound = currentRoundNumber();
+        PrizeCredits memory credits;
+        (finalized, credits) = drawRoundStep(keccak256HashNumbers, keccak256HashFull, randomNumbers, strongNumber, maxTickets);
+        emitPrizesCredited(drawnRound, credits);
+        if (finalized) {
+            startNewLotteryRound();
+            emit TicketEnteredLottery(
+                currentRoundNumber(),
+                currentRoundTotalTickets(),
+                currentRoundPrizePool()
+            );
+        }
+    }
+
+    function validate(
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) private pure returns (bool) {
+        if(strongNumber < 1 || strongNumber > 7) {
+            return false; // Strong number must be between 1 and 7
+        }
+        for (uint8 i = 0; i < 6; i++) {
+            if (randomNumbers[i] < 1 || randomNumbers[i] > 37) {
+                return false; // Each number must be between 1 and 37
+            }
+        }
+        return true; // All numbers are valid
+    }
+
+    function getActiveTickets() external view returns (uint256[] memory) {
+        return ticketsByStatus(msg.sender, TicketStatus.ACTIVE);
+    }
+
+    function isLotteryActive() public view  returns (bool) {
+        return roundIsActive();
+    }
+
+    function getTicketPrice() external view returns (uint256) {
+        return currentTicketPrice();
+    }
+
+    function getLotteryRoundInfo(uint256 _index) external view returns (
+        uint256 roundNumber,
+        uint256 totalPrizePool,
+        address[][] memory addressArrays,
+        lotteryStatus status,
+        uint256 bigPrize,
+        uint256 smallPrize,
+        uint256 miniPrize,
+        uint256 commission,
+        uint256 totalTickets,
+        uint8[6] memory randomNumbers,
+        uint8 strongNumber
+    ) {
+        return roundInfo(_index);
+    }
+
+    function getPlayerTickets(address _player) external view returns (TicketData[] memory) {
+        return playerTicketList(_player);
+    }
+
+    // Page through a player's tickets instead of fetching the whole history with getPlayerTickets
+    function getPlayerTicketsPage(address _player, uint256 _offset, uint256 _limit)
+        external
+        view
+        returns (TicketData[] memory tickets, uint256 total)
+    {
+        return playerTicketPage(_player, _offset, _limit);
+    }
+
+    // Number of the player's tickets in every status, indexed by TicketStatus
+    function getTicketCountsByStatus(address _player) external view returns (uint256[6] memory) {
+        return ticketCountsByStatus(_player);
+    }
+
+    // Page through the participants of a round instead of fetching them with getLotteryRoundInfo
+    function getRoundParticipants(uint256 _round, uint256 _offset, uint256 _limit)
+        external
+        view
+        returns (address[] memory participants, uint256 total)
+    {
+        return roundParticipantPage(_round, _offset, _limit);
+    }
+
+    function getLotteryBlockStatus() public view returns (uint256 blocksUntilClose, uint256 blocksUntilDraw) {
+        return roundBlockStatus();
+    }
+
+    function getContractBlance() public view returns (uint balance)
+    {
+        return prizePoolBalance();
+    }
+
+    function getCurrentWinners() external view returns (
+    address[] memory smallPrizeWinners,
+    address[] memory bigPrizeWinners,
+    address[] memory miniPrizeWinners
+    ) {
+        return currentRoundWinners();
+    }
+
+    function getCurrentPrizePool() external view returns (uint256) {
+        return currentRoundPrizePool();
+    }
+
+    function getCurrentTotalTickets() external view returns (uint256) {
+        return currentRoundTotalTickets();
+    }
+
+    function getCurrentRound() external view returns (uint256) {
+        return currentRoundNumber();
+    }
+
+    function getSMALL_PRIZE_PERCENTAGE() external pure returns (uint256) {
+        return SMALL_PRIZE_PERCENTAGE;
+    }
+    function getFLEX_COMMISSION() external pure returns (uint256) {
+        return FLEX_COMMISSION;
+    }
+    function getMINI_PRIZE_PERCENTAGE() external pure returns (uint256) {
+        return MINI_PRIZE_PERCENTAGE;
+    }
+
+    // Read everything the dashboard refreshes in one call instead of one call per getter
+    function getDashboardSnapshot(address _player) external view returns (DashboardSnapshot memory snapshot) {
+        snapshot.ticketPrice = currentTicketPrice();
+        snapshot.playerTickets = playerTicketList(_player);
+        (snapshot.blocksUntilClose, snapshot.blocksUntilDraw) = roundBlockStatus();
+        snapshot.currentPrizePool = currentRoundPrizePool();
+        snapshot.totalTickets = currentRoundTotalTickets();
+        snapshot.currentRound = currentRoundNumber();
+        snapshot.flexCommission = FLEX_COMMISSION;
+        snapshot.smallPrizePercentage = SMALL_PRIZE_PERCENTAGE;
+        snapshot.miniPrizePercentage = MINI_PRIZE_PERCENTAGE;
+    }
+
+    function getBlocksWait() external view returns (uint256, uint256) {
+        return blocksWait();
+    }
+
+    // Owner can stretch the round length, e.g. to assemble large rounds in benchmarks
+    function setBlocksWait(uint256 _blocksToClose, uint256 _blocksToDraw) external {
+        require(msg.sender == i_owner, "Only owner can change the block waits");
+        changeBlocksWait(_blocksToClose, _blocksToDraw);
+        updateBlockStatus();
+    }
+
+    function getMiniPrizeWinners() external view returns (uint256) {
+        return miniPrizeWinnerCount();
+    }
+
+    // Owner can split the mini prize between several tickets, applies from the next draw
+    function setMiniPrizeWinners(uint256 _winners) external {
+        require(msg.sender == i_owner, "Only owner can change the mini prize winners");
+        changeMiniPrizeWinners(_winners);
+    }
+
+    receive() external payable {
+        fundPrizePool(msg.value);
+    }
+
+    // Function to claimPrize from the contract
+    function claimPrize(address user) external {
+        uint256 amount = claimPendingPrize(user);
+        emit PrizeClaimed(user, amount);
+        updateBlockStatus();
+    }
+
+    function getPendingPrize(address user) external view returns (uint256) {
+        return pendingPrizeOf(user);
+    }
+}
@@ -0,0 +1,20 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.2;
+
+import "./TicketManager.sol";
+import "./LotteryManager.sol";
+import "./TicketSystemBase.sol";
+
+// Single-contract deployment with the MainTicketSystem ABI. Tickets, rounds and the prize pool
+// live in this contract, so the ticket and lottery operations are internal calls
+contract UnifiedTicketSystem is TicketSystemBase, TicketStore, LotteryStore {
+
+    constructor() TicketStore(1 ether) LotteryStore(msg.sender) {}
+
+    // Ticket payments already sit in this contract's balance
+    function fundPrizePool(uint256) internal pure override {}
+
+    function prizePoolBalance() internal view override returns (uint256) {
+        return address(this).balance;
+    }
+}
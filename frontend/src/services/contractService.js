@@ -8,6 +8,9 @@ const CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3";
 
 const WS_PROVIDER_URL = 'ws://127.0.0.1:8545';
 
+// Winning draws, served locally by `python -m scripts.randomness_service`
+const RANDOMNESS_URL = process.env.REACT_APP_RANDOMNESS_URL || 'http://127.0.0.1:8600/randomNum/random';
+
 class ContractService {
     constructor() {
         this.web3MM = null; // Metamask Web3
@@ -388,20 +391,7 @@ class ContractService {
             
             if (blockStatus.blocksUntilDraw === "0") {
                 // Go straight to send when keysUntilClose is 0
-                const response = await fetch("https://h431j7ev85.execute-api.eu-north-1.amazonaws.com/randomNum/random");
-                if (!response.ok) {
-                    throw new Error(`Random number API returned status ${response.status}`);
-                }
-                const data = await response.json();
-                const parsedBody = JSON.parse(data.body);
-                let keccak256HashNumbers = "0x" + parsedBody.keccak256_hash_numbers;
-                let keccak256HashFull = "0x" + parsedBody.keccak256_hash_full;
-                let random_numbers = parsedBody.random_numbers;
-                let strong_number = parsedBody.strong_number;
-                // Validate the hashes before sending
-                if (!this.validateHash(keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number)) {
-                    throw new Error("Hash validation failed.");
-                }
+                const { keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number } = await this.fetchWinningDraw();
                 const tx = await contract.methods.drawLotteryWinner(keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number)
                     .send({ from: this.account });
                 
@@ -424,20 +414,7 @@ class ContractService {
                 return { success: false, message: `Cannot draw winner: ${canDraw.error}` };
             }
         
-            const response = await fetch("https://h431j7ev85.execute-api.eu-north-1.amazonaws.com/randomNum/random");
-            if (!response.ok) {
-                throw new Error(`Random number API returned status ${response.status}`);
-            }        
-            const data = await response.json();
-            const parsedBody = JSON.parse(data.body);
-            let keccak256HashNumbers = "0x" + parsedBody.keccak256_hash_numbers;
-            let keccak256HashFull = "0x" + parsedBody.keccak256_hash_full;
-            let random_numbers = parsedBody.random_numbers;
-            let strong_number = parsedBody.strong_number;
-            // Validate the hashes before sending
-            if (!this.validateHash(keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number, random_numbers, strong_number)) {
-                throw new Error("Hash validation failed.");
-            }
+            const { keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number } = await this.fetchWinningDraw();
             const tx = await contract.methods.drawLotteryWinner(keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number)
                 .send({ from: this.account });
             
@@ -448,6 +425,25 @@ class ContractService {
             throw new Error(`Failed to draw lottery winner: ${revertReason}`);
         }
     }
+    async fetchWinningDraw() {
+        const response = await fetch(RANDOMNESS_URL);
+        if (!response.ok) {
+            throw new Error(`Random number API returned status ${response.status}`);
+        }
+        const data = await response.json();
+        const parsedBody = JSON.parse(data.body);
+        const draw = {
+            keccak256HashNumbers: "0x" + parsedBody.keccak256_hash_numbers,
+            keccak256HashFull: "0x" + parsedBody.keccak256_hash_full,
+            random_numbers: parsedBody.random_numbers,
+            strong_number: parsedBody.strong_number,
+        };
+        // Validate the hashes before sending
+        if (!this.validateHash(draw.keccak256HashNumbers, draw.keccak256HashFull, draw.random_numbers, draw.strong_number)) {
+            throw new Error("Hash validation failed.");
+        }
+        return draw;
+    }
     validateHash(keccak256HashNumbers, keccak256HashFull, random_numbers, strong_number)
     {
         const numbersString = [...random_numbers.sort((a, b) => a - b)].join('');
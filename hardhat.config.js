@@ -2,14 +2,20 @@ require("@nomicfoundation/hardhat-toolbox");
 
 /** @type import('hardhat/config').HardhatUserConfig */
 module.exports = {
-  solidity: "0.8.20",
-  settings: {
-    optimizer: {
-      enabled: true,
-      runs: 200, // Balance size and deployment cost
+  solidity: {
+    version: "0.8.20",
+    settings: {
+      optimizer: {
+        enabled: true,
+        runs: 200, // Balance size and deployment cost
+      },
+      viaIR: true, // As in brownie-config.yaml, the shared ticket system base needs the IR pipeline
     },
   },
   networks: {
+  hardhat: {
+    allowUnlimitedContractSize: true, // UnifiedTicketSystem can exceed the 24KB contract size limit of public chains
+  },
   localhost: {
     url: process.env.HARDHAT_NODE_URL || "http://127.0.0.1:8545",
   },
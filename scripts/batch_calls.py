@@ -0,0 +1,66 @@
+"""Read several ticket system views in a single JSON-RPC batch.
+
+    price, tickets, pool = batch_call([
+        (system.getTicketPrice,),
+        (system.getPlayerTickets, player),
+        (system.getCurrentPrizePool,),
+    ])
+
+Every view becomes an eth_call, the calls are posted together as one JSON-RPC batch to the HTTP
+endpoint brownie is connected to and their results decoded the way brownie decodes a call. The
+batch is built by hand rather than with web3's batching, so it works with every web3 version
+brownie pins. Works with any contract method brownie can call.
+dashboard_calls lists the reads of the dashboard refresh, which getDashboardSnapshot returns
+in one call.
+"""
+import requests
+from brownie import web3
+from brownie.exceptions import VirtualMachineError
+
+BATCH_TIMEOUT = 30 # Seconds before the batch request fails
+
+
+def batch_call(calls, sender=None, block_identifier="latest"):
+    """Results of `calls`, (method, *args) tuples, read at `block_identifier` in one batch.
+    `sender` is the msg.sender of every call, for views such as getActiveTickets"""
+    if block_identifier not in ("latest", "pending", "earliest", "safe", "finalized"):
+        block_identifier = hex(block_identifier)
+    payload = []
+    for i, (method, *args) in enumerate(calls):
+        tx = {'to': method._address, 'data': method.encode_input(*args)}
+        if sender is not None:
+            tx['from'] = str(sender)
+        payload.append({"jsonrpc": "2.0", "id": i, "method": "eth_call", "params": [tx, block_identifier]})
+
+    response = requests.post(web3.provider.endpoint_uri, json=payload, timeout=BATCH_TIMEOUT)
+    response.raise_for_status()
+    replies = response.json()
+    if not isinstance(replies, list):
+        raise ValueError(f"Batch request failed: {replies.get('error')}")
+    responses = []
+    for reply in sorted(replies, key=lambda reply: reply["id"]):
+        if "error" in reply:
+            raise VirtualMachineError(ValueError(reply["error"])) from None
+        responses.append(reply["result"])
+
+    results = []
+    for (method, *_), data in zip(calls, responses):
+        if method.abi["outputs"] and data in ("", "0x"):
+            raise ValueError(f"{method.abi['name']} returned no data - the call likely reverted")
+        results.append(method.decode_output(data))
+    return results
+
+
+def dashboard_calls(system, player):
+    """The views the dashboard refresh reads, in the order of getDashboardSnapshot's fields"""
+    return [
+        (system.getTicketPrice,),
+        (system.getPlayerTickets, player),
+        (system.getLotteryBlockStatus,),
+        (system.getCurrentPrizePool,),
+        (system.getCurrentTotalTickets,),
+        (system.getCurrentRound,),
+        (system.getFLEX_COMMISSION,),
+        (system.getSMALL_PRIZE_PERCENTAGE,),
+        (system.getMINI_PRIZE_PERCENTAGE,),
+    ]
@@ -0,0 +1,62 @@
+"""Time the Brownie suite with 1, 2, 4 and 8 pytest-xdist workers.
+
+Every worker runs its own local chain (see tests/conftest.py), one worker is the plain
+serial run. Usage from the project root:
+
+    python scripts/benchmark_workers.py [--workers 1 2 4 8] [pytest options...]
+
+Prints a markdown table and writes it with the raw timings to reports/worker_benchmark.json.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+WORKER_COUNTS = [1, 2, 4, 8]
+BENCHMARK_REPORT = os.path.join("reports", "worker_benchmark.json")
+
+
+def run_suite(workers, pytest_args):
+    """Wall time in seconds and exit code of one `brownie test` run with `workers` workers"""
+    command = ["brownie", "test", *pytest_args]
+    if workers > 1:
+        command += ["-n", str(workers)]
+    start = time.perf_counter()
+    exit_code = subprocess.call(command)
+    return time.perf_counter() - start, exit_code
+
+
+def format_table(results):
+    """Markdown table of the runs, speedup is relative to the first one"""
+    baseline = results[0]["seconds"]
+    rows = ["| Workers | Wall time (s) | Speedup | Exit code |", "| ---: | ---: | ---: | ---: |"]
+    for result in results:
+        rows.append(
+            f"| {result['workers']} | {result['seconds']:.1f} | {baseline / result['seconds']:.2f}x | {result['exit_code']} |"
+        )
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKER_COUNTS)
+    args, pytest_args = parser.parse_known_args()
+
+    results = []
+    for workers in args.workers:
+        seconds, exit_code = run_suite(workers, pytest_args)
+        results.append({"workers": workers, "seconds": round(seconds, 3), "exit_code": exit_code})
+        print(f"{workers} worker(s): {seconds:.1f}s, exit code {exit_code}", flush=True)
+
+    table = format_table(results)
+    print(table)
+    os.makedirs(os.path.dirname(BENCHMARK_REPORT), exist_ok=True)
+    with open(BENCHMARK_REPORT, "w") as report:
+        json.dump({"runs": results, "table": table}, report, indent=2)
+    return 0 if all(result["exit_code"] == 0 for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
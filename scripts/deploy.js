@@ -1,9 +1,11 @@
 const hre = require("hardhat");
 
 async function main() {
-  const MainTicketSystem = await hre.ethers.getContractFactory("MainTicketSystem");
+  // UnifiedTicketSystem serves the same ABI from a single contract
+  const contractName = process.env.TICKET_SYSTEM || "MainTicketSystem";
+  const TicketSystem = await hre.ethers.getContractFactory(contractName);
   // Deploy the contract
-  const ticketSystem = await MainTicketSystem.deploy();
+  const ticketSystem = await TicketSystem.deploy();
   
   // Wait for the contract to be mined and deployed
   await ticketSystem.waitForDeployment();
@@ -12,7 +14,7 @@ async function main() {
   const address = await ticketSystem.getAddress();
   
   console.log(
-    `MainTicketSystem deployed to ${address}`
+    `${contractName} deployed to ${address}`
   );
 }
 
@@ -0,0 +1,41 @@
+"""Per-function gas statistics of a test run and their comparison with a baseline run.
+
+The test suite's conftest writes summarize_gas of the gas it records to the gas report, and fails
+the run when find_gas_regressions reports a function over a previous report.
+"""
+import math
+import statistics
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize_gas(gas_samples):
+    """Count, min, median, p95 and max gas of every function"""
+    return {
+        function: {
+            "count": len(samples),
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "p95": percentile(samples, 0.95),
+            "max": max(samples),
+        }
+        for function, samples in sorted(gas_samples.items())
+    }
+
+
+def find_gas_regressions(report, baseline, tolerance):
+    """Functions whose median gas grew more than `tolerance` over the baseline, functions new to the report are skipped"""
+    regressions = []
+    for function, stats in report.items():
+        if function not in baseline:
+            continue
+        allowed = baseline[function]["median"] * (1 + tolerance)
+        if stats["median"] > allowed:
+            regressions.append(
+                f"{function}: median gas {stats['median']} over baseline {baseline[function]['median']} (+{tolerance:.0%} allowed)"
+            )
+    return regressions
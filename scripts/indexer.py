@@ -0,0 +1,328 @@
+"""Index the ticket system's events into a local SQLite store and serve round history from it.
+
+    indexer = Indexer(web3, main_ticket_system.address, main_ticket_system.abi, "history.sqlite", start_block)
+    indexer.sync()
+    indexer.player_tickets(player)
+    indexer.round_participants(3)
+
+Logs of TicketPurchased, TicketEnteredLottery, TicketSelected, TicketsSelected, PrizesCredited,
+RoundDrawn, PrizeClaimed, LotteryRoundStatusChanged and BlockStatusUpdated are fetched with one
+eth_getLogs per range of `batch_blocks` blocks. Every range is stored in one SQLite transaction
+together with the checkpoint, so an indexer restarted on the same database resumes after the last
+stored block.
+
+The winners of a round come in PrizesCredited batches, one per draw step that credited any, and
+are put back together in log order. The events do not carry the round of a selection or of a
+status change, it is tracked while the logs are replayed: a round is opened by the draw of the
+previous one, and the constructor opens round 1 without an event, so indexing starts at the block
+the contract was deployed in.
+
+    brownie run scripts/indexer.py   # index the latest deployment of TICKET_SYSTEM into INDEX_DB
+"""
+import json
+import os
+import sqlite3
+
+INDEX_DB = os.path.join("reports", "round_history.sqlite")
+BATCH_BLOCKS = 2_000 # Blocks fetched per eth_getLogs call
+INDEXED_EVENTS = [
+    "TicketPurchased", "TicketEnteredLottery", "TicketSelected", "TicketsSelected",
+    "PrizesCredited", "RoundDrawn", "PrizeClaimed", "LotteryRoundStatusChanged", "BlockStatusUpdated",
+]
+PRIZES = {"small": "smallPrizeWinners", "big": "bigPrizeWinners", "mini": "miniPrizeWinners"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    block INTEGER NOT NULL,
+    current_round INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ticket_selections (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    round INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    success INTEGER NOT NULL,
+    PRIMARY KEY (block, log_index, ticket_id)
+);
+CREATE INDEX IF NOT EXISTS ticket_selections_by_player ON ticket_selections (player, round);
+CREATE INDEX IF NOT EXISTS ticket_selections_by_round ON ticket_selections (round, player);
+CREATE TABLE IF NOT EXISTS round_entries (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    total_tickets INTEGER NOT NULL,
+    prize_pool TEXT NOT NULL, -- wei does not fit in SQLite's 64-bit integers
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS round_entries_by_round ON round_entries (round, block, log_index);
+CREATE TABLE IF NOT EXISTS round_status (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    is_open INTEGER NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS round_status_by_round ON round_status (round, is_open);
+CREATE TABLE IF NOT EXISTS ticket_purchases (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    player TEXT NOT NULL,
+    first_ticket_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    ticket_price TEXT NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS ticket_purchases_by_player ON ticket_purchases (player);
+CREATE TABLE IF NOT EXISTS prize_credits (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    prize TEXT NOT NULL, -- 'small', 'big' or 'mini'
+    position INTEGER NOT NULL, -- Place of the winner in the batch
+    winner TEXT NOT NULL,
+    PRIMARY KEY (block, log_index, prize, position)
+);
+CREATE INDEX IF NOT EXISTS prize_credits_by_round ON prize_credits (round, prize, block, log_index, position);
+CREATE TABLE IF NOT EXISTS round_draws (
+    round INTEGER PRIMARY KEY,
+    block INTEGER NOT NULL,
+    big_prize TEXT NOT NULL,
+    small_prize TEXT NOT NULL,
+    mini_prize TEXT NOT NULL,
+    commission TEXT NOT NULL,
+    random_numbers TEXT NOT NULL,
+    strong_number INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prize_claims (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS prize_claims_by_winner ON prize_claims (winner);
+CREATE TABLE IF NOT EXISTS block_status (
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    blocks_until_close INTEGER NOT NULL,
+    blocks_until_draw INTEGER NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+"""
+
+
+def event_signature(abi_entry):
+    """Canonical signature of an ABI event, e.g. TicketSelected(address,uint256,bool)"""
+    return f"{abi_entry['name']}({','.join(argument['type'] for argument in abi_entry['inputs'])})"
+
+
+class Indexer:
+    """Indexes the events of the ticket system at `address` into the SQLite database at `path`"""
+
+    def __init__(self, web3, address, abi, path=INDEX_DB, start_block=0, batch_blocks=BATCH_BLOCKS):
+        self.web3 = web3
+        self.address = address
+        self.contract = web3.eth.contract(address=address, abi=abi)
+        self.batch_blocks = batch_blocks
+        self.topics = {
+            bytes(web3.keccak(text=event_signature(entry))): entry["name"]
+            for entry in abi if entry.get("type") == "event" and entry["name"] in INDEXED_EVENTS
+        }
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO checkpoint (id, block, current_round) VALUES (0, ?, 1)", (start_block - 1,))
+
+    def close(self):
+        self.db.close()
+
+    @property
+    def checkpoint(self):
+        """Last indexed block"""
+        return self.db.execute("SELECT block FROM checkpoint").fetchone()[0]
+
+    def sync(self, to_block=None):
+        """Index the blocks after the checkpoint up to `to_block` (the latest block by default),
+        returns the number of logs stored"""
+        to_block = self.web3.eth.block_number if to_block is None else to_block
+        stored = 0
+        first = self.checkpoint + 1
+        while first <= to_block:
+            last = min(first + self.batch_blocks - 1, to_block)
+            logs = self.web3.eth.get_logs({
+                "address": self.address,
+                "fromBlock": first,
+                "toBlock": last,
+                "topics": [[self.web3.to_hex(topic) for topic in self.topics]],
+            })
+            with self.db:
+                current_round = self.db.execute("SELECT current_round FROM checkpoint").fetchone()[0]
+                for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+                    current_round = self.store(log, current_round)
+                self.db.execute("UPDATE checkpoint SET block = ?, current_round = ?", (last, current_round))
+            stored += len(logs)
+            first = last + 1
+        return stored
+
+    def store(self, log, current_round):
+        """Store one log, returns the round open after it"""
+        name = self.topics[bytes(log["topics"][0])]
+        args = getattr(self.contract.events, name)().process_log(log)["args"]
+        position = (log["blockNumber"], log["logIndex"])
+        tx_hash = self.web3.to_hex(log["transactionHash"])
+
+        if name == "TicketPurchased":
+            self.db.execute(
+                "INSERT OR REPLACE INTO ticket_purchases VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*position, tx_hash, args["player"], args["firstTicketId"], args["count"], str(args["ticketPrice"])),
+            )
+        elif name == "PrizesCredited":
+            self.db.executemany(
+                "INSERT OR REPLACE INTO prize_credits VALUES (?, ?, ?, ?, ?, ?)",
+                [(*position, args["roundNumber"], prize, index, winner)
+                 for prize, field in PRIZES.items() for index, winner in enumerate(args[field])],
+            )
+        elif name == "RoundDrawn":
+            self.db.execute(
+                "INSERT OR REPLACE INTO round_draws VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (args["roundNumber"], log["blockNumber"],
+                 str(args["bigPrize"]), str(args["smallPrize"]), str(args["miniPrize"]), str(args["commission"]),
+                 json.dumps(list(args["randomNumbers"])), args["strongNumber"]),
+            )
+        elif name == "PrizeClaimed":
+            self.db.execute(
+                "INSERT OR REPLACE INTO prize_claims VALUES (?, ?, ?, ?, ?)",
+                (*position, tx_hash, args["winner"], str(args["amount"])),
+            )
+        elif name == "TicketEnteredLottery":
+            current_round = args["roundNumber"]
+            self.db.execute(
+                "INSERT OR REPLACE INTO round_entries VALUES (?, ?, ?, ?, ?)",
+                (*position, args["roundNumber"], args["totalTickets"], str(args["prizePool"])),
+            )
+        elif name in ("TicketSelected", "TicketsSelected"):
+            ticket_ids = [args["ticketId"]] if name == "TicketSelected" else args["ticketIds"]
+            self.db.executemany(
+                "INSERT OR REPLACE INTO ticket_selections VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*position, tx_hash, current_round, args["user"], ticket_id, int(args["success"]))
+                 for ticket_id in ticket_ids],
+            )
+        elif name == "LotteryRoundStatusChanged":
+            # Rounds are opened by the draw of the round before
+            if args["isOpen"]:
+                current_round += 1
+            self.db.execute("INSERT OR REPLACE INTO round_status VALUES (?, ?, ?, ?)", (*position, current_round, int(args["isOpen"])))
+        else:
+            self.db.execute(
+                "INSERT OR REPLACE INTO block_status VALUES (?, ?, ?, ?)",
+                (*position, args["blocksUntilClose"], args["blocksUntilDraw"]),
+            )
+        return current_round
+
+    def player_tickets(self, player):
+        """Tickets `player` entered in a round, oldest first"""
+        rows = self.db.execute(
+            "SELECT round, ticket_id, block, tx_hash FROM ticket_selections "
+            "WHERE player = ? AND success = 1 ORDER BY round, block, log_index, ticket_id",
+            (player,),
+        )
+        return [{"round": round_number, "ticket_id": ticket_id, "block": block, "tx_hash": tx_hash}
+                for round_number, ticket_id, block, tx_hash in rows]
+
+    def round_participants(self, round_number):
+        """(player, tickets entered) of a round, in the order the players first entered"""
+        return self.db.execute(
+            "SELECT player, COUNT(*) FROM ticket_selections WHERE round = ? AND success = 1 "
+            "GROUP BY player ORDER BY MIN(block * 1000000 + log_index)",  # A block holds far fewer logs
+            (round_number,),
+        ).fetchall()
+
+    def round_summary(self, round_number):
+        """Tickets, prize pool and the blocks a round was opened and closed in, None if not indexed.
+        Round 1 is opened by the constructor, so it has no open block"""
+        entry = self.db.execute(
+            "SELECT total_tickets, prize_pool FROM round_entries WHERE round = ? ORDER BY block DESC, log_index DESC LIMIT 1",
+            (round_number,),
+        ).fetchone()
+        if entry is None:
+            return None
+        status = dict(self.db.execute(
+            "SELECT is_open, MIN(block) FROM round_status WHERE round = ? GROUP BY is_open", (round_number,)
+        ).fetchall())
+        return {
+            "round": round_number,
+            "total_tickets": entry[0],
+            "prize_pool": int(entry[1]),
+            "open_block": status.get(1),
+            "close_block": status.get(0),
+        }
+
+    def round_draw(self, round_number):
+        """Winners, prizes and numbers of a drawn round, None if it was not drawn yet"""
+        row = self.db.execute(
+            "SELECT block, big_prize, small_prize, mini_prize, commission, random_numbers, strong_number "
+            "FROM round_draws WHERE round = ?",
+            (round_number,),
+        ).fetchone()
+        if row is None:
+            return None
+        block, big_prize, small_prize, mini_prize, commission, numbers, strong_number = row
+        winners = {prize: [] for prize in PRIZES}
+        for prize, winner in self.db.execute(
+            "SELECT prize, winner FROM prize_credits WHERE round = ? ORDER BY prize, block, log_index, position",
+            (round_number,),
+        ):
+            winners[prize].append(winner)
+        return {
+            "round": round_number,
+            "block": block,
+            "small_prize_winners": winners["small"],
+            "big_prize_winners": winners["big"],
+            "mini_prize_winners": winners["mini"],
+            "big_prize": int(big_prize),
+            "small_prize": int(small_prize),
+            "mini_prize": int(mini_prize),
+            "commission": int(commission),
+            "random_numbers": json.loads(numbers),
+            "strong_number": strong_number,
+        }
+
+    def player_purchases(self, player):
+        """(first ticket id, count, ticket price) of every purchase of `player`, oldest first"""
+        return [
+            (first_ticket_id, count, int(ticket_price)) for first_ticket_id, count, ticket_price in self.db.execute(
+                "SELECT first_ticket_id, count, ticket_price FROM ticket_purchases WHERE player = ? ORDER BY block, log_index",
+                (player,),
+            )
+        ]
+
+    def claimed_prizes(self, winner):
+        """Total wei claimed for `winner`"""
+        return sum(int(amount) for amount, in self.db.execute("SELECT amount FROM prize_claims WHERE winner = ?", (winner,)))
+
+    def rounds(self):
+        """Summaries of every indexed round"""
+        numbers = [row[0] for row in self.db.execute("SELECT DISTINCT round FROM round_entries ORDER BY round")]
+        return [self.round_summary(number) for number in numbers]
+
+
+def main():
+    import brownie
+    from brownie import web3
+
+    ticket_system = getattr(brownie, os.environ.get("TICKET_SYSTEM", "MainTicketSystem"))[-1]
+    start_block = ticket_system.tx.block_number if ticket_system.tx else 0
+    indexer = Indexer(web3, ticket_system.address, ticket_system.abi, INDEX_DB, start_block)
+    stored = indexer.sync()
+    print(f"Indexed {stored} logs up to block {indexer.checkpoint} into {INDEX_DB}")
+    for summary in indexer.rounds():
+        print(summary)
+    indexer.close()
@@ -0,0 +1,207 @@
+"""Keeper that closes and draws every round in the first block where it is allowed.
+
+    KEEPER_ADDRESS=0x... brownie run scripts/keeper.py
+    KEEPER_URI=ws://127.0.0.1:8545 KEEPER_ADDRESS=0x... KEEPER_ROUNDS=10 brownie run scripts/keeper.py
+
+On every new block (an eth_subscribe newHeads subscription over WebSocket, polling over HTTP) the
+keeper reads isLotteryActive, getLotteryBlockStatus, getCurrentRound and getCurrentTotalTickets
+in one batch. A round can
+be closed by a transaction mined in the block after the one where blocksUntilClose reaches 0, and
+drawn likewise once blocksUntilDraw reaches 0, so that is when the keeper sends closeLotteryRound
+or drawLotteryWinner, or drawLotteryWinnerStep for rounds too large for one transaction. The first
+step pins the draw arguments of the round, so the Draw of a round is kept until the round is drawn
+and a stepped draw interrupted by a failed step resumes with it in a later block.
+
+Gas limits are estimated ahead of the send: the close costs the same every round and is estimated
+once, the draw is estimated again only when the round holds more tickets than the last estimate
+covered, and every drawLotteryWinnerStep is estimated right before it is sent. Every action is
+recorded with the block it became eligible in, the block that executed it and the time in
+between; summarize reports them, and main writes reports/keeper_metrics.json.
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+
+from brownie import accounts, web3
+from web3 import Web3
+from web3.exceptions import ContractLogicError, Web3RPCError
+
+from scripts.purchase_pipeline import percentiles
+from scripts.randomness_service import Draw, DrawCache
+from scripts.ticket_client import GAS_MARGIN, TicketSystemClient, load_abi
+
+POLL_INTERVAL = 0.2 # Seconds between block number polls over HTTP
+KEEPER_REPORT = os.path.join("reports", "keeper_metrics.json")
+
+
+@dataclass
+class KeeperAction:
+    """A close or draw sent by the keeper"""
+    round_number: int
+    action: str                # 'close' or 'draw'
+    eligible_block: int        # First block a transaction of the action could be mined in
+    executed_block: int        # Block that mined the (last) transaction of the action
+    blocks_late: int
+    seconds: float             # From seeing the action eligible to its (last) receipt
+    gas_used: int
+    transactions: int
+
+
+@dataclass
+class GasEstimate:
+    limit: int
+    tickets: int               # Tickets of the round the estimate was made for
+
+
+class Keeper:
+    """Closes and draws the rounds of the ticket system behind `client`, sending from `sender`.
+    `draw_source` returns the Draw of each round, by default the next draw of a local DrawCache.
+    It is called once per round, every retry of the round's draw reuses that Draw"""
+
+    def __init__(self, client, sender, draw_source: Optional[Callable[[], Draw]] = None,
+                 step_tickets: Optional[int] = None, gas_margin=GAS_MARGIN, poll_interval=POLL_INTERVAL):
+        self.client = client
+        self.sender = client.add_sender(sender)
+        self.draw_source = draw_source or DrawCache().next
+        self.step_tickets = step_tickets
+        self.gas_margin = gas_margin
+        self.poll_interval = poll_interval
+        self.gas = {}
+        self.eligible = {}  # (round, action) => first block it can be mined in, predicted before it is reached
+        self.draws = {}     # round => Draw sent for it, until the round is drawn
+        self.actions: List[KeeperAction] = []
+        self.errors: List[str] = []
+        self.last_block = None
+
+    async def heads(self):
+        """Numbers of the new blocks, from a newHeads subscription or by polling"""
+        w3 = self.client.w3
+        if w3.provider.has_persistent_connection:
+            await w3.eth.subscribe("newHeads")
+            async for message in w3.socket.process_subscriptions():
+                yield message["result"]["number"]
+        else:
+            while True:
+                number = await w3.eth.block_number
+                if number != self.last_block:
+                    yield number
+                await asyncio.sleep(self.poll_interval)
+
+    async def run(self, rounds=None):
+        """Keep the rounds going, return after drawing `rounds` rounds if given"""
+        drawn = 0
+        async for number in self.heads():
+            if self.last_block is not None and number <= self.last_block:
+                continue
+            action = await self.on_block(number)
+            if action is not None and action.action == "draw":
+                drawn += 1
+                if rounds is not None and drawn >= rounds:
+                    return self.actions
+
+    async def on_block(self, number):
+        """Close or draw the round if block `number` makes it eligible in the next block,
+        returns the KeeperAction taken or None"""
+        self.last_block = number
+        active, (blocks_until_close, blocks_until_draw), round_number, tickets = await self.client.batch_call([
+            ("isLotteryActive",), ("getLotteryBlockStatus",), ("getCurrentRound",), ("getCurrentTotalTickets",),
+        ])
+        action, blocks_until = ("close", blocks_until_close) if active else ("draw", blocks_until_draw)
+        if blocks_until > 0:
+            self.eligible[(round_number, action)] = number + blocks_until + 1
+            return None
+
+        eligible_block = self.eligible.pop((round_number, action), number + 1)
+        if action == "close":
+            return await self.fire("close", round_number, tickets, eligible_block, "closeLotteryRound", ())
+        if round_number not in self.draws:
+            self.draws[round_number] = self.draw_source()
+        draw = self.draws[round_number]
+        args = (draw.hash_numbers, draw.hash_full, draw.numbers, draw.strong_number)
+        if self.step_tickets is None:
+            return await self.fire("draw", round_number, tickets, eligible_block, "drawLotteryWinner", args)
+        return await self.fire("draw", round_number, tickets, eligible_block, "drawLotteryWinnerStep", args + (self.step_tickets,))
+
+    async def gas_limit(self, action, function, args, tickets):
+        """Gas limit of the action, estimated when there is no estimate for a round this large.
+        Every draw step is estimated on its own: its cost depends on the phase it reaches and the
+        winners of the round, not on the ticket count"""
+        estimate = self.gas.get(action)
+        stepped = action == "draw" and self.step_tickets is not None
+        if estimate is None or stepped or (action == "draw" and tickets > estimate.tickets):
+            gas = await self.client.contract.functions[function](*args).estimate_gas({"from": self.sender})
+            estimate = self.gas[action] = GasEstimate(int(gas * self.gas_margin), tickets)
+        return estimate.limit
+
+    async def fire(self, action, round_number, tickets, eligible_block, function, args):
+        """Send the action's transaction, a draw in steps until the next round opens"""
+        start = time.perf_counter()
+        receipts = []
+        while True:
+            try:
+                gas = await self.gas_limit(action, function, args, tickets)
+                receipt = await self.client.transact_and_wait(function, *args, sender=self.sender, gas=gas)
+            except (ContractLogicError, Web3RPCError, ValueError) as e:
+                # E.g. a purchase closed the round first. The next block tries again with a fresh estimate
+                self.errors.append(f"Round {round_number} {action}: {e}")
+                self.gas.pop(action, None)
+                return None
+            receipts.append(receipt)
+            if receipt["status"] != 1:
+                self.errors.append(f"Round {round_number} {action}: transaction {Web3.to_hex(receipt['transactionHash'])} reverted")
+                self.gas.pop(action, None)
+                return None
+            if action == "close" or await self.client.call("isLotteryActive"):
+                break
+        if action == "draw":
+            del self.draws[round_number]
+        record = KeeperAction(
+            round_number=round_number,
+            action=action,
+            eligible_block=eligible_block,
+            executed_block=receipts[-1]["blockNumber"],
+            blocks_late=receipts[-1]["blockNumber"] - eligible_block,
+            seconds=round(time.perf_counter() - start, 4),
+            gas_used=sum(receipt["gasUsed"] for receipt in receipts),
+            transactions=len(receipts),
+        )
+        self.actions.append(record)
+        self.last_block = max(self.last_block, record.executed_block)
+        return record
+
+
+def summarize(actions):
+    """Blocks and seconds between eligibility and execution per action, JSON ready"""
+    summary = {}
+    for name in ("close", "draw"):
+        taken = [action for action in actions if action.action == name]
+        summary[name] = {
+            "count": len(taken),
+            "blocks_late": percentiles([action.blocks_late for action in taken]),
+            "seconds": percentiles([action.seconds for action in taken]),
+            "gas_used": percentiles([action.gas_used for action in taken]),
+        }
+    return summary
+
+
+def main():
+    uri = os.environ.get("KEEPER_URI", web3.provider.endpoint_uri)
+    rounds = int(os.environ["KEEPER_ROUNDS"]) if "KEEPER_ROUNDS" in os.environ else None
+    address = os.environ["KEEPER_ADDRESS"]
+
+    async def run():
+        async with await TicketSystemClient.connect(uri, address, load_abi()) as client:
+            keeper = Keeper(client, accounts[0].address)
+            try:
+                await keeper.run(rounds)
+            finally:
+                os.makedirs(os.path.dirname(KEEPER_REPORT), exist_ok=True)
+                with open(KEEPER_REPORT, "w") as report:
+                    json.dump({"summary": summarize(keeper.actions), "actions": [asdict(a) for a in keeper.actions]}, report, indent=2)
+            return keeper.actions
+
+    actions = asyncio.run(run())
+    print(json.dumps(summarize(actions), indent=2))
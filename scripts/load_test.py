@@ -0,0 +1,198 @@
+"""Load test the ticket system with rounds of 100 to 10,000 tickets.
+
+    brownie run scripts/load_test.py
+    LOAD_TEST_SIZES=100,500,2000 TICKET_SYSTEM=UnifiedTicketSystem brownie run scripts/load_test.py
+
+Every round size is played on a fresh deployment by up to MAX_ACCOUNTS funded accounts through
+the RoundDriver, and drawn in a single drawLotteryWinner sent with the block gas limit. A draw that
+does not fit in a block is recorded as such instead of failing the run.
+
+Writes reports/load_test.csv, one row per round size with throughput and gas, and
+reports/load_test_curve.csv, the draw gas of a linear fit over the measured rounds up to the
+round size where it crosses the block gas limit.
+"""
+import csv
+import math
+import os
+import time
+
+import brownie
+from brownie import Wei, accounts, exceptions, web3
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec, ticket_hashes
+
+ROUND_SIZES = [100, 1000, 10000]
+MAX_ACCOUNTS = 1000
+TICKETS_PER_ACCOUNT = 10 # Players are added until MAX_ACCOUNTS, then they buy more tickets each
+WINNER_EVERY = 100 # One ticket in WINNER_EVERY carries the winning hash
+GAS_BUDGET = 1 # Ether given to every player on top of its tickets
+CURVE_POINTS = 20
+LOAD_REPORT = os.path.join("reports", "load_test.csv")
+CURVE_REPORT = os.path.join("reports", "load_test_curve.csv")
+LOAD_FIELDS = [
+    "tickets", "accounts", "purchase_txs", "entry_txs",
+    "purchases_per_sec", "entries_per_sec",
+    "purchase_gas_per_tx", "purchase_gas_per_ticket", "entry_gas_per_tx", "entry_gas_per_ticket",
+    "draw_gas", "draw_gas_per_ticket", "draw_seconds", "draw_exceeds_block",
+]
+CURVE_FIELDS = ["tickets", "predicted_draw_gas", "measured_draw_gas", "block_gas_limit"]
+
+
+def accounts_for(tickets, max_accounts=MAX_ACCOUNTS):
+    """Number of players of a round of `tickets` tickets"""
+    return min(max_accounts, max(1, math.ceil(tickets / TICKETS_PER_ACCOUNT)))
+
+
+def fund_players(count, amount):
+    """`count` player accounts holding at least `amount` wei each, accounts[0] is left to the owner.
+    Local accounts are added when the chain's own ones run out, funders take turns so none runs dry"""
+    funders = list(accounts)[:10]
+    while len(accounts) < count + 1:
+        accounts.add()
+    players = list(accounts)[1:count + 1]
+    for i, player in enumerate(players):
+        balance = player.balance()
+        if balance < amount:
+            funders[i % len(funders)].transfer(player, amount - balance)
+    return players
+
+
+def round_spec(players, tickets, label, gas_limit):
+    """Spread `tickets` over `players`, every WINNER_EVERY-th ticket enters the winning hash and
+    the first one the winning strong hash, so the draw pays prizes in proportion to the round size"""
+    per_player = [tickets // len(players) + (i < tickets % len(players)) for i in range(len(players))]
+    winning_hash, winning_strong_hash = ticket_hashes(label, players[0], 0)
+    specs = []
+    entered = 0
+    for player, count in zip(players, per_player):
+        if count == 0:
+            continue
+        hashes = []
+        for i in range(count):
+            ticket_hash, strong_hash = ticket_hashes(label, player, i)
+            if (entered + i) % WINNER_EVERY == 0:
+                ticket_hash = winning_hash
+            hashes.append((ticket_hash, strong_hash))
+        specs.append(PlayerSpec(player, tickets=count, hashes=hashes))
+        entered += count
+    return RoundSpec(
+        players=specs,
+        winning_hash=winning_hash,
+        winning_strong_hash=winning_strong_hash,
+        label=label,
+        draw_gas_limit=gas_limit,
+        claim=False,
+    )
+
+
+def measure_round(ticket_system_contract, tickets, max_accounts=MAX_ACCOUNTS, gas_limit=None):
+    """Deploy `ticket_system_contract`, play one round of `tickets` tickets and return its LOAD_FIELDS row"""
+    owner = accounts[0]
+    gas_limit = gas_limit or web3.eth.get_block("latest").gasLimit
+    system = ticket_system_contract.deploy({'from': owner})
+    players = accounts_for(tickets, max_accounts)
+    ticket_price = system.getTicketPrice()
+    spec = round_spec(
+        fund_players(players, ticket_price * math.ceil(tickets / players) + Wei(f"{GAS_BUDGET} ether")),
+        tickets, f"load_{tickets}", gas_limit,
+    )
+
+    driver = RoundDriver(system, owner)
+    filled = driver.fill(spec)
+    purchase_gas = sum(tx.gas_used for tx in filled.purchase_txs)
+    entry_gas = sum(tx.gas_used for tx in filled.entry_txs)
+    start = time.perf_counter()
+    try:
+        draw_gas = sum(tx.gas_used for tx in driver.draw(spec))
+    except exceptions.VirtualMachineError:
+        draw_gas = None
+    draw_seconds = time.perf_counter() - start
+
+    return {
+        "tickets": tickets,
+        "accounts": len(spec.players),
+        "purchase_txs": len(filled.purchase_txs),
+        "entry_txs": len(filled.entry_txs),
+        "purchases_per_sec": round(tickets / filled.seconds["purchase"], 2),
+        "entries_per_sec": round(tickets / filled.seconds["entry"], 2),
+        "purchase_gas_per_tx": purchase_gas // len(filled.purchase_txs),
+        "purchase_gas_per_ticket": purchase_gas // tickets,
+        "entry_gas_per_tx": entry_gas // len(filled.entry_txs),
+        "entry_gas_per_ticket": entry_gas // tickets,
+        "draw_gas": draw_gas,
+        "draw_gas_per_ticket": None if draw_gas is None else draw_gas // tickets,
+        "draw_seconds": round(draw_seconds, 3),
+        "draw_exceeds_block": draw_gas is None,
+    }
+
+
+def fit_line(points):
+    """Least squares (intercept, slope) of (x, y) points, None without two distinct x"""
+    if len({x for x, _ in points}) < 2:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, _ in points)
+    return mean_y - slope * mean_x, slope
+
+
+def gas_limit_crossing(points, gas_limit):
+    """Smallest ticket count whose fitted draw gas exceeds `gas_limit`, None if it never does"""
+    fit = fit_line(points)
+    if fit is None or fit[1] <= 0:
+        return None
+    intercept, slope = fit
+    return max(0, math.floor((gas_limit - intercept) / slope) + 1)
+
+
+def scaling_curve(rows, gas_limit, points=CURVE_POINTS):
+    """CURVE_FIELDS rows from the smallest measured round to past the gas limit crossing"""
+    measured = {row["tickets"]: row["draw_gas"] for row in rows}
+    drawn = [(tickets, gas) for tickets, gas in measured.items() if gas is not None]
+    fit = fit_line(drawn)
+    if fit is None:
+        return []
+    intercept, slope = fit
+    crossing = gas_limit_crossing(drawn, gas_limit)
+    last = max(max(measured), math.ceil((crossing or 0) * 1.25))
+    first = min(measured)
+    sizes = sorted(set(measured) | {first + (last - first) * i // (points - 1) for i in range(points)})
+    return [{
+        "tickets": tickets,
+        "predicted_draw_gas": round(intercept + slope * tickets),
+        "measured_draw_gas": measured.get(tickets),
+        "block_gas_limit": gas_limit,
+    } for tickets in sizes]
+
+
+def write_csv(path, fields, rows):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as report:
+        writer = csv.DictWriter(report, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    ticket_system_contract = getattr(brownie, os.environ.get("TICKET_SYSTEM", "MainTicketSystem"))
+    sizes = [int(size) for size in os.environ.get("LOAD_TEST_SIZES", ",".join(map(str, ROUND_SIZES))).split(",")]
+    gas_limit = web3.eth.get_block("latest").gasLimit
+
+    rows = []
+    for tickets in sizes:
+        row = measure_round(ticket_system_contract, tickets, gas_limit=gas_limit)
+        rows.append(row)
+        draw = "exceeds the block gas limit" if row["draw_exceeds_block"] else f"{row['draw_gas']} gas"
+        print(f"{tickets} tickets / {row['accounts']} accounts: {row['purchases_per_sec']} purchases/s, "
+              f"{row['entries_per_sec']} entries/s, draw {draw}")
+    write_csv(LOAD_REPORT, LOAD_FIELDS, rows)
+
+    curve = scaling_curve(rows, gas_limit)
+    write_csv(CURVE_REPORT, CURVE_FIELDS, curve)
+    measured = [(row["tickets"], row["draw_gas"]) for row in rows if row["draw_gas"] is not None]
+    crossing = gas_limit_crossing(measured, gas_limit)
+    if crossing is None:
+        print("drawLotteryWinner: not enough successful draws to fit the scaling curve")
+    else:
+        print(f"drawLotteryWinner crosses the {gas_limit} block gas limit at about {crossing} tickets")
+    print(f"Wrote {LOAD_REPORT} and {CURVE_REPORT}")
@@ -0,0 +1,257 @@
+"""Pipelined ticket purchases and entries from many accounts, measured against a local node.
+
+    brownie run scripts/purchase_pipeline.py
+    PIPELINE_ACCOUNTS=500 PIPELINE_TICKETS=4 TICKET_SYSTEM=UnifiedTicketSystem brownie run scripts/purchase_pipeline.py
+
+Every player is a local account. In the purchase stage each player buys its tickets with one
+purchaseTicket per ticket, in the entry stage it enters each of them with selectTicketsForLottery.
+A stage signs all its transactions offline first, with nonces counted locally and the gas limit
+estimated once per function. Then every player sends its transactions back to back without waiting
+for receipts, players in parallel, and the receipts are confirmed in bulk with batched
+eth_getTransactionReceipt polls.
+
+Reports per stage the sustained tx/s from the first send to the last confirmation and the send and
+confirmation latency percentiles, and writes them to reports/purchase_pipeline.json.
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import brownie
+from brownie import accounts, web3
+from eth_account import Account
+from web3 import Web3
+
+from scripts.round_driver import HELD_OPEN_BLOCKS
+from scripts.ticket_client import GAS_MARGIN, ReceiptPolling, TicketSystemClient
+
+PLAYERS = 100
+TICKETS_PER_PLAYER = 5
+MAX_IN_FLIGHT = 64 # Players sending at the same time
+RECEIPT_BATCH = 200 # Receipts asked for in one JSON-RPC batch
+GAS_BUDGET = 1 # Ether given to every player on top of its tickets
+PERCENTILES = [50, 90, 95, 99]
+PIPELINE_REPORT = os.path.join("reports", "purchase_pipeline.json")
+
+
+@dataclass
+class PipelineCall:
+    """A transaction of the pipeline, sent by `account`, a LocalAccount"""
+    account: object
+    function: str
+    args: tuple = ()
+    value: int = 0
+
+
+@dataclass
+class SentTx:
+    """A pipelined transaction, times are time.perf_counter() readings"""
+    call: PipelineCall
+    nonce: int
+    tx_hash: Optional[str] = None
+    sent_at: Optional[float] = None
+    send_seconds: Optional[float] = None   # Round trip of eth_sendRawTransaction
+    confirmed_at: Optional[float] = None   # Poll that first saw the receipt
+    status: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class StageReport:
+    """Throughput and latencies of one stage, latencies in milliseconds"""
+    stage: str
+    transactions: int
+    confirmed: int
+    reverted: int
+    failed: int
+    sign_seconds: float
+    send_seconds: float
+    seconds: float             # First send to last confirmation
+    tx_per_sec: float
+    send_latency_ms: Dict[str, float] = field(default_factory=dict)
+    confirm_latency_ms: Dict[str, float] = field(default_factory=dict)
+
+
+def percentiles(values, points=PERCENTILES):
+    """Nearest-rank percentiles of `values` keyed 'p50', 'p95'..., plus 'max', empty without values"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f"p{point}": ordered[max(0, -(-point * len(ordered) // 100) - 1)] for point in points}
+    summary["max"] = ordered[-1]
+    return summary
+
+
+async def sign_calls(client, calls, gas_margin=GAS_MARGIN):
+    """SentTx of every call, signed offline in order with the next nonce of its sender.
+    The gas limit of a function is estimated on its first call"""
+    gas_price = await client.w3.eth.gas_price
+    chain_id = await client.chain_id()
+    gas = {}
+    signed = []
+    for call in calls:
+        address = call.account.address
+        if call.function not in gas:
+            estimate = await client.contract.functions[call.function](*call.args).estimate_gas(
+                {"from": address, "value": call.value})
+            gas[call.function] = int(estimate * gas_margin)
+        async with client.nonces.lock(address):
+            nonce = await client.nonces.next(address)
+        raw = call.account.sign_transaction({
+            "to": client.contract.address,
+            "data": client.contract.encode_abi(call.function, args=call.args),
+            "value": call.value,
+            "gas": gas[call.function],
+            "gasPrice": gas_price,
+            "nonce": nonce,
+            "chainId": chain_id,
+        }).raw_transaction
+        signed.append((SentTx(call, nonce), raw))
+    return signed
+
+
+async def send_pipelined(client, signed, max_in_flight=MAX_IN_FLIGHT):
+    """Send the signed transactions without waiting for receipts. A sender's transactions go out
+    back to back in nonce order, up to `max_in_flight` senders at a time. A failed send stops its
+    sender, the nonces after it could never be mined"""
+    by_sender = {}
+    for sent, raw in signed:
+        by_sender.setdefault(sent.call.account.address, []).append((sent, raw))
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def send_all(address, transactions):
+        async with slots:
+            for sent, raw in transactions:
+                sent.sent_at = time.perf_counter()
+                try:
+                    sent.tx_hash = Web3.to_hex(await client.w3.eth.send_raw_transaction(raw))
+                except Exception as e:
+                    sent.error = str(e)
+                    client.nonces.reset(address)
+                    return
+                sent.send_seconds = time.perf_counter() - sent.sent_at
+
+    await asyncio.gather(*[send_all(address, transactions) for address, transactions in by_sender.items()])
+    return [sent for sent, _ in signed]
+
+
+async def confirm(client, sent, polling=None, batch_size=RECEIPT_BATCH):
+    """Poll the receipts of every sent transaction in batches until all are mined, backing off
+    between rounds of polls. Raises TimeoutError after polling.timeout seconds"""
+    polling = polling or ReceiptPolling()
+    pending = {tx.tx_hash: tx for tx in sent if tx.tx_hash is not None}
+    deadline = time.monotonic() + polling.timeout
+    interval = polling.interval
+    while pending:
+        hashes = list(pending)
+        for start in range(0, len(hashes), batch_size):
+            chunk = hashes[start:start + batch_size]
+            responses = await client.w3.provider.make_batch_request(
+                [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in chunk])
+            if not isinstance(responses, list):
+                raise ValueError(f"Receipt batch failed: {responses.get('error')}")
+            seen_at = time.perf_counter()
+            for tx_hash, response in zip(chunk, responses):
+                receipt = response.get("result")
+                if receipt:
+                    tx = pending.pop(tx_hash)
+                    tx.confirmed_at = seen_at
+                    tx.status = int(receipt["status"], 16)
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"{len(pending)} transactions unconfirmed after {polling.timeout} seconds")
+        await asyncio.sleep(interval)
+        interval = min(interval * polling.backoff, polling.max_interval)
+    return sent
+
+
+async def run_stage(client, stage, calls, max_in_flight=MAX_IN_FLIGHT, polling=None):
+    """Sign, send and confirm `calls`, returns the StageReport and every SentTx"""
+    start = time.perf_counter()
+    signed = await sign_calls(client, calls)
+    send_start = time.perf_counter()
+    sent = await send_pipelined(client, signed, max_in_flight)
+    send_end = time.perf_counter()
+    await confirm(client, sent, polling)
+
+    confirmed = [tx for tx in sent if tx.confirmed_at is not None]
+    last = max((tx.confirmed_at for tx in confirmed), default=send_end)
+    return StageReport(
+        stage=stage,
+        transactions=len(calls),
+        confirmed=len(confirmed),
+        reverted=sum(tx.status == 0 for tx in confirmed),
+        failed=sum(tx.error is not None for tx in sent),
+        sign_seconds=round(send_start - start, 3),
+        send_seconds=round(send_end - send_start, 3),
+        seconds=round(last - send_start, 3),
+        tx_per_sec=round(len(confirmed) / (last - send_start), 2) if confirmed else 0.0,
+        send_latency_ms={k: round(v * 1000, 2) for k, v in percentiles(
+            [tx.send_seconds for tx in sent if tx.send_seconds is not None]).items()},
+        confirm_latency_ms={k: round(v * 1000, 2) for k, v in percentiles(
+            [tx.confirmed_at - tx.sent_at for tx in confirmed]).items()},
+    ), sent
+
+
+async def run_pipeline(client, players, tickets_per_player=TICKETS_PER_PLAYER, max_in_flight=MAX_IN_FLIGHT, polling=None):
+    """Purchase stage then entry stage for `players`, LocalAccounts holding enough ether.
+    The open round must stay open for all the entries, see setBlocksWait"""
+    price = await client.call("getTicketPrice")
+    purchases = [PipelineCall(player, "purchaseTicket", (), price) for _ in range(tickets_per_player) for player in players]
+    purchase_report, _ = await run_stage(client, "purchase", purchases, max_in_flight, polling)
+
+    held = await client.batch_call([("getPlayerTickets", player.address) for player in players])
+    entries = []
+    for player, tickets in zip(players, held):
+        for ticket in tickets:
+            if ticket[3] == 0:  # TicketStatus.ACTIVE
+                entries.append(PipelineCall(player, "selectTicketsForLottery", (
+                    ticket[0],
+                    Web3.keccak(text=f"pipeline_hash_{player.address}_{ticket[0]}"),
+                    Web3.keccak(text=f"pipeline_strong_hash_{player.address}_{ticket[0]}"),
+                )))
+    entry_report, _ = await run_stage(client, "entry", entries, max_in_flight, polling)
+    return [purchase_report, entry_report]
+
+
+def format_report(reports):
+    rows = ["| Stage | Txs | Confirmed | Reverted | Failed | tx/s | Send p50/p95 (ms) | Confirm p50/p95/p99 (ms) |",
+            "| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: |"]
+    for report in reports:
+        send, conf = report.send_latency_ms, report.confirm_latency_ms
+        rows.append(
+            f"| {report.stage} | {report.transactions} | {report.confirmed} | {report.reverted} | {report.failed} "
+            f"| {report.tx_per_sec} | {send.get('p50')}/{send.get('p95')} "
+            f"| {conf.get('p50')}/{conf.get('p95')}/{conf.get('p99')} |")
+    return "\n".join(rows)
+
+
+def main():
+    ticket_system_contract = getattr(brownie, os.environ.get("TICKET_SYSTEM", "MainTicketSystem"))
+    player_count = int(os.environ.get("PIPELINE_ACCOUNTS", PLAYERS))
+    tickets = int(os.environ.get("PIPELINE_TICKETS", TICKETS_PER_PLAYER))
+
+    owner = accounts[0]
+    system = ticket_system_contract.deploy({'from': owner})
+    system.setBlocksWait(HELD_OPEN_BLOCKS, 1, {'from': owner})
+    funding = system.getTicketPrice() * tickets + Web3.to_wei(GAS_BUDGET, "ether")
+    funders = list(accounts)[:10]
+    players = [Account.create() for _ in range(player_count)]
+    for i, player in enumerate(players):
+        funders[i % len(funders)].transfer(player.address, funding)
+
+    async def run():
+        async with await TicketSystemClient.connect(web3.provider.endpoint_uri, system.address, system.abi) as client:
+            return await run_pipeline(client, players, tickets)
+
+    reports = asyncio.run(run())
+    print(format_report(reports))
+    os.makedirs(os.path.dirname(PIPELINE_REPORT), exist_ok=True)
+    with open(PIPELINE_REPORT, "w") as report:
+        json.dump({"players": player_count, "tickets_per_player": tickets,
+                   "stages": [asdict(report) for report in reports]}, report, indent=2)
+    print(f"Wrote {PIPELINE_REPORT}")
@@ -0,0 +1,158 @@
+"""Local source of winning draws, in place of the remote random number endpoint.
+
+    python -m scripts.randomness_service [--host 127.0.0.1] [--port 8600] [--cache 1000] [--seed N]
+
+A draw is six distinct numbers of 1 to 37, a strong number of 1 to 7 and the two hashes the
+frontend's validateHash checks: sha3_256 (not keccak) of the numbers sorted ascending and joined
+without separators, and of the same string followed by the strong number. Tickets are entered
+with hashes made the same way, see draw_hashes.
+
+Draws are generated ahead of time into a DrawCache, which refills itself in batches. The HTTP
+server answers GET /randomNum/random with the response shape of the remote endpoint, so the
+frontend only needs REACT_APP_RANDOMNESS_URL pointed at it. In-process users call DrawCache.next.
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+NUMBERS = 6
+MAX_NUMBER = 37
+MAX_STRONG_NUMBER = 7
+CACHE_SIZE = 1000 # Draws generated ahead of time
+REFILL_BELOW = 0.25 # Share of CACHE_SIZE left when the cache is refilled
+DRAW_PATH = "/randomNum/random"
+PORT = 8600
+
+
+def numbers_string(numbers, strong_number=None):
+    """The numbers sorted ascending and joined without separators, then the strong number if given"""
+    ordered = sorted(numbers) + ([] if strong_number is None else [strong_number])
+    return "".join(str(number) for number in ordered)
+
+
+def draw_hashes(numbers, strong_number):
+    """(numbers hash, numbers and strong number hash) of a pick, as bytes32 values"""
+    return (
+        hashlib.sha3_256(numbers_string(numbers).encode()).digest(),
+        hashlib.sha3_256(numbers_string(numbers, strong_number).encode()).digest(),
+    )
+
+
+@dataclass
+class Draw:
+    """Arguments of drawLotteryWinner"""
+    hash_numbers: bytes
+    hash_full: bytes
+    numbers: List[int]
+    strong_number: int
+
+    @classmethod
+    def of(cls, numbers, strong_number):
+        """The draw of the given numbers, hashed like the frontend hashes tickets"""
+        hash_numbers, hash_full = draw_hashes(numbers, strong_number)
+        return cls(hash_numbers, hash_full, sorted(numbers), strong_number)
+
+    def response(self):
+        """Response of the remote endpoint: a JSON body holding the hashes as hex without 0x"""
+        return {"statusCode": 200, "body": json.dumps({
+            "random_numbers": self.numbers,
+            "strong_number": self.strong_number,
+            "keccak256_hash_numbers": self.hash_numbers.hex(),
+            "keccak256_hash_full": self.hash_full.hex(),
+        })}
+
+    def is_valid(self):
+        """What the frontend's validateHash checks"""
+        return draw_hashes(self.numbers, self.strong_number) == (self.hash_numbers, self.hash_full)
+
+
+def generate_draw(rng):
+    return Draw.of(rng.sample(range(1, MAX_NUMBER + 1), NUMBERS), rng.randint(1, MAX_STRONG_NUMBER))
+
+
+class DrawCache:
+    """Draws generated ahead of time, handed out once each. Safe to share between threads"""
+
+    def __init__(self, size=CACHE_SIZE, seed=None):
+        self.size = size
+        self.rng = random.Random(seed) if seed is not None else random.SystemRandom()
+        self.draws = deque()
+        self.lock = threading.Lock()
+        self.generated = 0
+        self.refill()
+
+    def refill(self):
+        """Top the cache up to `size` draws"""
+        with self.lock:
+            while len(self.draws) < self.size:
+                self.draws.append(generate_draw(self.rng))
+                self.generated += 1
+
+    def next(self):
+        """The next draw, the cache is refilled once it runs low"""
+        with self.lock:
+            draw = self.draws.popleft() if self.draws else generate_draw(self.rng)
+            low = len(self.draws) < self.size * REFILL_BELOW
+        if low:
+            self.refill()
+        return draw
+
+    def __len__(self):
+        return len(self.draws)
+
+
+def make_server(cache, host="127.0.0.1", port=PORT):
+    """HTTP server handing out the draws of `cache` at DRAW_PATH, port 0 picks a free port"""
+
+    class DrawHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != DRAW_PATH:
+                self.send_error(404)
+                return
+            body = json.dumps(cache.next().response()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")  # Fetched by the dashboard from the browser
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), DrawHandler)
+
+
+def serve_in_background(cache, host="127.0.0.1", port=0):
+    """Start a server on a daemon thread, returns the server and the URL of its draws"""
+    server = make_server(cache, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{DRAW_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache", type=int, default=CACHE_SIZE, help="Draws generated ahead of time")
+    parser.add_argument("--seed", type=int, default=None, help="Reproducible draws, for tests and demos only")
+    args = parser.parse_args()
+
+    server = make_server(DrawCache(args.cache, args.seed), args.host, args.port)
+    print(f"Serving draws at http://{args.host}:{server.server_address[1]}{DRAW_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""NumPy reference model of how a lottery round is settled, to diff against on-chain results.
+
+    outcome = settle_round(entries, ticket_price, winning_hash, winning_strong_hash, draw_time)
+    outcomes = settle_rounds(owners, creation_timestamps, ticket_hashes, ticket_hashes_with_strong,
+                             winning_hashes, winning_strong_hashes, draw_times, ticket_price)
+
+Mirrors LotteryStore: tickets matching the winning strong hash win the big prize, the remaining
+ones matching the winning hash the small prize, and the mini prize goes to participants drawn by
+a softmax over the hours their tickets were held (select_mini_prize_winners). settle_rounds
+settles thousands of rounds in one call from arrays padded to (rounds, tickets): the winners,
+weights and mini prize draws are computed across the rounds at once, only the keccak seeds of
+the draws are hashed round by round. settle_round settles the tickets of one round with it.
+
+Amounts are in wei and overflow 64-bit integers, the prize arrays hold Python ints (dtype=object).
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+from eth_utils import keccak
+
+SMALL_PRIZE_PERCENTAGE = 30
+FLEX_COMMISSION = 5
+MINI_PRIZE_PERCENTAGE = 10
+HOUR = 3600 # Hold times are weighed in whole hours
+SCALE_FACTOR = 10**18 # Fixed point scale of the softmax weights
+SOFTMAX_SPAN = 10 # Weights further below the maximum count as 1 in the softmax
+
+
+@dataclass
+class TicketEntry:
+    """A ticket entered in the round, entries are listed in the order they were entered"""
+    participant: str
+    ticket_id: int
+    creation_timestamp: int
+    ticket_hash: bytes
+    ticket_hash_with_strong: bytes
+
+
+@dataclass
+class PrizeSplit:
+    """Prize pools of splitPrizePool, scalars or arrays of rounds.
+    A pool without winners is 0 and counted in the commission"""
+    small_prize: object
+    big_prize: object
+    mini_prize: object
+    commission: object
+    small_per_winner: object
+    big_per_winner: object
+    mini_per_winner: object
+
+
+@dataclass
+class RoundOutcome:
+    """Expected winners, prizes and pending prize credits of a settled round"""
+    big_prize_winners: List[str]
+    small_prize_winners: List[str]
+    mini_prize_winners: List[str]
+    split: PrizeSplit
+    pending: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class RoundsOutcome:
+    """Winners, prizes and pending prize credits of rounds settled by settle_rounds, as arrays over
+    the rounds. Participants are the indexes of the `owners` given"""
+    big: np.ndarray # (rounds, tickets) masks of the big prize tickets
+    small: np.ndarray # (rounds, tickets) masks of the small prize tickets
+    mini: np.ndarray # (rounds, draws) participant of every mini prize draw, -1 for the draws a round did not make
+    split: PrizeSplit # Arrays of rounds
+    pending: np.ndarray # (rounds, participants) prizes credited to every participant, Python ints
+
+
+def split_prize_pool(total_prize_pool, small_winners, big_winners, mini_winners):
+    """Split prize pools between the winner counts, every argument is a scalar or an array of rounds"""
+    pool = np.asarray(total_prize_pool, dtype=object)
+    counts = [np.asarray(winners) for winners in (small_winners, big_winners, mini_winners)]
+
+    commission = pool * FLEX_COMMISSION // 100
+    mini = pool * MINI_PRIZE_PERCENTAGE // 100
+    small = pool * SMALL_PRIZE_PERCENTAGE // 100
+    big = pool - commission - small - mini
+
+    paid = []
+    per_winner = []
+    for prize, count in zip((small, big, mini), counts):
+        won = count > 0
+        commission = commission + np.where(won, 0, prize)
+        paid.append(np.where(won, prize, 0))
+        per_winner.append(np.where(won, prize // np.maximum(count, 1), 0))
+    # Scalar rounds get scalar amounts back
+    return PrizeSplit(*(amount.item() if amount.ndim == 0 else amount.astype(object)
+                        for amount in (*paid, commission, *per_winner)))
+
+
+def classify_winners(ticket_hashes, ticket_hashes_with_strong, winning_hash, winning_strong_hash):
+    """Masks of the big and small prize tickets, a ticket matching both hashes only wins the big prize"""
+    big = np.asarray(ticket_hashes_with_strong) == winning_strong_hash
+    small = (np.asarray(ticket_hashes) == winning_hash) & ~big
+    return big, small
+
+
+def hold_time_weights(owners, creation_timestamps, draw_time, participants):
+    """LotteryStore.participantWeight: 1 + the whole hours each of a participant's tickets was held,
+    floored ticket by ticket. `owners` holds the participant index of every ticket"""
+    weights = np.ones(participants, dtype=np.int64)
+    np.add.at(weights, np.asarray(owners, dtype=np.int64),
+              (draw_time - np.asarray(creation_timestamps, dtype=np.int64)) // HOUR)
+    return weights
+
+
+def softmax_weights(weights):
+    """applySoftmaxTransformation: weights at most SOFTMAX_SPAN below the maximum count as
+    SCALE_FACTOR, the others as 1, normalized to SCALE_FACTOR. Python ints"""
+    weights = np.asarray(weights, dtype=np.int64)
+    if weights.size == 0:
+        return np.zeros(0, dtype=object)
+    exps = np.where(weights.max() - weights > SOFTMAX_SPAN, 1, SCALE_FACTOR).astype(object)
+    return exps * SCALE_FACTOR // exps.sum()
+
+
+def draw_seed(hash_numbers, hash_full, *values):
+    """keccak256(abi.encodePacked(hashNumbers, hashFull, values...)) as an integer"""
+    packed = bytes(hash_numbers) + bytes(hash_full) + b"".join(int(value).to_bytes(32, "big") for value in values)
+    return int.from_bytes(keccak(packed), "big")
+
+
+def select_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, draw_time, draws):
+    """Participant indexes picked by the mini prize draws, in draw order.
+
+    Every draw scans the participants with a ticket left (more tickets than wins) in entry order,
+    pairing the i-th of them with the softmax weight of participant index i as the contract does,
+    and takes the first whose cumulative weight passes a random point; if none does, a random one
+    of them. The first draw uses the seeds of the single winner draw, draw k adds k to both.
+    A winner is credited one more win, so it stays in the later draws while it has tickets left"""
+    softmax = softmax_weights(weights)
+    counts = np.asarray(ticket_counts, dtype=np.int64)
+    wins = np.array(wins, dtype=np.int64)
+    selected = []
+    for draw in range(draws):
+        eligible = np.flatnonzero(counts > wins)
+        if eligible.size == 0:
+            break
+        extra = (draw,) if draw else ()
+        target = draw_seed(hash_numbers, hash_full, *extra) % SCALE_FACTOR
+        # Zero weights leave the cumulative sum as it is, so the first position past the target has weight
+        hits = np.flatnonzero(np.cumsum(softmax[:eligible.size]) > target)
+        position = int(hits[0]) if hits.size else draw_seed(hash_numbers, hash_full, draw_time, *extra) % eligible.size
+        winner = int(eligible[position])
+        selected.append(winner)
+        wins[winner] += 1
+    return selected
+
+
+def settle_rounds(owners, creation_timestamps, ticket_hashes, ticket_hashes_with_strong,
+                  winning_hashes, winning_strong_hashes, draw_times, ticket_price, mini_prize_winners=1):
+    """Settle many rounds at once. Tickets are given as (rounds, tickets) arrays in entry order,
+    padded with an owner of -1: `owners` numbers the participants of a round from 0 in the order of
+    their first entry. The winning hashes and draw times are per round, the ticket price and the
+    number of mini prize draws scalars or per round"""
+    owners = np.atleast_2d(np.asarray(owners, dtype=np.int64))
+    rounds, ticket_slots = owners.shape
+    tickets = owners >= 0
+    rows, columns = np.nonzero(tickets)
+    ticket_owners = owners[rows, columns]
+    draw_times = np.asarray(draw_times, dtype=np.int64)
+
+    # The hashes compare as S32 byte strings across the rounds, padded tickets are masked out
+    big, small = classify_winners(
+        np.asarray(ticket_hashes, dtype="S32").reshape(rounds, ticket_slots),
+        np.asarray(ticket_hashes_with_strong, dtype="S32").reshape(rounds, ticket_slots),
+        np.asarray(winning_hashes, dtype="S32")[:, None],
+        np.asarray(winning_strong_hashes, dtype="S32")[:, None],
+    )
+    big &= tickets
+    small &= tickets
+
+    participants = max(int(owners.max(initial=-1)) + 1, 1)
+    ticket_counts = np.zeros((rounds, participants), dtype=np.int64)
+    np.add.at(ticket_counts, (rows, ticket_owners), 1)
+    wins = {}
+    for name, mask in (("small", small), ("big", big)):
+        wins[name] = np.zeros((rounds, participants), dtype=np.int64)
+        np.add.at(wins[name], (rows, ticket_owners), mask[rows, columns])
+
+    # participantWeight, the hours of every ticket floored on their own
+    weights = np.ones((rounds, participants), dtype=np.int64)
+    held = (draw_times[:, None] - np.asarray(creation_timestamps, dtype=np.int64).reshape(rounds, ticket_slots)) // HOUR
+    np.add.at(weights, (rows, ticket_owners), held[rows, columns])
+
+    mini, mini_wins = draw_mini_prize_winners(
+        weights, ticket_counts, wins["small"] + wins["big"], winning_hashes, winning_strong_hashes, draw_times,
+        np.broadcast_to(np.asarray(mini_prize_winners, dtype=np.int64), (rounds,)),
+    )
+    split = split_prize_pool(
+        np.asarray(ticket_price, dtype=object) * tickets.sum(axis=1),
+        small.sum(axis=1), big.sum(axis=1), (mini >= 0).sum(axis=1),
+    )
+    pending = sum(
+        count.astype(object) * np.asarray(per_winner, dtype=object)[:, None]
+        for count, per_winner in ((wins["small"], split.small_per_winner), (wins["big"], split.big_per_winner),
+                                  (mini_wins, split.mini_per_winner))
+    )
+    return RoundsOutcome(big=big, small=small, mini=mini, split=split, pending=pending)
+
+
+def draw_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, draw_times, draws):
+    """select_mini_prize_winners over (rounds, participants) arrays, the participants a round does
+    not have hold no ticket. Every draw is made across the rounds at once; returns the winners as
+    (rounds, draws), -1 past a round's draws, and the mini prizes won by every participant"""
+    rounds, participants = weights.shape
+    present = ticket_counts > 0
+    top = present & (np.where(present, weights, 0).max(axis=1)[:, None] - weights <= SOFTMAX_SPAN)
+    top_counts = top.sum(axis=1).astype(object)
+    # A round with tickets has a participant in the top class, one without makes no draw
+    sum_exp = np.maximum(top_counts * SCALE_FACTOR + (present.sum(axis=1) - top_counts), SCALE_FACTOR)
+    high = (SCALE_FACTOR * SCALE_FACTOR // sum_exp).astype(np.int64)
+    low = (SCALE_FACTOR // sum_exp).astype(np.int64)
+    # The softmax weights of a round sum to at most SCALE_FACTOR, so their running sum fits int64
+    cumulative = np.cumsum(np.where(top, high[:, None], np.where(present, low[:, None], 0)), axis=1)
+
+    positions = np.arange(participants)
+    winners = np.full((rounds, int(draws.max(initial=0))), -1, dtype=np.int64)
+    mini_wins = np.zeros_like(wins)
+    for draw in range(winners.shape[1]):
+        eligible = ticket_counts > wins + mini_wins
+        eligible_count = eligible.sum(axis=1)
+        drawing = np.flatnonzero((draw < draws) & (eligible_count > 0))
+        if drawing.size == 0:
+            break
+        extra = (draw,) if draw else ()
+        targets = np.array([draw_seed(hash_numbers[r], hash_full[r], *extra) % SCALE_FACTOR for r in drawing],
+                           dtype=np.int64)
+        fallbacks = np.array([draw_seed(hash_numbers[r], hash_full[r], draw_times[r], *extra) % int(eligible_count[r])
+                              for r in drawing], dtype=np.int64)
+
+        # Eligible position k takes the weight of participant index k, as the contract pairs them
+        hits = (cumulative[drawing] > targets[:, None]) & (positions < eligible_count[drawing, None])
+        position = np.where(hits.any(axis=1), hits.argmax(axis=1), fallbacks)
+        ranks = np.cumsum(eligible[drawing], axis=1) - 1
+        winner = (eligible[drawing] & (ranks == position[:, None])).argmax(axis=1)
+        winners[drawing, draw] = winner
+        mini_wins[drawing, winner] += 1
+    return winners, mini_wins
+
+
+def settle_round(entries, ticket_price, winning_hash, winning_strong_hash, draw_time,
+                 mini_prize_winners=1, commission_recipient=None):
+    """Outcome of drawing a round whose tickets are `entries` at block timestamp `draw_time`.
+    The pending prizes include the commission when `commission_recipient` is given"""
+    # Participants in the order of their first entry
+    participants = list(dict.fromkeys(entry.participant for entry in entries))
+    owners = [participants.index(entry.participant) for entry in entries]
+    settled = settle_rounds(
+        np.array([owners], dtype=np.int64).reshape(1, len(entries)),
+        [[entry.creation_timestamp for entry in entries]],
+        [[entry.ticket_hash for entry in entries]],
+        [[entry.ticket_hash_with_strong for entry in entries]],
+        [winning_hash], [winning_strong_hash], [draw_time], ticket_price, mini_prize_winners,
+    )
+
+    outcome = RoundOutcome(
+        big_prize_winners=[participants[owner] for owner, won in zip(owners, settled.big[0]) if won],
+        small_prize_winners=[participants[owner] for owner, won in zip(owners, settled.small[0]) if won],
+        mini_prize_winners=[participants[winner] for winner in settled.mini[0] if winner >= 0],
+        split=PrizeSplit(*(getattr(settled.split, name)[0] for name in PrizeSplit.__dataclass_fields__)),
+    )
+    winners = set(outcome.small_prize_winners + outcome.big_prize_winners + outcome.mini_prize_winners)
+    outcome.pending = {participant: settled.pending[0][index]
+                       for index, participant in enumerate(participants) if participant in winners}
+    if commission_recipient is not None and outcome.split.commission > 0:
+        outcome.pending[commission_recipient] = outcome.pending.get(commission_recipient, 0) + outcome.split.commission
+    return outcome
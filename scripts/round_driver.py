@@ -0,0 +1,222 @@
+"""Run full lottery rounds against a deployed ticket system from a declarative spec.
+
+    driver = RoundDriver(main_ticket_system, owner)
+    result = driver.run(RoundSpec(
+        players=[PlayerSpec(accounts[1], tickets=3), PlayerSpec(accounts[2])],
+        winning_hash=ticket_hashes("r1", accounts[1], 0)[0],
+        winning_strong_hash=ticket_hashes("r1", accounts[2], 0)[1],
+    ))
+
+A round is purchase -> select -> close -> draw -> claim. Every player buys and enters its
+tickets in batched transactions of up to `max_batch` tickets, and the round is held open while it fills so any
+number of transactions fits in it. Works with every contract sharing the MainTicketSystem ABI.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from brownie import chain, web3
+
+HELD_OPEN_BLOCKS = 1_000_000 # Close wait used while a round is being filled
+MAX_BATCH = 50 # Tickets bought or entered per transaction, larger purchases are split
+DEFAULT_NUMBERS = [1, 2, 3, 4, 5, 6]
+DEFAULT_STRONG_NUMBER = 7
+ROUND_FINALIZED = 2 # lotteryStatus.FINALIZED
+
+
+def ticket_hashes(label, account, index):
+    """Default (ticket hash, strong hash) of a player's `index`-th ticket in the round named `label`"""
+    return (
+        web3.keccak(text=f"{label}_hash_{account.address}_{index}"),
+        web3.keccak(text=f"{label}_strong_hash_{account.address}_{index}"),
+    )
+
+
+@dataclass
+class PlayerSpec:
+    """A player of the round and the tickets it enters, hashes default to ticket_hashes(label, account, i)"""
+    account: object
+    tickets: int = 1
+    hashes: Optional[List[Tuple[bytes, bytes]]] = None
+
+
+@dataclass
+class RoundSpec:
+    """Players of the round and the draw that ends it"""
+    players: List[PlayerSpec]
+    winning_hash: bytes
+    winning_strong_hash: bytes
+    numbers: List[int] = field(default_factory=lambda: list(DEFAULT_NUMBERS))
+    strong_number: int = DEFAULT_STRONG_NUMBER
+    label: str = "round"
+    draw_step_tickets: Optional[int] = None  # Draw with drawLotteryWinnerStep in slices of this size
+    draw_gas_limit: Optional[int] = None     # Gas limit of the draw transactions, the network default if None
+    claim: bool = True                       # Winners claim their prizes once the round is drawn
+
+    @classmethod
+    def from_draw(cls, players, draw, **options):
+        """Round ending with `draw`, a randomness_service.Draw"""
+        return cls(players, draw.hash_numbers, draw.hash_full, list(draw.numbers), draw.strong_number, **options)
+
+
+@dataclass
+class RoundFill:
+    """Tickets bought and entered by RoundDriver.fill, the round is closed and ready to be drawn"""
+    round_number: int
+    ticket_ids: Dict[str, List[int]]
+    purchase_txs: list
+    entry_txs: list
+    seconds: Dict[str, float]  # Wall time of the 'purchase' and 'entry' phases
+
+
+@dataclass
+class RoundResult:
+    """What happened in a driven round, amounts in wei"""
+    round_number: int
+    ticket_ids: Dict[str, List[int]]
+    total_prize_pool: int
+    total_tickets: int
+    participants: List[str]
+    small_prize_winners: List[str]
+    big_prize_winners: List[str]
+    mini_prize_winners: List[str]
+    big_prize: int
+    small_prize: int
+    mini_prize: int
+    commission: int
+    claimed: Dict[str, int]
+    purchase_txs: list = field(default_factory=list)
+    entry_txs: list = field(default_factory=list)
+    draw_txs: list = field(default_factory=list)
+    claim_txs: list = field(default_factory=list)
+    seconds: Dict[str, float] = field(default_factory=dict)  # Wall time of the 'purchase', 'entry' and 'draw' phases
+
+    @property
+    def winners(self):
+        """Every address credited with a prize in the round, once"""
+        return list(dict.fromkeys(self.big_prize_winners + self.small_prize_winners + self.mini_prize_winners))
+
+    def gas_used(self, phase):
+        """Total gas of the 'purchase', 'entry', 'draw' or 'claim' transactions"""
+        return sum(tx.gas_used for tx in getattr(self, f"{phase}_txs"))
+
+
+class RoundDriver:
+    """Drives rounds of `system` with `owner`, the account that deployed it"""
+
+    def __init__(self, system, owner, tx_params=None, max_batch=MAX_BATCH):
+        self.system = system
+        self.owner = owner
+        self.tx_params = dict(tx_params or {})
+        self.max_batch = max_batch
+
+    def _tx(self, sender, **params):
+        return {'from': sender, **self.tx_params, **params}
+
+    def buy(self, account, count):
+        """Buy `count` tickets in one transaction, returns (ticket ids, tx)"""
+        ticket_price = self.system.getTicketPrice()
+        if count == 1:
+            tx = self.system.purchaseTicket(self._tx(account, value=ticket_price))
+            return [tx.return_value], tx
+        tx = self.system.purchaseTickets(count, self._tx(account, value=ticket_price * count))
+        return list(tx.return_value), tx
+
+    def enter(self, account, ticket_ids, hashes):
+        """Enter the tickets in the open round in one transaction"""
+        if len(ticket_ids) == 1:
+            ticket_hash, strong_hash = hashes[0]
+            return self.system.selectTicketsForLottery(ticket_ids[0], ticket_hash, strong_hash, self._tx(account))
+        return self.system.selectTicketsForLotteryBatch(
+            ticket_ids, [h for h, _ in hashes], [s for _, s in hashes], self._tx(account))
+
+    def close(self):
+        """Close the open round as soon as the block waits allow it and wait until it can be drawn"""
+        blocks_to_close, blocks_to_draw = self.system.getBlocksWait()
+        chain.mine(blocks_to_close)
+        if self.system.isLotteryActive():
+            self.system.closeLotteryRound(self._tx(self.owner))
+        chain.mine(blocks_to_draw)
+
+    def draw(self, spec):
+        """Draw the closed round, in one transaction or in steps of spec.draw_step_tickets"""
+        draw_args = [spec.winning_hash, spec.winning_strong_hash, spec.numbers, spec.strong_number]
+        params = self._tx(self.owner) if spec.draw_gas_limit is None else self._tx(self.owner, gas_limit=spec.draw_gas_limit)
+        if spec.draw_step_tickets is None:
+            return [self.system.drawLotteryWinner(*draw_args, params)]
+        txs = []
+        while not txs or not txs[-1].return_value:
+            txs.append(self.system.drawLotteryWinnerStep(*draw_args, spec.draw_step_tickets, params))
+        return txs
+
+    def fill(self, spec):
+        """Buy and enter the tickets of `spec` in the open round, then close it"""
+        round_number = self.system.getCurrentRound()
+        blocks_to_close, blocks_to_draw = self.system.getBlocksWait()
+        self.system.setBlocksWait(HELD_OPEN_BLOCKS, blocks_to_draw, self._tx(self.owner))
+
+        ticket_ids = {}
+        purchase_txs = []
+        entry_txs = []
+        seconds = {"purchase": 0.0, "entry": 0.0}
+        for player in spec.players:
+            hashes = player.hashes or [ticket_hashes(spec.label, player.account, i) for i in range(player.tickets)]
+            for first in range(0, player.tickets, self.max_batch):
+                count = min(self.max_batch, player.tickets - first)
+                start = time.perf_counter()
+                ids, tx = self.buy(player.account, count)
+                seconds["purchase"] += time.perf_counter() - start
+                purchase_txs.append(tx)
+                ticket_ids.setdefault(player.account.address, []).extend(ids)
+                start = time.perf_counter()
+                entry_txs.append(self.enter(player.account, ids, hashes[first:first + count]))
+                seconds["entry"] += time.perf_counter() - start
+
+        self.system.setBlocksWait(blocks_to_close, blocks_to_draw, self._tx(self.owner))
+        self.close()
+        return RoundFill(round_number, ticket_ids, purchase_txs, entry_txs, seconds)
+
+    def run(self, spec):
+        """Play the round described by `spec` in the open round and return its RoundResult"""
+        filled = self.fill(spec)
+        round_number = filled.round_number
+        start = time.perf_counter()
+        draw_txs = self.draw(spec)
+        seconds = dict(filled.seconds, draw=time.perf_counter() - start)
+
+        (_, total_prize_pool, address_arrays, status, big_prize, small_prize, mini_prize, commission,
+         total_tickets, _, _) = self.system.getLotteryRoundInfo(round_number)
+        assert status == ROUND_FINALIZED, f"Round {round_number} was not finalized"
+        participants, small_winners, big_winners, mini_winners = [list(addresses) for addresses in address_arrays]
+
+        result = RoundResult(
+            round_number=round_number,
+            ticket_ids=filled.ticket_ids,
+            total_prize_pool=total_prize_pool,
+            total_tickets=total_tickets,
+            participants=participants,
+            small_prize_winners=small_winners,
+            big_prize_winners=big_winners,
+            mini_prize_winners=mini_winners,
+            big_prize=big_prize,
+            small_prize=small_prize,
+            mini_prize=mini_prize,
+            commission=commission,
+            claimed={},
+            purchase_txs=filled.purchase_txs,
+            entry_txs=filled.entry_txs,
+            draw_txs=draw_txs,
+            seconds=seconds,
+        )
+        if spec.claim:
+            self.claim(result)
+        return result
+
+    def claim(self, result):
+        """Claim the pending prize of every winner of the round, the owner pays the gas of the claims
+        so the winners' balances grow by their prize exactly"""
+        for winner in result.winners:
+            pending = self.system.getPendingPrize(winner)
+            if pending > 0:
+                result.claim_txs.append(self.system.claimPrize(winner, self._tx(self.owner)))
+                result.claimed[winner] = pending
@@ -0,0 +1,212 @@
+"""Monte-Carlo simulation of mini prize fairness and prize pool splits under simulated traffic.
+
+    python -m scripts.simulate_payouts [--rounds 1000000] [--tickets 200] [--mean-hold-hours 24] [--workers 8]
+
+Every simulated round gets a Poisson number of tickets, each bought by its own participant and
+held for an exponential number of hours. Big and small prize winners match the drawn numbers with
+the odds of picking 6 of 37 numbers and 1 of 7 strong numbers. The mini prize winners are drawn
+with the contract's rule (reference_model.select_mini_prize_winners), uniform random points
+standing in for the keccak seeds. The pools are split with the reference model's
+split_prize_pool, which follows splitPrizePool.
+
+Rounds are simulated in chunks across a process pool. Prints the mini prize win probability
+of a ticket per hold time bucket and the average prize pool split, and writes both to
+reports/payout_simulation.json.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+from scripts.reference_model import SOFTMAX_SPAN, split_prize_pool
+
+NUMBERS_ODDS = 1 / math.comb(37, 6) # Chance of a ticket matching the six drawn numbers
+STRONG_ODDS = 1 / 7 # Chance of a ticket matching the strong number
+HOLD_BUCKETS = [0, 1, 6, 24, 72] # Lower edges in hours of the hold time buckets reported
+CHUNK_ROUNDS = 10_000 # Rounds simulated by a worker at a time
+SIMULATION_REPORT = os.path.join("reports", "payout_simulation.json")
+
+
+@dataclass
+class Traffic:
+    """Simulated traffic of a round and the lottery parameters it is drawn with"""
+    tickets: float = 200 # Mean tickets per round
+    mean_hold_hours: float = 24 # Mean time between purchase and draw
+    mini_prize_winners: int = 1
+    ticket_price: int = 10**18
+    big_odds: float = NUMBERS_ODDS * STRONG_ODDS
+    small_odds: float = NUMBERS_ODDS * (1 - STRONG_ODDS)
+    hold_buckets: List[float] = field(default_factory=lambda: list(HOLD_BUCKETS))
+
+
+@dataclass
+class SimulationTotals:
+    """Sums over the simulated rounds, merged across chunks"""
+    rounds: int
+    bucket_tickets: np.ndarray
+    bucket_wins: np.ndarray
+    prizes: dict # Prize pool field => total wei over the rounds
+    rounds_without: dict # Prize => rounds in which nobody won it
+    commission_shares: np.ndarray # Commission over prize pool of every round
+
+    def merge(self, other):
+        return SimulationTotals(
+            rounds=self.rounds + other.rounds,
+            bucket_tickets=self.bucket_tickets + other.bucket_tickets,
+            bucket_wins=self.bucket_wins + other.bucket_wins,
+            prizes={name: total + other.prizes[name] for name, total in self.prizes.items()},
+            rounds_without={name: count + other.rounds_without[name] for name, count in self.rounds_without.items()},
+            commission_shares=np.concatenate([self.commission_shares, other.commission_shares]),
+        )
+
+
+def sample_mini_prize_winners(weights, eligible, winners, rng):
+    """Mask of the mini prize winners of every round (row) of one-ticket participants, `weights`
+    being their hold-time weights and 0 past the end of the round.
+
+    The softmax gives the participants at most SOFTMAX_SPAN below the heaviest an equal share and
+    the others none, so the scan of a draw stops at the k-th of those top participants for a
+    uniform k, provided its index falls among the first `eligible` count positions, and then takes
+    the eligible participant at that position. Otherwise a uniformly drawn eligible one wins"""
+    present = weights > 0
+    top = present & (weights.max(axis=1, keepdims=True) - weights <= SOFTMAX_SPAN)
+    top_rank = np.cumsum(top, axis=1)
+    top_count = top_rank[:, -1]
+    eligible = eligible & present
+    mask = np.zeros(weights.shape, dtype=bool)
+    rows = np.arange(weights.shape[0])
+
+    for _ in range(winners):
+        eligible_rank = np.cumsum(eligible, axis=1)
+        eligible_count = eligible_rank[:, -1]
+        drawn = eligible_count > 0
+        k = (rng.random(len(rows)) * top_count).astype(np.int64)
+        scan_stop = np.argmax(top & (top_rank == k[:, None] + 1), axis=1)
+        fallback = (rng.random(len(rows)) * eligible_count).astype(np.int64)
+        position = np.where(scan_stop < eligible_count, scan_stop, fallback)
+        winner = np.argmax(eligible & (eligible_rank == position[:, None] + 1), axis=1)
+        # Every participant holds one ticket, a winner has none left for the later draws
+        mask[rows[drawn], winner[drawn]] = True
+        eligible[rows[drawn], winner[drawn]] = False
+    return mask
+
+
+def simulate_chunk(traffic, rounds, seed):
+    """Simulate `rounds` rounds with a generator seeded by `seed`"""
+    rng = np.random.default_rng(seed)
+    tickets = np.maximum(rng.poisson(traffic.tickets, rounds), 1)
+    width = int(tickets.max())
+    present = np.arange(width) < tickets[:, None]
+
+    hold_hours = rng.exponential(traffic.mean_hold_hours, (rounds, width))
+    weights = np.where(present, 1 + np.floor(hold_hours).astype(np.int64), 0)
+    outcome = rng.random((rounds, width))
+    big = present & (outcome < traffic.big_odds)
+    small = present & ~big & (outcome < traffic.big_odds + traffic.small_odds)
+    mini = sample_mini_prize_winners(weights, present & ~big & ~small, traffic.mini_prize_winners, rng)
+
+    edges = np.array(traffic.hold_buckets + [np.inf])
+    buckets = np.clip(np.searchsorted(edges, hold_hours, side="right") - 1, 0, len(traffic.hold_buckets) - 1)
+    bucket_tickets = np.bincount(buckets[present], minlength=len(traffic.hold_buckets))
+    bucket_wins = np.bincount(buckets[mini], minlength=len(traffic.hold_buckets))
+
+    pools = tickets.astype(object) * traffic.ticket_price
+    winner_counts = {"small": small.sum(axis=1), "big": big.sum(axis=1), "mini": mini.sum(axis=1)}
+    split = split_prize_pool(pools, winner_counts["small"], winner_counts["big"], winner_counts["mini"])
+    return SimulationTotals(
+        rounds=rounds,
+        bucket_tickets=bucket_tickets,
+        bucket_wins=bucket_wins,
+        prizes={
+            "total_prize_pool": int(pools.sum()),
+            "small_prize": int(split.small_prize.sum()),
+            "big_prize": int(split.big_prize.sum()),
+            "mini_prize": int(split.mini_prize.sum()),
+            "commission": int(split.commission.sum()),
+        },
+        rounds_without={prize: int((count == 0).sum()) for prize, count in winner_counts.items()},
+        commission_shares=(split.commission / pools).astype(float),
+    )
+
+
+def simulate(traffic, rounds, workers=1, seed=0, chunk_rounds=CHUNK_ROUNDS):
+    """Simulate `rounds` rounds in chunks over `workers` processes, in this process with one worker"""
+    chunks = [min(chunk_rounds, rounds - start) for start in range(0, rounds, chunk_rounds)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(simulate_chunk, [traffic] * len(chunks), chunks, seeds))
+    else:
+        results = [simulate_chunk(traffic, size, chunk_seed) for size, chunk_seed in zip(chunks, seeds)]
+    totals = results[0]
+    for result in results[1:]:
+        totals = totals.merge(result)
+    return totals
+
+
+def summarize(traffic, totals):
+    """Win probability per hold bucket and prize pool split of the simulation, JSON ready"""
+    buckets = []
+    bounds = traffic.hold_buckets + [None]
+    for low, high, tickets, wins in zip(bounds, bounds[1:], totals.bucket_tickets, totals.bucket_wins):
+        buckets.append({
+            "hold_hours": f"{low}-{high}" if high is not None else f"{low}+",
+            "tickets": int(tickets),
+            "mini_prize_wins": int(wins),
+            "win_probability": float(wins / tickets) if tickets else None,
+        })
+    pool = totals.prizes["total_prize_pool"]
+    return {
+        "rounds": totals.rounds,
+        "traffic": dict(vars(traffic)),
+        "mini_prize_by_hold_time": buckets,
+        "prize_pool_split": {name: total / pool for name, total in totals.prizes.items() if name != "total_prize_pool"},
+        "rounds_without_winner": {prize: count / totals.rounds for prize, count in totals.rounds_without.items()},
+        "commission_share": {
+            "mean": float(totals.commission_shares.mean()),
+            "p5": float(np.percentile(totals.commission_shares, 5)),
+            "p95": float(np.percentile(totals.commission_shares, 95)),
+        },
+    }
+
+
+def format_report(summary):
+    rows = ["| Hold (h) | Tickets | Mini prize wins | Win probability |", "| --- | ---: | ---: | ---: |"]
+    for bucket in summary["mini_prize_by_hold_time"]:
+        probability = "-" if bucket["win_probability"] is None else f"{bucket['win_probability']:.3e}"
+        rows.append(f"| {bucket['hold_hours']} | {bucket['tickets']} | {bucket['mini_prize_wins']} | {probability} |")
+    rows.append("")
+    rows.append("| Prize pool share | |")
+    rows.append("| --- | ---: |")
+    for name, share in summary["prize_pool_split"].items():
+        rows.append(f"| {name} | {share:.2%} |")
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1_000_000)
+    parser.add_argument("--tickets", type=float, default=Traffic.tickets, help="Mean tickets per round")
+    parser.add_argument("--mean-hold-hours", type=float, default=Traffic.mean_hold_hours)
+    parser.add_argument("--mini-prize-winners", type=int, default=Traffic.mini_prize_winners)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    traffic = Traffic(tickets=args.tickets, mean_hold_hours=args.mean_hold_hours, mini_prize_winners=args.mini_prize_winners)
+    summary = summarize(traffic, simulate(traffic, args.rounds, args.workers, args.seed))
+    print(format_report(summary))
+    os.makedirs(os.path.dirname(SIMULATION_REPORT), exist_ok=True)
+    with open(SIMULATION_REPORT, "w") as report:
+        json.dump(summary, report, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Asyncio client of a deployed ticket system, for keepers, indexers and load generators.
+
+    async with await TicketSystemClient.connect(uri, address, abi, senders=[player]) as client:
+        price, tickets = await client.batch_call([("getTicketPrice",), ("getPlayerTickets", player)])
+        tx_hash = await client.transact("purchaseTickets", 2, sender=player, value=2 * price)
+        receipt = await client.wait_for_receipt(tx_hash)
+
+http(s):// endpoints share one pool of keep-alive connections, ws(s):// endpoints one persistent
+socket. Senders are either accounts unlocked on the node (an address) or local accounts signing
+their own transactions (an eth_account LocalAccount). Nonces are tracked per sender so any number
+of transactions can be sent concurrently, from one sender or many. Works with every contract
+sharing the MainTicketSystem ABI; load_abi reads it from the brownie build.
+
+Built on the web3 7 async API (WebSocketProvider, batch_requests, Web3RPCError) and eth-account
+0.13, the versions eth-brownie 1.22 pins; older brownie releases install web3 5 or 6, which lack them.
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from web3 import AsyncHTTPProvider, AsyncWeb3, WebSocketProvider
+from web3.exceptions import TransactionNotFound
+
+BUILD_ABI = os.path.join("build", "contracts", "MainTicketSystem.json")
+POOL_SIZE = 32 # Open HTTP connections shared by all requests
+REQUEST_TIMEOUT = 30 # Seconds before a single JSON-RPC request fails
+GAS_MARGIN = 1.2 # Gas limit of a transaction over its estimate
+
+
+def load_abi(path=BUILD_ABI):
+    """ABI of a compiled ticket system from its brownie build artifact"""
+    with open(path) as artifact:
+        return json.load(artifact)["abi"]
+
+
+@dataclass
+class ReceiptPolling:
+    """How wait_for_receipt polls: the delay starts at `interval` and grows by `backoff` up to `max_interval`"""
+    interval: float = 0.05
+    backoff: float = 2.0
+    max_interval: float = 2.0
+    timeout: float = 120.0
+
+
+class NonceManager:
+    """Next nonce of every sender, read from the node once and then counted locally.
+    A sender's nonces are handed out under its own lock, so concurrent sends never share one"""
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self.nonces = {}
+        self.locks = {}
+
+    def lock(self, address):
+        return self.locks.setdefault(address, asyncio.Lock())
+
+    async def next(self, address):
+        """Reserve the sender's next nonce, the caller holds lock(address)"""
+        if address not in self.nonces:
+            self.nonces[address] = await self.w3.eth.get_transaction_count(address, "pending")
+        nonce = self.nonces[address]
+        self.nonces[address] = nonce + 1
+        return nonce
+
+    def reset(self, address):
+        """Forget the sender's nonce, the next one is read from the node again"""
+        self.nonces.pop(address, None)
+
+
+class TicketSystemClient:
+    """Calls and transactions of the ticket system at `address`, over an AsyncWeb3 connection"""
+
+    def __init__(self, w3, address, abi, senders=(), polling=None):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=AsyncWeb3.to_checksum_address(address), abi=abi)
+        self.signers = {}
+        for sender in senders:
+            self.add_sender(sender)
+        self.nonces = NonceManager(w3)
+        self.polling = polling or ReceiptPolling()
+        self._chain_id = None
+
+    @classmethod
+    async def connect(cls, uri, address, abi, senders=(), pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT, polling=None):
+        """Client talking to the node at `uri` over pooled HTTP or a persistent WebSocket"""
+        if uri.startswith(("ws://", "wss://")):
+            w3 = AsyncWeb3(WebSocketProvider(uri, request_timeout=timeout))
+            await w3.provider.connect()
+        else:
+            provider = AsyncHTTPProvider(uri)
+            await provider.cache_async_session(ClientSession(
+                raise_for_status=True,
+                connector=TCPConnector(limit=pool_size),
+                timeout=ClientTimeout(total=timeout),
+            ))
+            w3 = AsyncWeb3(provider)
+        return cls(w3, address, abi, senders, polling)
+
+    async def close(self):
+        await self.w3.provider.disconnect()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def add_sender(self, sender):
+        """Register a sender: an address unlocked on the node or a LocalAccount, returns its address"""
+        address = AsyncWeb3.to_checksum_address(getattr(sender, "address", sender))
+        self.signers[address] = sender if hasattr(sender, "sign_transaction") else None
+        return address
+
+    async def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = await self.w3.eth.chain_id
+        return self._chain_id
+
+    async def call(self, function, *args, sender=None, block_identifier="latest"):
+        """Result of the view `function` called with `args`"""
+        params = {} if sender is None else {"from": AsyncWeb3.to_checksum_address(getattr(sender, "address", sender))}
+        return await self.contract.functions[function](*args).call(params, block_identifier)
+
+    async def batch_call(self, calls):
+        """Results of `calls`, (function, *args) tuples, sent as one JSON-RPC batch"""
+        async with self.w3.batch_requests() as batch:
+            for function, *args in calls:
+                batch.add(self.contract.functions[function](*args))
+            return await batch.async_execute()
+
+    async def transact(self, function, *args, sender, value=0, gas=None):
+        """Send a transaction calling `function`, returns its hash without waiting for it to be mined.
+        The gas limit is estimated when `gas` is None"""
+        address = AsyncWeb3.to_checksum_address(getattr(sender, "address", sender))
+        if address not in self.signers:
+            self.add_sender(sender)
+        signer = self.signers[address]
+        call = self.contract.functions[function](*args)
+
+        async with self.nonces.lock(address):
+            tx = {"from": address, "value": value, "nonce": await self.nonces.next(address)}
+            try:
+                if gas is None:
+                    gas = int(await call.estimate_gas({"from": address, "value": value}) * GAS_MARGIN)
+                # Legacy gas pricing, the local nodes the suite runs on do not all support EIP-1559
+                tx.update(gas=gas, gasPrice=await self.w3.eth.gas_price, chainId=await self.chain_id())
+                if signer is None:
+                    return await self.w3.eth.send_transaction(await call.build_transaction(tx))
+                signed = signer.sign_transaction(await call.build_transaction(tx))
+                return await self.w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception:
+                # The nonce may or may not have been used, read it from the node next time
+                self.nonces.reset(address)
+                raise
+
+    async def wait_for_receipt(self, tx_hash, polling=None):
+        """Receipt of `tx_hash`, polled with exponential backoff. Raises TimeoutError once
+        polling.timeout seconds pass without one"""
+        polling = polling or self.polling
+        deadline = time.monotonic() + polling.timeout
+        interval = polling.interval
+        while True:
+            try:
+                return await self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No receipt for {AsyncWeb3.to_hex(tx_hash)} after {polling.timeout} seconds")
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * polling.backoff, polling.max_interval)
+
+    async def transact_and_wait(self, function, *args, sender, value=0, gas=None):
+        """Send a transaction and wait for its receipt"""
+        return await self.wait_for_receipt(await self.transact(function, *args, sender=sender, value=value, gas=gas))
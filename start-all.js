@@ -6,6 +6,12 @@ const hardhatNode = spawn('npx hardhat node', {
   shell: true,
 });
 
+// Start the randomness service the frontend draws from
+const randomnessService = spawn('python -m scripts.randomness_service', {
+  stdio: 'inherit',
+  shell: true,
+});
+
 // Wait for node to start
 setTimeout(() => {
   // Run deploy script
@@ -1,5 +1,22 @@
+import json
+import os
+import time
+from collections import defaultdict
+
 import pytest
-from brownie import network, accounts
+import brownie
+from brownie import network, accounts, history
+from scripts.gas_report import summarize_gas, find_gas_regressions
+
+TICKET_SYSTEMS = ["MainTicketSystem", "UnifiedTicketSystem"] # Deployments sharing the MainTicketSystem ABI
+GAS_REPORT = os.path.join("reports", "gas_report.json") # Default path of the per-function gas report
+GAS_TOLERANCE = 0.05 # Allowed relative growth of a function's median gas over the baseline
+TIMING_REPORT = os.path.join("reports", "test_timing.json") # Wall time of the last run, compared against by the next
+
+gas_by_function = defaultdict(list) # "Contract.function" => gas used by every successful transaction
+gas_regressions = [] # Messages of the functions over their baseline, filled at the end of the session
+test_durations = defaultdict(float) # Test id => seconds spent in its setup, call and teardown
+session_timing = {} # Start time of the session, then the current and previous timing reports
 
 @pytest.fixture(scope="function")
 def owner_account():
@@ -11,14 +28,150 @@ def player_accounts():
     """Fixture to provide player accounts"""
     return accounts[1:5]
 
+def pytest_addoption(parser):
+    """Pick the ticket system deployment the suite runs against and configure the gas report"""
+    parser.addoption(
+        "--ticket-system",
+        choices=TICKET_SYSTEMS,
+        default="MainTicketSystem",
+        help="Contract deployed by the ticket system fixtures",
+    )
+    parser.addoption(
+        "--gas-report",
+        default=GAS_REPORT,
+        help="Path of the JSON report with min/median/p95/max gas of every ticket system function",
+    )
+    parser.addoption(
+        "--gas-baseline",
+        default=None,
+        help="Gas report of a previous run, the run fails if a function's median gas grows beyond --gas-tolerance",
+    )
+    parser.addoption(
+        "--timing-report",
+        default=TIMING_REPORT,
+        help="Path of the JSON report with the wall time of the run, the previous report there is shown for comparison",
+    )
+    parser.addoption(
+        "--gas-tolerance",
+        type=float,
+        default=GAS_TOLERANCE,
+        help="Allowed relative growth of a function's median gas over --gas-baseline",
+    )
+
+def pytest_sessionstart(session):
+    """Start the wall clock of the run"""
+    session_timing["start"] = time.perf_counter()
+
+def pytest_runtest_logreport(report):
+    """Add up the setup, call and teardown time of every test, module deployments land on the first test using them"""
+    test_durations[report.nodeid] += report.duration
+
+def write_timing_report(config):
+    """Write the wall time of the run and keep the report of the previous run for the summary"""
+    report_path = config.getoption("--timing-report")
+    if os.path.exists(report_path):
+        with open(report_path) as report_file:
+            session_timing["previous"] = json.load(report_file)
+    session_timing["current"] = {
+        "total_seconds": round(time.perf_counter() - session_timing["start"], 3),
+        "tests": len(test_durations),
+        "slowest": dict(sorted(test_durations.items(), key=lambda item: -item[1])[:10]),
+    }
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as report_file:
+        json.dump(session_timing["current"], report_file, indent=2)
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Record the gas of every successful ticket system transaction sent by the test"""
+    first_tx = len(history)
+    yield
+    for tx in list(history)[first_tx:]:
+        if tx.status == 1 and tx.contract_name in TICKET_SYSTEMS:
+            gas_by_function[f"{tx.contract_name}.{tx.fn_name}"].append(tx.gas_used)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """Merge the gas samples of a finished xdist worker"""
+    for function, samples in node.workeroutput.get("gas_by_function", {}).items():
+        gas_by_function[function].extend(samples)
+
+def pytest_sessionfinish(session, exitstatus):
+    """Write the timing and gas reports and fail the run on a gas regression against the baseline.
+    An xdist worker only hands its gas samples over, the controller sees every test report"""
+    config = session.config
+    if xdist_worker_index(config) is not None:
+        config.workeroutput["gas_by_function"] = dict(gas_by_function)
+        return
+    write_timing_report(config)
+    if not gas_by_function:
+        return
+    report = summarize_gas(gas_by_function)
+
+    report_path = config.getoption("--gas-report")
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+
+    baseline_path = config.getoption("--gas-baseline")
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        gas_regressions.extend(find_gas_regressions(report, baseline, config.getoption("--gas-tolerance")))
+        if gas_regressions and session.exitstatus == 0:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Print the suite runtime against the previous run, the per-function gas table and the regressions"""
+    current = session_timing.get("current")
+    if current:
+        terminalreporter.section("timing report")
+        line = f"{current['tests']} tests in {current['total_seconds']}s"
+        previous = session_timing.get("previous")
+        if previous:
+            line += f", previous run {previous['tests']} tests in {previous['total_seconds']}s"
+        terminalreporter.write_line(line)
+        for nodeid, seconds in current["slowest"].items():
+            terminalreporter.write_line(f"{seconds:8.2f}s {nodeid}")
+    if not gas_by_function:
+        return
+    terminalreporter.section("gas report")
+    for function, stats in summarize_gas(gas_by_function).items():
+        terminalreporter.write_line(
+            f"{function:<60} count={stats['count']:<5} min={stats['min']:<9} median={stats['median']:<11} "
+            f"p95={stats['p95']:<9} max={stats['max']}"
+        )
+    for regression in gas_regressions:
+        terminalreporter.write_line(f"GAS REGRESSION {regression}", red=True)
+
+@pytest.fixture(scope="session")
+def ticket_system_contract(request):
+    """Fixture to provide the contract container selected with --ticket-system"""
+    return getattr(brownie, request.config.getoption("--ticket-system"))
+
+def xdist_worker_index(config):
+    """Index of the pytest-xdist worker ("gw3" => 3), None outside of a worker"""
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is None:
+        return None
+    return int(workerinput["workerid"].lstrip("gw"))
+
+def is_xdist_controller(config):
+    """True in the process distributing the tests to the xdist workers, which runs none itself"""
+    return xdist_worker_index(config) is None and bool(getattr(config.option, "numprocesses", None))
+
 def pytest_configure(config):
     """Configure pytest settings"""
+    if is_xdist_controller(config):
+        return
+    # Under xdist brownie already moves every worker's chain to a port of its own
     # Set the default network to development/local
     network.connect('development')
 
 def pytest_unconfigure(config):
     """Disconnect from the network after tests"""
-    network.disconnect()
+    if network.is_connected():
+        network.disconnect()
 
 @pytest.fixture(autouse=True)
 def isolation(fn_isolation):
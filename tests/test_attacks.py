@@ -1,5 +1,5 @@
 import pytest
-from brownie import MainTicketSystem, accounts, web3, reverts, chain, Wei, exceptions, compile_source
+from brownie import accounts, web3, reverts, chain, Wei, exceptions, compile_source
 from brownie.network import gas_price
 from eth_account import Account
 import hashlib
@@ -7,16 +7,8 @@ import hashlib
 
 BLOCKS_TO_WAIT_fOR_CLOSE = 4; # Number of blocks to wait for lottery to close
 
-@pytest.fixture
-def main_ticket_system():
-    """Fixture to deploy the MainTicketSystem contract before each test"""
-    print("Deploying MainTicketSystem contract...")
-    return MainTicketSystem.deploy({'from': accounts[0]})
-
-@pytest.fixture
-def malicious_contract_claimPrize(main_ticket_system, accounts):
-    """Fixture to deploy a malicious contract for reentrancy attack"""
-    malicious_code = """
+# Attack contracts are compiled once per session by the *_container fixtures
+MALICIOUS_CLAIM_PRIZE_SOURCE = """
 // SPDX-License-Identifier: MIT
 pragma solidity ^0.8.2;
 
@@ -50,8 +42,80 @@ contract Malicious {
     }
 }
 """
-    compiled = compile_source(malicious_code, solc_version="0.8.2")
-    Malicious = compiled['Malicious']
+
+MALICIOUS_PURCHASE_TICKET_SOURCE = """
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.2;
+
+interface MainTicketSystem {
+    function getTicketPrice() external view returns (uint256);
+    function purchaseTicket() external payable returns (uint256);
+}
+
+contract Malicious {
+    MainTicketSystem public ticketSystem;
+    uint256 public attackCount;
+    uint256 public ticketId;
+    uint256 public ticketPrice;
+    bool public acceptEther = true;
+    constructor(address _ticketSystem) {
+        ticketSystem = MainTicketSystem(_ticketSystem);
+    }
+
+    receive() external payable {
+        if (acceptEther) 
+        {
+            acceptEther = false;
+            return;
+        }
+        if (attackCount < 5) {
+            attackCount++;
+            ticketId = ticketSystem.purchaseTicket{value: msg.value}();
+        }
+    }
+
+    function attack() external payable {
+        ticketPrice = ticketSystem.getTicketPrice();
+        require(msg.value > ticketPrice, "Insufficient funds");
+        ticketId = ticketSystem.purchaseTicket{value: msg.value}();
+        }
+}
+"""
+
+REJECT_ETHER_SOURCE = """
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.2;
+contract RejectEther 
+{
+    bool acceptEther = true;
+    receive() external payable 
+    {
+        if (acceptEther) 
+        {
+            acceptEther = false;
+            return;
+        }
+        revert("No Ether accepted");
+    }
+}
+"""
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module,
+    every test starts from the deployment snapshot taken by fn_isolation"""
+    print(f"Deploying {ticket_system_contract._name} contract...")
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+@pytest.fixture(scope="session")
+def malicious_claim_prize_container():
+    """Fixture to compile the claimPrize reentrancy contract once per session"""
+    return compile_source(MALICIOUS_CLAIM_PRIZE_SOURCE, solc_version="0.8.2")['Malicious']
+
+@pytest.fixture
+def malicious_contract_claimPrize(main_ticket_system, malicious_claim_prize_container, accounts):
+    """Fixture to deploy a malicious contract for reentrancy attack"""
+    Malicious = malicious_claim_prize_container
     # Deploy the malicious contract
     Malicious = Malicious.deploy(main_ticket_system.address, {'from': accounts[1]})
     accounts[1].transfer(Malicious,"10 ether")  # Ensure malicious contract has funds
@@ -101,49 +165,15 @@ def test_reentrancy_attack_claimPrize(main_ticket_system, owner_account, malicio
     assert main_ticket_system.getPendingPrize(malicious_contract_claimPrize, {'from': malicious_contract_claimPrize}) == prize, "Pending prize should remain unchanged after failed reentrancy attack"
     
     
-@pytest.fixture  
-def malicious_contract_purchaseTicket(main_ticket_system, accounts):
-    """Fixture to deploy a malicious contract for reentrancy attack"""
-    malicious_code = """
-// SPDX-License-Identifier: MIT
-pragma solidity ^0.8.2;
-
-interface MainTicketSystem {
-    function getTicketPrice() external view returns (uint256);
-    function purchaseTicket() external payable returns (uint256);
-}
-
-contract Malicious {
-    MainTicketSystem public ticketSystem;
-    uint256 public attackCount;
-    uint256 public ticketId;
-    uint256 public ticketPrice;
-    bool public acceptEther = true;
-    constructor(address _ticketSystem) {
-        ticketSystem = MainTicketSystem(_ticketSystem);
-    }
-
-    receive() external payable {
-        if (acceptEther) 
-        {
-            acceptEther = false;
-            return;
-        }
-        if (attackCount < 5) {
-            attackCount++;
-            ticketId = ticketSystem.purchaseTicket{value: msg.value}();
-        }
-    }
+@pytest.fixture(scope="session")
+def malicious_purchase_ticket_container():
+    """Fixture to compile the purchaseTicket reentrancy contract once per session"""
+    return compile_source(MALICIOUS_PURCHASE_TICKET_SOURCE, solc_version="0.8.2")['Malicious']
 
-    function attack() external payable {
-        ticketPrice = ticketSystem.getTicketPrice();
-        require(msg.value > ticketPrice, "Insufficient funds");
-        ticketId = ticketSystem.purchaseTicket{value: msg.value}();
-        }
-}
-"""
-    compiled = compile_source(malicious_code, solc_version="0.8.2")
-    Malicious = compiled['Malicious']
+@pytest.fixture
+def malicious_contract_purchaseTicket(main_ticket_system, malicious_purchase_ticket_container, accounts):
+    """Fixture to deploy a malicious contract for reentrancy attack"""
+    Malicious = malicious_purchase_ticket_container
     # Deploy the malicious contract
     Malicious = Malicious.deploy(main_ticket_system.address, {'from': accounts[1]})
     accounts[1].transfer(Malicious,"20 ether")  # Ensure malicious contract has funds
@@ -202,28 +232,15 @@ def test_dos_attack_gas_limit(main_ticket_system, owner_account):
     assert main_ticket_system.isLotteryActive() == True
     assert main_ticket_system.getContractBlance() >= 0
 
-@pytest.fixture 
-def reject_ether_contract(accounts):
+@pytest.fixture(scope="session")
+def reject_ether_container():
+    """Fixture to compile the Ether rejecting contract once per session"""
+    return compile_source(REJECT_ETHER_SOURCE, solc_version="0.8.2")['RejectEther']
+
+@pytest.fixture
+def reject_ether_contract(reject_ether_container, accounts):
     """Fixture to deploy a contract that rejects Ether transfers"""
-    reject_ether_code = """
-// SPDX-License-Identifier: MIT
-pragma solidity ^0.8.2;
-contract RejectEther 
-{
-    bool acceptEther = true;
-    receive() external payable 
-    {
-        if (acceptEther) 
-        {
-            acceptEther = false;
-            return;
-        }
-        revert("No Ether accepted");
-    }
-}
-"""
-    compiled = compile_source(reject_ether_code, solc_version="0.8.2")
-    RejectEther = compiled['RejectEther']
+    RejectEther = reject_ether_container
     # Deploy the contract
     reject_ether = RejectEther.deploy({'from': accounts[1]})
     # Fund the contract with Ether to cover ticket price and gas
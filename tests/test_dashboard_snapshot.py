@@ -0,0 +1,57 @@
+import pytest
+from brownie import accounts, web3
+from scripts.batch_calls import batch_call, dashboard_calls
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def individual_reads(main_ticket_system, player):
+    """The dashboard refresh read one getter at a time, flattened like the snapshot"""
+    blocks_until_close, blocks_until_draw = main_ticket_system.getLotteryBlockStatus()
+    return [
+        main_ticket_system.getTicketPrice(),
+        main_ticket_system.getPlayerTickets(player),
+        blocks_until_close,
+        blocks_until_draw,
+        main_ticket_system.getCurrentPrizePool(),
+        main_ticket_system.getCurrentTotalTickets(),
+        main_ticket_system.getCurrentRound(),
+        main_ticket_system.getFLEX_COMMISSION(),
+        main_ticket_system.getSMALL_PRIZE_PERCENTAGE(),
+        main_ticket_system.getMINI_PRIZE_PERCENTAGE(),
+    ]
+
+
+def test_dashboard_snapshot_matches_getters(main_ticket_system):
+    """The snapshot and the batched getters return what the getters return one by one, for a
+    player without tickets and one with tickets in the open round"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_ids = main_ticket_system.purchaseTickets(3, {'from': accounts[1], 'value': ticket_price * 3}).return_value
+    main_ticket_system.selectTicketsForLottery(
+        ticket_ids[0], web3.keccak(text="dashboard_hash"), web3.keccak(text="dashboard_strong_hash"), {'from': accounts[1]})
+
+    for player in (accounts[1], accounts[2]):
+        expected = individual_reads(main_ticket_system, player)
+        assert list(main_ticket_system.getDashboardSnapshot(player)) == expected
+
+        price, tickets, (blocks_until_close, blocks_until_draw), *rest = batch_call(dashboard_calls(main_ticket_system, player))
+        assert [price, tickets, blocks_until_close, blocks_until_draw, *rest] == expected
+
+    snapshot = main_ticket_system.getDashboardSnapshot(accounts[1])
+    assert [ticket[0] for ticket in snapshot[1]] == list(ticket_ids)
+    assert snapshot[4] == ticket_price and snapshot[5] == 1
+
+
+def test_batch_call_sender_and_block(main_ticket_system):
+    """Batched calls run as the given sender and at the given block"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    block = web3.eth.block_number
+    main_ticket_system.purchaseTickets(2, {'from': accounts[3], 'value': ticket_price * 2})
+
+    active, = batch_call([(main_ticket_system.getActiveTickets,)], sender=accounts[3])
+    assert active == main_ticket_system.getActiveTickets({'from': accounts[3]}) and len(active) == 2
+    assert batch_call([(main_ticket_system.getPlayerTickets, accounts[3])], block_identifier=block) == [[]]
@@ -0,0 +1,362 @@
+import os
+import pytest
+from brownie import MainTicketSystem, UnifiedTicketSystem, accounts, web3, chain
+
+
+BLOCKS_TO_WAIT_fOR_CLOSE = 4 # Number of blocks to wait for lottery to close
+HISTORY_SIZES = [1, 50, 500] # Tickets held by a single player before the measured round
+FLAT_GAS_TOLERANCE = 0.01 # Allowed relative drift of draw gas between history sizes
+ROUND_SIZES = [10, 100, 500] # Tickets entered in the measured round
+LONG_ROUND_BLOCKS = 100000 # Round length used while a large round is being filled
+DRAW_BASE_GAS_BUDGET = 250000 # Regression budget for the fixed part of a draw
+DRAW_GAS_PER_TICKET_BUDGET = 35000 # Regression budget for every ticket in the round
+BUCKET_ROUND_SIZE = 1000 # Tickets in the rounds comparing winner and ticket driven draw cost
+BUCKET_WINNERS = 100 # Tickets sharing the winning strong hash in the winner heavy round
+LOSING_TICKET_GAS_BUDGET = 1000 # A losing ticket is only read at draw as one of the 16 hold time phases packed in a slot
+SHARED_STRONG_HASH = "shared_winning_strong_hash"
+STRESS_ROUND_SIZE = 5000 # Tickets in the round drawn across several transactions
+STRESS_ENTRY_BATCH = 20 # Tickets bought and entered per transaction while filling the stress round
+STRESS_PLAYERS = 250 # Generated accounts holding the stress round, one entry batch each
+STRESS_WINNERS = 500 # Big prize winners of the stress round, several steps of bucket entries and credits
+STRESS_MINI_WINNERS = 20 # Mini prize winners of the stress round, drawn over all its participants
+DRAW_STEP_TICKETS = 50 # Units of work (bucket entries, participants, prize credits) of every step of the stress draw
+DRAW_STEP_GAS_CAP = int(os.environ.get("DRAW_STEP_GAS_CAP", 6721975)) # Gas no single draw step may exceed
+MINI_ROUND_SIZES = [100, 1000] # Tickets in the rounds measuring the cost of extra mini prize winners
+MINI_WINNERS = 10 # Mini prize winners drawn in the multi winner rounds
+MINI_WINNER_GAS_BUDGET = 150000 # An extra mini prize winner costs a pass over the participants, not over the tickets
+PACKING_BATCH = 10 # Extra tickets bought and entered to measure the per-ticket storage cost
+PURCHASE_GAS_PER_TICKET_BUDGET = 55000 # Two fresh slots per ticket: the packed ticket and its id lookup
+GAS_COMPARISON_REPORT = os.path.join("reports", "ticket_system_gas.md") # Per-function gas of both deployments
+HOT_PATH_FUNCTIONS = ["purchaseTicket", "purchaseTickets", "selectTicketsForLottery", "selectTicketsForLotteryBatch", "drawLotteryWinner"]
+
+
+def finish_round(main_ticket_system, owner):
+    """Close (if still open) and draw the current round with a non matching hash"""
+    chain.mine(BLOCKS_TO_WAIT_fOR_CLOSE)
+    if main_ticket_system.isLotteryActive():
+        main_ticket_system.closeLotteryRound({'from': owner})
+    chain.mine(1)
+    return main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="no_match_hash"),
+        web3.keccak(text="no_match_strong_hash"),
+        [1,2,3,4,5,6], 7,
+        {'from': owner}
+    )
+
+
+def draw_gas_with_history(ticket_system_contract, history):
+    """Deploy a fresh system, give one player `history` tickets and measure the draw of a round holding the newest one"""
+    owner = accounts[0]
+    player = accounts[1]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    ticket_price = main_ticket_system.getTicketPrice()
+
+    # Old tickets stay ACTIVE in the player's history, ahead of the ticket that enters the measured round
+    for _ in range(history - 1):
+        main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price})
+    finish_round(main_ticket_system, owner)
+
+    tx = main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price})
+    main_ticket_system.selectTicketsForLottery(
+        tx.return_value,
+        web3.keccak(text="history_hash"),
+        web3.keccak(text="history_strong_hash"),
+        {'from': player}
+    )
+    assert len(main_ticket_system.getPlayerTickets(player)) == history
+
+    tx = finish_round(main_ticket_system, owner)
+    return tx.gas_used
+
+
+def test_draw_gas_flat_with_player_history(ticket_system_contract):
+    """drawLotteryWinner gas must not depend on how many tickets the player owns"""
+    gas_by_history = {history: draw_gas_with_history(ticket_system_contract, history) for history in HISTORY_SIZES}
+    print(f"drawLotteryWinner gas by ticket history: {gas_by_history}")
+
+    baseline = gas_by_history[HISTORY_SIZES[0]]
+    for history, gas_used in gas_by_history.items():
+        assert abs(gas_used - baseline) <= baseline * FLAT_GAS_TOLERANCE, \
+            f"Draw gas grew with a history of {history} tickets: {gas_used} vs {baseline}"
+
+
+def fill_round(main_ticket_system, owner, ticket_count, winners=0, batch_size=1, players=None):
+    """Enter `ticket_count` tickets spread over `players` (accounts 1 to 9 by default) into a freshly
+    opened round, the first `winners` of them sharing SHARED_STRONG_HASH. Tickets are bought and
+    entered `batch_size` at a time"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    players = players or accounts[1:10]
+    main_ticket_system.setBlocksWait(LONG_ROUND_BLOCKS, 1, {'from': owner})
+
+    for batch, first in enumerate(range(0, ticket_count, batch_size)):
+        player = players[batch % len(players)]
+        indexes = range(first, min(first + batch_size, ticket_count))
+        ticket_hashes = [web3.keccak(text=f"round_hash_{i}") for i in indexes]
+        ticket_hashes_with_strong = [
+            web3.keccak(text=SHARED_STRONG_HASH if i < winners else f"round_strong_hash_{i}") for i in indexes
+        ]
+        if batch_size == 1:
+            tx = main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price})
+            main_ticket_system.selectTicketsForLottery(
+                tx.return_value, ticket_hashes[0], ticket_hashes_with_strong[0], {'from': player})
+        else:
+            tx = main_ticket_system.purchaseTickets(len(indexes), {'from': player, 'value': ticket_price * len(indexes)})
+            main_ticket_system.selectTicketsForLotteryBatch(
+                tx.return_value, ticket_hashes, ticket_hashes_with_strong, {'from': player})
+
+    # Shrink the round back so it can be closed right away
+    main_ticket_system.setBlocksWait(1, 1, {'from': owner})
+    chain.mine(1)
+    main_ticket_system.closeLotteryRound({'from': owner})
+    chain.mine(1)
+
+
+def test_draw_gas_regression_budget(ticket_system_contract):
+    """drawLotteryWinner gas must grow at most linearly with the tickets of the round"""
+    owner = accounts[0]
+    draw_gas_limit = web3.eth.get_block('latest').gasLimit
+    gas_by_round_size = {}
+
+    for ticket_count in ROUND_SIZES:
+        main_ticket_system = ticket_system_contract.deploy({'from': owner})
+        fill_round(main_ticket_system, owner, ticket_count)
+
+        # Ticket 0 wins the big prize and ticket 1 the small one, every other ticket is mini prize material
+        tx = main_ticket_system.drawLotteryWinner(
+            web3.keccak(text="round_hash_1"),
+            web3.keccak(text="round_strong_hash_0"),
+            [1,2,3,4,5,6], 7,
+            {'from': owner, 'gas_limit': draw_gas_limit}
+        )
+        gas_by_round_size[ticket_count] = tx.gas_used
+
+        round_info = main_ticket_system.getLotteryRoundInfo(1)
+        assert round_info[8] == ticket_count, f"Round should hold {ticket_count} tickets"
+        assert len(round_info[2][1]) == 1 and len(round_info[2][2]) == 1, "Should have one small and one big winner"
+        assert len(round_info[2][3]) == 1, "Should have 1 mini prize winner"
+
+    print(f"drawLotteryWinner gas by round size: {gas_by_round_size}")
+    for ticket_count, gas_used in gas_by_round_size.items():
+        budget = DRAW_BASE_GAS_BUDGET + ticket_count * DRAW_GAS_PER_TICKET_BUDGET
+        assert gas_used <= budget, f"Draw of {ticket_count} tickets used {gas_used} gas, budget is {budget}"
+
+
+def bucket_draw_gas(ticket_system_contract, ticket_count, winners):
+    """Gas of a draw where `winners` tickets win the big prize and every other ticket loses"""
+    owner = accounts[0]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    fill_round(main_ticket_system, owner, ticket_count, winners)
+
+    tx = main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="no_match_hash"),
+        web3.keccak(text=SHARED_STRONG_HASH),
+        [1,2,3,4,5,6], 7,
+        {'from': owner, 'gas_limit': web3.eth.get_block('latest').gasLimit}
+    )
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert len(round_info[2][2]) == winners, f"Should have {winners} big prize winners"
+    assert len(main_ticket_system.getActiveTickets({'from': accounts[1]})) == 0
+    return tx.gas_used
+
+
+def test_draw_gas_driven_by_winners_not_tickets(ticket_system_contract):
+    """Winners are looked up from the hash buckets and hold times come from per-participant hour
+    sums and packed phases, so a losing ticket adds next to nothing to the draw"""
+    small_round = bucket_draw_gas(ticket_system_contract, BUCKET_ROUND_SIZE // 10, 1)
+    large_round = bucket_draw_gas(ticket_system_contract, BUCKET_ROUND_SIZE, 1)
+    winner_heavy_round = bucket_draw_gas(ticket_system_contract, BUCKET_ROUND_SIZE, BUCKET_WINNERS)
+    print(f"Draw gas: {BUCKET_ROUND_SIZE // 10} tickets/1 winner={small_round}, "
+          f"{BUCKET_ROUND_SIZE} tickets/1 winner={large_round}, "
+          f"{BUCKET_ROUND_SIZE} tickets/{BUCKET_WINNERS} winners={winner_heavy_round}")
+
+    gas_per_losing_ticket = (large_round - small_round) / (BUCKET_ROUND_SIZE - BUCKET_ROUND_SIZE // 10)
+    gas_per_winner = (winner_heavy_round - large_round) / (BUCKET_WINNERS - 1)
+
+    assert gas_per_losing_ticket <= LOSING_TICKET_GAS_BUDGET, \
+        f"A losing ticket costs {gas_per_losing_ticket} gas at draw, budget is {LOSING_TICKET_GAS_BUDGET}"
+    assert gas_per_winner > 2 * gas_per_losing_ticket, \
+        f"Winners ({gas_per_winner} gas each) should dominate losing tickets ({gas_per_losing_ticket} gas each)"
+
+
+def generated_players(count, funding):
+    """`count` fresh accounts, each sent `funding` wei by accounts[0]"""
+    players = [accounts.add() for _ in range(count)]
+    for player in players:
+        accounts[0].transfer(player, funding)
+    return players
+
+
+def test_draw_large_round_in_bounded_steps(ticket_system_contract):
+    """A winner heavy round of a few hundred participants, too large for one transaction, is drawn
+    in steps that each stay under DRAW_STEP_GAS_CAP, the mini prize weighing and draws included"""
+    owner = accounts[0]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    main_ticket_system.setMiniPrizeWinners(STRESS_MINI_WINNERS, {'from': owner})
+    ticket_price = main_ticket_system.getTicketPrice()
+    players = generated_players(STRESS_PLAYERS, ticket_price * (STRESS_ROUND_SIZE // STRESS_PLAYERS + 1))
+    fill_round(main_ticket_system, owner, STRESS_ROUND_SIZE, STRESS_WINNERS, STRESS_ENTRY_BATCH, players)
+
+    step_gas = []
+    finalized = False
+    while not finalized:
+        tx = main_ticket_system.drawLotteryWinnerStep(
+            web3.keccak(text="no_match_hash"),
+            web3.keccak(text=SHARED_STRONG_HASH),
+            [1,2,3,4,5,6], 7,
+            DRAW_STEP_TICKETS,
+            {'from': owner, 'gas_limit': DRAW_STEP_GAS_CAP}
+        )
+        assert tx.gas_used <= DRAW_STEP_GAS_CAP, f"Step {len(step_gas) + 1} used {tx.gas_used} gas"
+        step_gas.append(tx.gas_used)
+        finalized = tx.return_value
+        if not finalized:
+            assert main_ticket_system.getLotteryRoundInfo(1)[3] == 1, "Round should stay closed until the last step"
+    print(f"Drew {STRESS_ROUND_SIZE} tickets of {STRESS_PLAYERS} players with {STRESS_WINNERS} winners "
+          f"in {len(step_gas)} steps, max step gas {max(step_gas)}, total {sum(step_gas)}")
+
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert round_info[3] == 2, "Round should be finalized"
+    assert round_info[8] == STRESS_ROUND_SIZE
+    assert len(round_info[2][0]) == STRESS_PLAYERS, f"Should have {STRESS_PLAYERS} participants"
+    assert len(round_info[2][2]) == STRESS_WINNERS, f"Should have {STRESS_WINNERS} big prize winners"
+    assert len(round_info[2][3]) == STRESS_MINI_WINNERS, f"Should have {STRESS_MINI_WINNERS} mini prize winners"
+    assert main_ticket_system.isLotteryActive(), "The next round should be open"
+
+
+def mini_prize_draw_gas(ticket_system_contract, ticket_count, winners):
+    """Gas of a draw with no big or small winner and `winners` mini prize winners"""
+    owner = accounts[0]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    main_ticket_system.setMiniPrizeWinners(winners, {'from': owner})
+    fill_round(main_ticket_system, owner, ticket_count, batch_size=STRESS_ENTRY_BATCH)
+
+    tx = main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="no_match_hash"),
+        web3.keccak(text="no_match_strong_hash"),
+        [1,2,3,4,5,6], 7,
+        {'from': owner, 'gas_limit': web3.eth.get_block('latest').gasLimit}
+    )
+    assert len(main_ticket_system.getLotteryRoundInfo(1)[2][3]) == winners, f"Should have {winners} mini prize winners"
+    return tx.gas_used
+
+
+def test_mini_prize_winners_cost_independent_of_round_size(ticket_system_contract):
+    """Every extra mini prize draw descends the participants' tree, so with the same players its
+    cost barely moves with the tickets of the round"""
+    gas_per_winner = {}
+    for ticket_count in MINI_ROUND_SIZES:
+        single_winner = mini_prize_draw_gas(ticket_system_contract, ticket_count, 1)
+        many_winners = mini_prize_draw_gas(ticket_system_contract, ticket_count, MINI_WINNERS)
+        gas_per_winner[ticket_count] = (many_winners - single_winner) / (MINI_WINNERS - 1)
+    print(f"Gas per extra mini prize winner by round size: {gas_per_winner}")
+
+    for ticket_count, gas_used in gas_per_winner.items():
+        assert gas_used <= MINI_WINNER_GAS_BUDGET, \
+            f"A mini prize winner costs {gas_used} gas in a round of {ticket_count} tickets, budget is {MINI_WINNER_GAS_BUDGET}"
+    small_round, large_round = MINI_ROUND_SIZES
+    assert gas_per_winner[large_round] < 1.5 * gas_per_winner[small_round], \
+        "Mini prize winner cost should not grow with the tickets of the round"
+
+
+def marginal_ticket_gas(main_ticket_system, player, tag):
+    """Per-ticket purchase and selection gas, from batches of one and 1 + PACKING_BATCH tickets"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    purchase_gas = []
+    select_gas = []
+    for count in [1, 1 + PACKING_BATCH]:
+        tx = main_ticket_system.purchaseTickets(count, {'from': player, 'value': ticket_price * count})
+        purchase_gas.append(tx.gas_used)
+        tx = main_ticket_system.selectTicketsForLotteryBatch(
+            tx.return_value,
+            [web3.keccak(text=f"{tag}_hash_{count}_{i}") for i in range(count)],
+            [web3.keccak(text=f"{tag}_strong_hash_{count}_{i}") for i in range(count)],
+            {'from': player}
+        )
+        select_gas.append(tx.gas_used)
+    return (purchase_gas[1] - purchase_gas[0]) / PACKING_BATCH, (select_gas[1] - select_gas[0]) / PACKING_BATCH
+
+
+def test_packed_ticket_storage_gas(ticket_system_contract):
+    """A ticket is stored in one packed slot plus its hashes, so buying one writes two fresh slots"""
+    owner = accounts[0]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    main_ticket_system.setBlocksWait(LONG_ROUND_BLOCKS, 1, {'from': owner})
+
+    # First tickets of the player, then more once its ticket list and the round are warm
+    first_purchase, first_select = marginal_ticket_gas(main_ticket_system, accounts[1], "first")
+    next_purchase, next_select = marginal_ticket_gas(main_ticket_system, accounts[1], "next")
+    print(f"Per-ticket gas: purchase {first_purchase} then {next_purchase}, selection {first_select} then {next_select}")
+
+    assert first_purchase <= PURCHASE_GAS_PER_TICKET_BUDGET
+    assert next_purchase <= PURCHASE_GAS_PER_TICKET_BUDGET
+
+    ticket = main_ticket_system.getPlayerTickets(accounts[1])[-1]
+    assert ticket[1] == accounts[1].address, "Owner is restored from the player's ticket list"
+    assert ticket[3] == 1 and ticket[4] == 1, "Status and round are unpacked from the shared slot"
+    assert ticket[5] == web3.keccak(text=f"next_hash_{1 + PACKING_BATCH}_{PACKING_BATCH}")
+
+
+def ticket_system_function_gas(ticket_system_contract):
+    """Gas of the state changing functions along one round in which the first ticket wins the big prize"""
+    owner = accounts[0]
+    player = accounts[1]
+    main_ticket_system = ticket_system_contract.deploy({'from': owner})
+    gas = {"deploy": main_ticket_system.tx.gas_used}
+    ticket_price = main_ticket_system.getTicketPrice()
+    main_ticket_system.setBlocksWait(LONG_ROUND_BLOCKS, 1, {'from': owner})
+
+    tx = main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price})
+    gas["purchaseTicket"] = tx.gas_used
+    ticket_id = tx.return_value
+    tx = main_ticket_system.purchaseTickets(PACKING_BATCH, {'from': player, 'value': ticket_price * PACKING_BATCH})
+    gas["purchaseTickets"] = tx.gas_used
+    batch_ids = tx.return_value
+
+    tx = main_ticket_system.selectTicketsForLottery(
+        ticket_id, web3.keccak(text="compare_hash"), web3.keccak(text="compare_strong_hash"), {'from': player})
+    gas["selectTicketsForLottery"] = tx.gas_used
+    tx = main_ticket_system.selectTicketsForLotteryBatch(
+        batch_ids,
+        [web3.keccak(text=f"compare_hash_{i}") for i in batch_ids],
+        [web3.keccak(text=f"compare_strong_hash_{i}") for i in batch_ids],
+        {'from': player}
+    )
+    gas["selectTicketsForLotteryBatch"] = tx.gas_used
+
+    tx = main_ticket_system.setBlocksWait(1, 1, {'from': owner})
+    gas["setBlocksWait"] = tx.gas_used
+    chain.mine(1)
+    tx = main_ticket_system.closeLotteryRound({'from': owner})
+    gas["closeLotteryRound"] = tx.gas_used
+    chain.mine(1)
+
+    tx = main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="compare_hash"),
+        web3.keccak(text="compare_strong_hash"),
+        [1,2,3,4,5,6], 7,
+        {'from': owner}
+    )
+    gas["drawLotteryWinner"] = tx.gas_used
+    tx = main_ticket_system.claimPrize(player, {'from': player})
+    gas["claimPrize"] = tx.gas_used
+    return gas
+
+
+def test_unified_ticket_system_gas_comparison():
+    """UnifiedTicketSystem keeps the MainTicketSystem ABI with the ticket and lottery operations as internal calls,
+    so the hot paths must get cheaper. The per-function table is printed and written to GAS_COMPARISON_REPORT"""
+    gas = {contract._name: ticket_system_function_gas(contract) for contract in [MainTicketSystem, UnifiedTicketSystem]}
+
+    rows = ["| Function | MainTicketSystem | UnifiedTicketSystem | Saved |", "| --- | ---: | ---: | ---: |"]
+    for function, main_gas in gas["MainTicketSystem"].items():
+        unified_gas = gas["UnifiedTicketSystem"][function]
+        rows.append(f"| {function} | {main_gas} | {unified_gas} | {1 - unified_gas / main_gas:.1%} |")
+    table = "\n".join(rows)
+    print(f"Per-function gas by deployment:\n{table}")
+    os.makedirs(os.path.dirname(GAS_COMPARISON_REPORT), exist_ok=True)
+    with open(GAS_COMPARISON_REPORT, "w") as report:
+        report.write(table + "\n")
+
+    for function in HOT_PATH_FUNCTIONS:
+        assert gas["UnifiedTicketSystem"][function] < gas["MainTicketSystem"][function], \
+            f"{function} should be cheaper without cross-contract calls"
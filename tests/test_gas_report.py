@@ -0,0 +1,23 @@
+from scripts.gas_report import percentile, summarize_gas, find_gas_regressions
+
+
+def test_summarize_gas_statistics():
+    """The report holds count, min, median, nearest-rank p95 and max of every function"""
+    report = summarize_gas({"MainTicketSystem.purchaseTicket": list(range(1, 101)), "MainTicketSystem.claimPrize": [7]})
+    assert report["MainTicketSystem.purchaseTicket"] == {"count": 100, "min": 1, "median": 50.5, "p95": 95, "max": 100}
+    assert report["MainTicketSystem.claimPrize"] == {"count": 1, "min": 7, "median": 7, "p95": 7, "max": 7}
+    assert percentile([3, 1, 2], 0.0) == 1
+
+
+def test_gas_regression_against_baseline():
+    """Only functions whose median grows beyond the tolerance are reported, new functions are ignored"""
+    baseline = summarize_gas({"MainTicketSystem.purchaseTicket": [100000], "MainTicketSystem.claimPrize": [50000]})
+    report = summarize_gas({
+        "MainTicketSystem.purchaseTicket": [104000],
+        "MainTicketSystem.claimPrize": [56000],
+        "MainTicketSystem.purchaseTickets": [300000],
+    })
+    regressions = find_gas_regressions(report, baseline, 0.05)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("MainTicketSystem.claimPrize")
+    assert find_gas_regressions(report, baseline, 0.2) == []
@@ -0,0 +1,79 @@
+import pytest
+from brownie import accounts, web3
+from scripts.indexer import Indexer
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec, ticket_hashes
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def play_round(main_ticket_system, label, players, claim=False, draw_step_tickets=None):
+    return RoundDriver(main_ticket_system, accounts[0], max_batch=2).run(RoundSpec(
+        players=players,
+        winning_hash=ticket_hashes(label, players[0].account, 0)[0],
+        winning_strong_hash=ticket_hashes(label, players[0].account, 0)[1],
+        label=label,
+        claim=claim,
+        draw_step_tickets=draw_step_tickets,
+    ))
+
+
+def test_indexer_round_history(main_ticket_system, tmp_path):
+    """Rounds, participants, draws, purchases and claims served from the index match the chain,
+    winners credited over several draw steps included, and a restarted indexer resumes from its
+    checkpoint without storing logs twice"""
+    start_block = main_ticket_system.tx.block_number
+    path = str(tmp_path / "history.sqlite")
+    first = play_round(main_ticket_system, "index_1", [PlayerSpec(accounts[1], tickets=3), PlayerSpec(accounts[2])])
+    second = play_round(main_ticket_system, "index_2", [PlayerSpec(accounts[2], tickets=2), PlayerSpec(accounts[3])],
+                        draw_step_tickets=1)
+    assert len(second.draw_txs) > 1
+
+    indexer = Indexer(web3, main_ticket_system.address, main_ticket_system.abi, path, start_block, batch_blocks=5)
+    assert indexer.sync() > 0
+    assert indexer.checkpoint == web3.eth.block_number
+
+    for result in (first, second):
+        round_info = main_ticket_system.getLotteryRoundInfo(result.round_number)
+        summary = indexer.round_summary(result.round_number)
+        assert (summary["total_tickets"], summary["prize_pool"]) == (round_info[8], round_info[1])
+        assert summary["close_block"] is not None
+        participants = indexer.round_participants(result.round_number)
+        assert [player for player, _ in participants] == list(round_info[2][0])
+        assert dict(participants) == {player: len(ids) for player, ids in result.ticket_ids.items()}
+        draw = indexer.round_draw(result.round_number)
+        assert draw["small_prize_winners"] == list(round_info[2][1])
+        assert draw["big_prize_winners"] == result.big_prize_winners == list(round_info[2][2])
+        assert draw["mini_prize_winners"] == result.mini_prize_winners == list(round_info[2][3])
+        assert (draw["big_prize"], draw["small_prize"], draw["mini_prize"], draw["commission"]) == tuple(round_info[4:8])
+        assert draw["block"] == result.draw_txs[-1].block_number
+    assert indexer.round_draw(second.round_number + 1) is None
+    assert indexer.player_purchases(accounts[1].address) == [
+        (first.ticket_ids[accounts[1].address][0], 2, first.total_prize_pool // 4),
+        (first.ticket_ids[accounts[1].address][2], 1, first.total_prize_pool // 4),
+    ]
+    assert indexer.round_summary(1)["open_block"] is None
+    assert indexer.round_summary(2)["open_block"] == first.draw_txs[-1].block_number
+
+    tickets = indexer.player_tickets(accounts[2].address)
+    assert [(ticket["round"], ticket["ticket_id"]) for ticket in tickets] == (
+        [(first.round_number, ticket_id) for ticket_id in first.ticket_ids[accounts[2].address]]
+        + [(second.round_number, ticket_id) for ticket_id in second.ticket_ids[accounts[2].address]]
+    )
+    plan = " ".join(row[-1] for row in indexer.db.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM ticket_selections WHERE player = ?", (accounts[2].address,)))
+    assert "ticket_selections_by_player" in plan
+    indexer.close()
+
+    third = play_round(main_ticket_system, "index_3", [PlayerSpec(accounts[2])], claim=True)
+    restarted = Indexer(web3, main_ticket_system.address, main_ticket_system.abi, path, start_block, batch_blocks=5)
+    assert restarted.sync() > 0
+    assert restarted.sync() == 0, "Nothing new after the latest block"
+    assert [summary["round"] for summary in restarted.rounds()] == [1, 2, 3, 4]
+    assert len(restarted.player_tickets(accounts[2].address)) == len(tickets) + 1
+    assert restarted.round_participants(third.round_number) == [(accounts[2].address, 1)]
+    assert restarted.claimed_prizes(accounts[2].address) == third.claimed[accounts[2].address] > 0
+    restarted.close()
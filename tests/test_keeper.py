@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from brownie import accounts, chain, web3
+from web3.exceptions import Web3RPCError
+from scripts.keeper import Draw, Keeper, summarize
+from scripts.ticket_client import TicketSystemClient
+
+ROUND_FINALIZED = 2 # lotteryStatus.FINALIZED
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def connect(main_ticket_system, uri=None):
+    return TicketSystemClient.connect(uri or web3.provider.endpoint_uri, main_ticket_system.address, main_ticket_system.abi)
+
+
+def test_keeper_acts_in_first_eligible_block(main_ticket_system, owner_account):
+    """Driven block by block with chain.mine, the keeper closes and draws two rounds each in the
+    first block that allows it and pays the prize of the ticket matching its draw"""
+    main_ticket_system.setBlocksWait(4, 2, {'from': owner_account})
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_id = main_ticket_system.purchaseTicket({'from': accounts[1], 'value': ticket_price}).return_value
+    ticket_hash, strong_hash = web3.keccak(text="keeper_hash"), web3.keccak(text="keeper_strong_hash")
+    main_ticket_system.selectTicketsForLottery(ticket_id, ticket_hash, strong_hash, {'from': accounts[1]})
+    draw = Draw(ticket_hash, strong_hash, [1, 2, 3, 4, 5, 6], 7)
+
+    async def drive():
+        async with await connect(main_ticket_system) as client:
+            keeper = Keeper(client, accounts[9].address, draw_source=lambda: draw)
+            while len(keeper.actions) < 4:
+                chain.mine(1)
+                await keeper.on_block(web3.eth.block_number)
+            return keeper
+
+    keeper = asyncio.run(drive())
+    assert [(action.round_number, action.action) for action in keeper.actions] == [(1, "close"), (1, "draw"), (2, "close"), (2, "draw")]
+    assert all(action.blocks_late == 0 for action in keeper.actions), keeper.actions
+    assert keeper.errors == []
+    assert keeper.actions[2].eligible_block == keeper.actions[1].executed_block + 4 + 1
+    assert keeper.actions[3].eligible_block == keeper.actions[2].executed_block + 2 + 1
+
+    for round_number in (1, 2):
+        assert main_ticket_system.getLotteryRoundInfo(round_number)[3] == ROUND_FINALIZED
+    assert list(main_ticket_system.getLotteryRoundInfo(1)[2][2]) == [accounts[1].address]
+    assert main_ticket_system.getPendingPrize(accounts[1]) > 0
+
+    summary = summarize(keeper.actions)
+    assert summary["close"]["count"] == summary["draw"]["count"] == 2
+    assert summary["close"]["blocks_late"]["max"] == summary["draw"]["blocks_late"]["max"] == 0
+
+
+def test_keeper_follows_new_heads(main_ticket_system, owner_account):
+    """Subscribed to new blocks over WebSocket while blocks are mined in the background, the
+    keeper keeps the rounds going on its own"""
+    main_ticket_system.setBlocksWait(3, 1, {'from': owner_account})
+    first_round = main_ticket_system.getCurrentRound()
+
+    async def follow():
+        async with await connect(main_ticket_system, web3.provider.endpoint_uri.replace("http", "ws", 1)) as client:
+            keeper = Keeper(client, accounts[9].address)
+
+            async def mine():
+                while True:
+                    await asyncio.to_thread(chain.mine, 1)
+                    await asyncio.sleep(0.2)
+
+            miner = asyncio.create_task(mine())
+            try:
+                await asyncio.wait_for(keeper.run(rounds=2), 120)
+            finally:
+                miner.cancel()
+            return keeper
+
+    keeper = asyncio.run(follow())
+    assert main_ticket_system.getCurrentRound() == first_round + 2
+    assert [action.action for action in keeper.actions] == ["close", "draw"] * 2
+    assert all(action.blocks_late >= 0 for action in keeper.actions)
+
+
+def test_keeper_draws_in_steps(main_ticket_system, owner_account):
+    """With step_tickets set, the keeper draws a round of several winners in one-ticket steps, each
+    step sent with its own estimate so the steps that settle the prizes are not cut short"""
+    main_ticket_system.setBlocksWait(3, 1, {'from': owner_account})
+    round_number = main_ticket_system.getCurrentRound()
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_hash, strong_hash = web3.keccak(text="keeper_step_hash"), web3.keccak(text="keeper_step_strong_hash")
+    for player in accounts[1:4]:
+        ticket_id = main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price}).return_value
+        main_ticket_system.selectTicketsForLottery(ticket_id, ticket_hash, strong_hash, {'from': player})
+    draw = Draw(ticket_hash, strong_hash, [1, 2, 3, 4, 5, 6], 7)
+
+    async def drive():
+        async with await connect(main_ticket_system) as client:
+            keeper = Keeper(client, accounts[9].address, draw_source=lambda: draw, step_tickets=1)
+            while not any(action.action == "draw" for action in keeper.actions):
+                chain.mine(1)
+                await keeper.on_block(web3.eth.block_number)
+            return keeper
+
+    keeper = asyncio.run(drive())
+    assert keeper.errors == []
+    assert keeper.actions[-1].transactions > 3, "One step per winning bucket entry at least"
+    assert main_ticket_system.getLotteryRoundInfo(round_number)[3] == ROUND_FINALIZED
+    assert sorted(main_ticket_system.getLotteryRoundInfo(round_number)[2][2]) == sorted(a.address for a in accounts[1:4])
+
+
+def test_keeper_resumes_stepped_draw_with_its_draw(main_ticket_system, owner_account):
+    """A step lost partway through a stepped draw is retried in a later block with the Draw the
+    first step pinned, even though the draw source would hand out a different one"""
+    main_ticket_system.setBlocksWait(3, 1, {'from': owner_account})
+    round_number = main_ticket_system.getCurrentRound()
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_hash, strong_hash = web3.keccak(text="keeper_resume_hash"), web3.keccak(text="keeper_resume_strong_hash")
+    for player in accounts[1:4]:
+        ticket_id = main_ticket_system.purchaseTicket({'from': player, 'value': ticket_price}).return_value
+        main_ticket_system.selectTicketsForLottery(ticket_id, ticket_hash, strong_hash, {'from': player})
+    draws = [Draw(ticket_hash, strong_hash, [1, 2, 3, 4, 5, 6], 7)]
+
+    def draw_source():
+        # Every later call draws something else, a retry sending it would revert
+        draws.append(Draw(web3.keccak(text=f"keeper_other_hash_{len(draws)}"), strong_hash, [1, 2, 3, 4, 5, 6], 7))
+        return draws[-2]
+
+    async def drive():
+        async with await connect(main_ticket_system) as client:
+            keeper = Keeper(client, accounts[9].address, draw_source=draw_source, step_tickets=1)
+            transact_and_wait = client.transact_and_wait
+            steps = []
+
+            async def lose_second_step(function, *args, **kwargs):
+                if function == "drawLotteryWinnerStep":
+                    steps.append(args)
+                    if len(steps) == 2:
+                        raise Web3RPCError("Connection lost while sending the step")
+                return await transact_and_wait(function, *args, **kwargs)
+
+            client.transact_and_wait = lose_second_step
+            for _ in range(20):
+                if any(action.action == "draw" for action in keeper.actions):
+                    break
+                chain.mine(1)
+                await keeper.on_block(web3.eth.block_number)
+            return keeper, steps
+
+    keeper, steps = asyncio.run(drive())
+    assert len(keeper.errors) == 1 and "Connection lost" in keeper.errors[0], keeper.errors
+    assert len(draws) == 2, "The draw source is asked once for the round"
+    assert all(args[:4] == steps[0][:4] for args in steps), "Every step sends the pinned draw"
+    assert keeper.draws == {}, "The Draw is dropped once the round is drawn"
+    assert main_ticket_system.getLotteryRoundInfo(round_number)[3] == ROUND_FINALIZED
+    assert sorted(main_ticket_system.getLotteryRoundInfo(round_number)[2][2]) == sorted(a.address for a in accounts[1:4])
@@ -0,0 +1,27 @@
+from scripts.load_test import measure_round, gas_limit_crossing, scaling_curve, LOAD_FIELDS
+
+
+def test_draw_gas_scaling_curve():
+    """The linear fit of the draw gas predicts where it crosses the block gas limit"""
+    rows = [
+        {"tickets": 100, "draw_gas": 1_100_000},
+        {"tickets": 1000, "draw_gas": 10_100_000},
+        {"tickets": 10000, "draw_gas": None},
+    ]
+    assert gas_limit_crossing([(100, 1_100_000), (1000, 10_100_000)], 30_000_000) == 2991
+    assert gas_limit_crossing([(100, 1_100_000)], 30_000_000) is None
+
+    curve = scaling_curve(rows, 30_000_000, points=5)
+    assert [point["tickets"] for point in curve][0] == 100 and curve[-1]["tickets"] == 10000
+    assert curve[0]["predicted_draw_gas"] == 1_100_000 and curve[0]["measured_draw_gas"] == 1_100_000
+    assert any(point["predicted_draw_gas"] > point["block_gas_limit"] for point in curve)
+
+
+def test_load_round_row(module_isolation, ticket_system_contract):
+    """A small load round fills every LOAD_FIELDS column and its draw fits in a block"""
+    row = measure_round(ticket_system_contract, 120, max_accounts=6)
+    assert set(row) == set(LOAD_FIELDS)
+    assert row["accounts"] == 6 and row["purchase_txs"] == 6 and row["entry_txs"] == 6
+    assert row["purchases_per_sec"] > 0 and row["entries_per_sec"] > 0
+    assert not row["draw_exceeds_block"] and row["draw_gas"] > row["draw_gas_per_ticket"] > 0
+    assert row["entry_gas_per_ticket"] < row["entry_gas_per_tx"]
@@ -1,5 +1,5 @@
 import pytest
-from brownie import MainTicketSystem, accounts, web3, reverts, chain, Wei, exceptions, compile_source
+from brownie import LotteryManager, accounts, web3, reverts, chain, Wei, exceptions, compile_source
 from brownie.network import gas_price
 from eth_account import Account
 import hashlib
@@ -7,11 +7,12 @@ import hashlib
 
 BLOCKS_TO_WAIT_fOR_CLOSE = 4; # Number of blocks to wait for lottery to close
 
-@pytest.fixture
-def main_ticket_system():
-    """Fixture to deploy the MainTicketSystem contract before each test"""
-    print("Deploying MainTicketSystem contract...")
-    return MainTicketSystem.deploy({'from': accounts[0]})
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module,
+    every test starts from the deployment snapshot taken by fn_isolation"""
+    print(f"Deploying {ticket_system_contract._name} contract...")
+    return ticket_system_contract.deploy({'from': accounts[0]})
 
 def test_contract_deployment(main_ticket_system, owner_account):
     """Test contract deployment and basic functionality"""
@@ -1155,4 +1156,230 @@ def test_no_win(main_ticket_system, owner_account):
     assert len(small_prize_winners) == 0 and  len(big_prize_winners) == 0, "Should have no winners"
     assert status == 2, "Lottery status should be finished"
     assert len(mini_prize_winners) == 1, "Should have 1 mini prize winner"
-    assert accounts[1] in mini_prize_winners or accounts[2] in mini_prize_winners, "Account 1 or Account 2 should be a mini prize winner"
\ No newline at end of file
+    assert accounts[1] in mini_prize_winners or accounts[2] in mini_prize_winners, "Account 1 or Account 2 should be a mini prize winner"
+
+
+def test_purchase_tickets_batch(main_ticket_system):
+    """Test buying several tickets in one transaction with excess funds refunded"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    account1_balance_before = accounts[1].balance()
+
+    tx = main_ticket_system.purchaseTickets(5, {'from': accounts[1], 'value': ticket_price * 6, 'gas_price': 'auto'})
+    gas_used = tx.gas_used * tx.gas_price
+    ticket_ids = tx.return_value
+
+    assert len(ticket_ids) == 5, "Should return 5 ticket IDs"
+    assert list(ticket_ids) == list(range(ticket_ids[0], ticket_ids[0] + 5)), "Ticket IDs should be consecutive"
+    assert len(main_ticket_system.getPlayerTickets(accounts[1])) == 5, "Player should have 5 tickets"
+    assert len(main_ticket_system.getActiveTickets({'from': accounts[1]})) == 5, "All tickets should be active"
+    assert main_ticket_system.getContractBlance() == 5 * ticket_price, "Contract balance should hold the price of 5 tickets"
+    assert account1_balance_before - 5 * ticket_price - gas_used == accounts[1].balance(), "Excess payment should be refunded"
+
+
+def test_purchase_tickets_batch_insufficient_funds(main_ticket_system):
+    """Test batch purchase fails when paying for fewer tickets than requested"""
+    ticket_price = main_ticket_system.getTicketPrice()
+
+    with reverts("Insufficient payment for tickets"):
+        main_ticket_system.purchaseTickets(3, {'from': accounts[1], 'value': ticket_price * 2, 'gas_price': 'auto'})
+    with reverts("Must purchase at least one ticket"):
+        main_ticket_system.purchaseTickets(0, {'from': accounts[1], 'value': ticket_price, 'gas_price': 'auto'})
+    assert main_ticket_system.getPlayerTickets(accounts[1]) == []
+    assert main_ticket_system.getContractBlance() == 0
+
+
+def test_select_tickets_for_lottery_batch(main_ticket_system):
+    """Test entering several tickets in one transaction"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_ids = main_ticket_system.purchaseTickets(3, {'from': accounts[1], 'value': ticket_price * 3, 'gas_price': 'auto'}).return_value
+
+    ticket_hashes = [web3.keccak(text=f"batch_hash_{i}") for i in range(3)]
+    ticket_hashes_with_strong = [web3.keccak(text=f"batch_strong_hash_{i}") for i in range(3)]
+    tx = main_ticket_system.selectTicketsForLotteryBatch(ticket_ids, ticket_hashes, ticket_hashes_with_strong, {'from': accounts[1], 'gas_price': 'auto'})
+
+    assert tx.return_value == True, "Batch selection should be successful"
+    assert 'TicketsSelected' in tx.events
+    assert list(tx.events['TicketsSelected']['ticketIds']) == list(ticket_ids)
+    assert len(tx.events['BlockStatusUpdated']) == 1, "Block status should be emitted once per batch"
+    assert len(main_ticket_system.getActiveTickets({'from': accounts[1]})) == 0, "No active tickets should remain"
+    assert main_ticket_system.getCurrentPrizePool() == 3 * ticket_price
+    assert main_ticket_system.getCurrentTotalTickets() == 3
+
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert list(round_info[2][0]) == [accounts[1].address], "Player should be listed once as participant"
+
+    with reverts("Ticket must be active to enter lottery"):
+        main_ticket_system.selectTicketsForLotteryBatch(ticket_ids[:1], ticket_hashes[:1], ticket_hashes_with_strong[:1], {'from': accounts[1], 'gas_price': 'auto'})
+
+
+def test_select_tickets_for_lottery_batch_invalid_input(main_ticket_system):
+    """Test batch selection input validation"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_ids = main_ticket_system.purchaseTickets(2, {'from': accounts[1], 'value': ticket_price * 2, 'gas_price': 'auto'}).return_value
+    ticket_hash = web3.keccak(text="batch_hash")
+    ticket_hash_with_strong = web3.keccak(text="batch_strong_hash")
+
+    with reverts("Ticket data length mismatch"):
+        main_ticket_system.selectTicketsForLotteryBatch(ticket_ids, [ticket_hash], [ticket_hash_with_strong, ticket_hash_with_strong], {'from': accounts[1]})
+    with reverts("Ticket hash cannot be empty"):
+        main_ticket_system.selectTicketsForLotteryBatch(ticket_ids, [ticket_hash, bytes(32)], [ticket_hash_with_strong, ticket_hash_with_strong], {'from': accounts[1]})
+    with reverts("Failed to set ticket status"):  # accounts[2] does not own these tickets
+        main_ticket_system.selectTicketsForLotteryBatch(ticket_ids, [ticket_hash, ticket_hash], [ticket_hash_with_strong, ticket_hash_with_strong], {'from': accounts[2]})
+    assert len(main_ticket_system.getActiveTickets({'from': accounts[1]})) == 2
+
+
+def test_batch_gas_per_ticket(main_ticket_system, owner_account):
+    """Compare per-ticket gas of the batch purchase and entry paths against the single ticket ones"""
+    batch_size = 20
+    ticket_price = main_ticket_system.getTicketPrice()
+    main_ticket_system.setBlocksWait(10 * batch_size, 1, {'from': owner_account})  # Keep the round open for all single entries
+
+    single_purchase_gas = 0
+    single_select_gas = 0
+    for i in range(batch_size):
+        tx = main_ticket_system.purchaseTicket({'from': accounts[1], 'value': ticket_price})
+        single_purchase_gas += tx.gas_used
+        tx = main_ticket_system.selectTicketsForLottery(
+            tx.return_value, web3.keccak(text=f"single_hash_{i}"), web3.keccak(text=f"single_strong_hash_{i}"), {'from': accounts[1]})
+        single_select_gas += tx.gas_used
+
+    tx = main_ticket_system.purchaseTickets(batch_size, {'from': accounts[2], 'value': ticket_price * batch_size})
+    batch_purchase_gas = tx.gas_used
+    tx = main_ticket_system.selectTicketsForLotteryBatch(
+        tx.return_value,
+        [web3.keccak(text=f"batch_hash_{i}") for i in range(batch_size)],
+        [web3.keccak(text=f"batch_strong_hash_{i}") for i in range(batch_size)],
+        {'from': accounts[2]}
+    )
+    batch_select_gas = tx.gas_used
+
+    print(f"Per-ticket purchase gas: single={single_purchase_gas / batch_size}, batch={batch_purchase_gas / batch_size}")
+    print(f"Per-ticket selection gas: single={single_select_gas / batch_size}, batch={batch_select_gas / batch_size}")
+    assert batch_purchase_gas < single_purchase_gas, "Batch purchase should cost less per ticket"
+    assert batch_select_gas < single_select_gas, "Batch selection should cost less per ticket"
+    assert main_ticket_system.getCurrentTotalTickets() == 2 * batch_size
+    assert main_ticket_system.getCurrentPrizePool() == 2 * batch_size * ticket_price
+
+
+def test_draw_lottery_winner_in_steps(main_ticket_system, owner_account):
+    """Test drawing a round across several bounded steps"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_ids = main_ticket_system.purchaseTickets(3, {'from': accounts[1], 'value': ticket_price * 3}).return_value
+    main_ticket_system.selectTicketsForLotteryBatch(
+        ticket_ids,
+        [web3.keccak(text=f"step_hash_{i}") for i in range(3)],
+        [web3.keccak(text=f"step_strong_hash_{i}") for i in range(3)],
+        {'from': accounts[1]}
+    )
+    tx = main_ticket_system.purchaseTicket({'from': accounts[2], 'value': ticket_price})
+    main_ticket_system.selectTicketsForLottery(
+        tx.return_value, web3.keccak(text="step_hash_0"), web3.keccak(text="step_strong_hash_3"), {'from': accounts[2]})
+
+    chain.mine(BLOCKS_TO_WAIT_fOR_CLOSE)
+    main_ticket_system.closeLotteryRound({'from': owner_account})
+    chain.mine(1)
+
+    # Ticket 1 of accounts[1] wins big, tickets 0 of both players share the small prize hash
+    draw_args = [web3.keccak(text="step_hash_0"), web3.keccak(text="step_strong_hash_1"), [1,2,3,4,5,6], 7]
+    with reverts("Draw step must process at least one ticket"):
+        main_ticket_system.drawLotteryWinnerStep(*draw_args, 0, {'from': owner_account})
+
+    steps = 0
+    finalized = False
+    credited = []
+    while not finalized:
+        tx = main_ticket_system.drawLotteryWinnerStep(*draw_args, 1, {'from': owner_account})
+        finalized = tx.return_value
+        steps += 1
+        if 'PrizesCredited' in tx.events:
+            event = tx.events['PrizesCredited']
+            batch = [list(event['smallPrizeWinners']), list(event['bigPrizeWinners']), list(event['miniPrizeWinners'])]
+            assert sum(len(winners) for winners in batch) == 1, "A one unit step credits one winner"
+            credited.append(batch)
+        if not finalized:
+            assert main_ticket_system.getLotteryRoundInfo(1)[3] == 1, "Round should stay closed between steps"
+            assert not main_ticket_system.isLotteryActive()
+            if steps == 1:
+                with reverts("Draw already started with other arguments"):
+                    main_ticket_system.drawLotteryWinnerStep(
+                        web3.keccak(text="other_hash"), draw_args[1], [1,2,3,4,5,6], 7, 1, {'from': owner_account})
+                with reverts("Draw already started with other arguments"):
+                    main_ticket_system.drawLotteryWinnerStep(*draw_args[:2], [1,2,3,4,5,7], 7, 1, {'from': owner_account})
+                with reverts("Draw already started with other arguments"):
+                    main_ticket_system.drawLotteryWinnerStep(*draw_args[:3], 6, 1, {'from': owner_account})
+
+    # One big winner, two small winners, two participants weighed and put in the mini prize tree,
+    # the mini prize draw and the credits of the two small, the big and the mini prize winners
+    assert steps == 1 + 2 + 2 + 2 + 1 + 4, f"Draw should take 12 single entry steps, took {steps}"
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert round_info[3] == 2, "Round should be finalized after the last step"
+    assert list(round_info[2][2]) == [accounts[1].address], "Account 1 should be the big prize winner"
+    assert sorted(round_info[2][1]) == sorted([accounts[1].address, accounts[2].address]), "Both players should win small prizes"
+    assert len(round_info[2][3]) == 1 and round_info[2][3][0] == accounts[1].address, "Only account 1 has a ticket left for the mini prize"
+    for prize in range(3):
+        assert [winner for batch in credited for winner in batch[prize]] == list(round_info[2][prize + 1]), \
+            "The credited batches add up to the winners of the round"
+    assert main_ticket_system.isLotteryActive(), "The next round should be open"
+    assert main_ticket_system.getCurrentRound() == 2
+
+
+def test_lottery_manager_draws_only_for_its_ticket_system(main_ticket_system, ticket_system_contract, owner_account):
+    """The draw entry points of the lottery manager behind MainTicketSystem refuse every other caller,
+    so nobody can pin the draw arguments of a closed round around the ticket system"""
+    if ticket_system_contract._name != "MainTicketSystem":
+        pytest.skip("Only MainTicketSystem draws through a separate lottery manager")
+    # The constructor creates the ticket manager first and the lottery manager second
+    lottery_manager = LotteryManager.at(main_ticket_system.tx.new_contracts[1])
+    chain.mine(BLOCKS_TO_WAIT_fOR_CLOSE)
+    main_ticket_system.closeLotteryRound({'from': owner_account})
+    chain.mine(1)
+
+    draw_args = [web3.keccak(text="manager_hash"), web3.keccak(text="manager_strong_hash"), [1,2,3,4,5,6], 7]
+    with reverts("Only the ticket system can draw the round"):
+        lottery_manager.drawLotteryWinnerStep(*draw_args, 1, {'from': owner_account})
+    with reverts("Only the ticket system can draw the round"):
+        lottery_manager.drawLotteryWinner(*draw_args, {'from': accounts[1]})
+    main_ticket_system.drawLotteryWinner(*draw_args, {'from': owner_account})
+    assert main_ticket_system.getCurrentRound() == 2, "The ticket system itself still draws the round"
+
+
+def test_purchase_draw_and_claim_events(main_ticket_system, owner_account):
+    """Purchases, draws and claims are logged with the data needed to rebuild them without view calls"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    tx = main_ticket_system.purchaseTicket({'from': accounts[1], 'value': ticket_price})
+    assert tx.events['TicketPurchased'] == {'player': accounts[1].address, 'firstTicketId': tx.return_value, 'count': 1, 'ticketPrice': ticket_price}
+    single_ticket = tx.return_value
+    tx = main_ticket_system.purchaseTickets(2, {'from': accounts[2], 'value': ticket_price * 2})
+    assert tx.events['TicketPurchased'] == {'player': accounts[2].address, 'firstTicketId': tx.return_value[0], 'count': 2, 'ticketPrice': ticket_price}
+    batch_tickets = tx.return_value
+
+    main_ticket_system.selectTicketsForLottery(
+        single_ticket, web3.keccak(text="event_hash_1"), web3.keccak(text="event_strong_hash_1"), {'from': accounts[1]})
+    main_ticket_system.selectTicketsForLotteryBatch(
+        batch_tickets,
+        [web3.keccak(text="event_hash_1"), web3.keccak(text="event_hash_2")],
+        [web3.keccak(text="event_strong_hash_2"), web3.keccak(text="event_strong_hash_3")],
+        {'from': accounts[2]}
+    )
+    chain.mine(BLOCKS_TO_WAIT_fOR_CLOSE)
+    main_ticket_system.closeLotteryRound({'from': owner_account})
+    chain.mine(1)
+
+    tx = main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="event_hash_1"), web3.keccak(text="event_strong_hash_3"), [3,8,15,21,30,37], 5, {'from': owner_account})
+    credited = tx.events['PrizesCredited']
+    drawn = tx.events['RoundDrawn']
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert credited['roundNumber'] == drawn['roundNumber'] == 1
+    assert list(credited['smallPrizeWinners']) == list(round_info[2][1]) == [accounts[1].address, accounts[2].address]
+    assert list(credited['bigPrizeWinners']) == list(round_info[2][2]) == [accounts[2].address]
+    assert list(credited['miniPrizeWinners']) == list(round_info[2][3])
+    assert (drawn['bigPrize'], drawn['smallPrize'], drawn['miniPrize'], drawn['commission']) == tuple(round_info[4:8])
+    assert list(drawn['randomNumbers']) == [3,8,15,21,30,37] and drawn['strongNumber'] == 5
+    assert tx.events['LotteryRoundStatusChanged']['isOpen'] == True
+
+    pending = main_ticket_system.getPendingPrize(accounts[2])
+    tx = main_ticket_system.claimPrize(accounts[2], {'from': owner_account})
+    assert tx.events['PrizeClaimed'] == {'winner': accounts[2].address, 'amount': pending}
+    with reverts("No prize to claim"):
+        main_ticket_system.claimPrize(accounts[2], {'from': owner_account})
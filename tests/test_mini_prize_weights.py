@@ -0,0 +1,233 @@
+import random
+import pytest
+from brownie import accounts, web3, chain
+from eth_utils import keccak
+from scripts.reference_model import (
+    HOUR, SCALE_FACTOR, SOFTMAX_SPAN, draw_seed, hold_time_weights, select_mini_prize_winners, softmax_weights,
+)
+
+
+RANDOM_ROUNDS = 200 # Randomized rounds compared between the weightings
+LABEL_SEARCH = 100 # Draw hash labels tried for one that tells the weightings apart
+NODE_ELIGIBLE = 1 << 64 # A tree node counts eligible participants above its top class ones
+
+
+def reference_weights(creation_timestamps, draw_time):
+    """Per-ticket hold time, as the draw computed it by reading every ticket"""
+    return [1 + sum((draw_time - created) // HOUR for created in tickets) for tickets in creation_timestamps]
+
+
+def model_weights(creation_timestamps, draw_time):
+    """hold_time_weights of participants given as the creation timestamps of their tickets"""
+    owners = [index for index, tickets in enumerate(creation_timestamps) for _ in tickets]
+    timestamps = [created for tickets in creation_timestamps for created in tickets]
+    return [int(weight) for weight in hold_time_weights(owners, timestamps, draw_time, len(creation_timestamps))]
+
+
+def phase_weights(creation_timestamps, draw_time):
+    """participantWeight: the sum of creation hours kept at entry, less a ticket for every phase
+    past the hour later than the draw's"""
+    return [
+        1 + len(tickets) * (draw_time // HOUR) - sum(created // HOUR for created in tickets)
+        - sum(created % HOUR > draw_time % HOUR for created in tickets)
+        for tickets in creation_timestamps
+    ]
+
+
+def aggregate_weights(creation_timestamps, draw_time):
+    """Hold time of all the tickets summed before flooring, from a ticket count and timestamp sum"""
+    return [1 + (len(tickets) * draw_time - sum(tickets)) // HOUR for tickets in creation_timestamps]
+
+
+def select_mini_prize_winner(weights, eligible, hash_numbers, hash_full, draw_time):
+    """Single mini prize draw among the `eligible` participant indexes"""
+    ticket_counts = [1 if i in eligible else 0 for i in range(len(weights))]
+    return select_mini_prize_winners(weights, ticket_counts, [0] * len(weights), hash_numbers, hash_full, draw_time, 1)[0]
+
+
+def tree_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, draw_time, draws):
+    """The contract's draws on its Fenwick tree. Node i (1-based) covers the i & -i participants up
+    to index i - 1 and counts the eligible ones in NODE_ELIGIBLE units plus the top softmax class
+    ones. A draw descends the tree for the first eligible position whose cumulative weight passes
+    its target, then for the participant at that position; a winner with no ticket left is removed"""
+    count = len(weights)
+    top = [max(weights) - weight <= SOFTMAX_SPAN for weight in weights]
+    wins = list(wins)
+    eligible_count = sum(tickets > won for tickets, won in zip(ticket_counts, wins))
+    tree = [0] * (count + 1)
+    for i in range(1, count + 1):
+        tree[i] += NODE_ELIGIBLE * (ticket_counts[i - 1] > wins[i - 1]) + top[i - 1]
+        if i + (i & -i) <= count:
+            tree[i + (i & -i)] += tree[i]
+    sum_exp = sum(top) * SCALE_FACTOR + count - sum(top)
+    high, low = SCALE_FACTOR * SCALE_FACTOR // sum_exp, SCALE_FACTOR // sum_exp
+    spans = [1 << bit for bit in reversed(range(count.bit_length()))]
+
+    selected = []
+    for draw in range(draws):
+        if eligible_count == 0:
+            break
+        extra = (draw,) if draw else ()
+        target = draw_seed(hash_numbers, hash_full, *extra) % SCALE_FACTOR
+        position, cumulative = 0, 0
+        for span in spans:
+            if position + span <= count:
+                weight = span * low + tree[position + span] % NODE_ELIGIBLE * (high - low)
+                if cumulative + weight <= target:
+                    position, cumulative = position + span, cumulative + weight
+        if position >= eligible_count:
+            position = draw_seed(hash_numbers, hash_full, draw_time, *extra) % eligible_count
+        winner = 0
+        for span in spans:
+            if winner + span <= count and tree[winner + span] // NODE_ELIGIBLE <= position:
+                position -= tree[winner + span] // NODE_ELIGIBLE
+                winner += span
+        selected.append(winner)
+        wins[winner] += 1
+        if wins[winner] == ticket_counts[winner]:
+            eligible_count -= 1
+            i = winner + 1
+            while i <= count:
+                tree[i] -= NODE_ELIGIBLE
+                i += i & -i
+    return selected
+
+
+def random_round(rng, draw_time, max_tickets):
+    participants = rng.randint(1, 20)
+    rounds = [[draw_time - rng.randint(0, 72 * HOUR) for _ in range(rng.randint(1, max_tickets))] for _ in range(participants)]
+    eligible = sorted(rng.sample(range(participants), rng.randint(1, participants)))
+    return rounds, eligible
+
+
+def test_weights_floor_every_ticket():
+    """The model and the contract's split into creation hours and phases both give the hours of
+    every ticket floored on its own, for hold times off the hour and many tickets per participant"""
+    rng = random.Random(0)
+    for _ in range(RANDOM_ROUNDS):
+        draw_time = 1_700_000_000 + rng.randint(0, HOUR)
+        rounds, _ = random_round(rng, draw_time, 40)
+        assert model_weights(rounds, draw_time) == phase_weights(rounds, draw_time) == reference_weights(rounds, draw_time)
+
+
+def test_flooring_the_sum_changes_winners():
+    """Flooring the summed hold time instead overweights participants with several tickets by up
+    to a ticket count, enough to change the winners of some rounds"""
+    rng = random.Random(1)
+    changed = 0
+    for i in range(RANDOM_ROUNDS):
+        draw_time = 1_700_000_000 + rng.randint(0, HOUR)
+        rounds, eligible = random_round(rng, draw_time, 10)
+        for tickets, aggregate, weight in zip(rounds, aggregate_weights(rounds, draw_time), model_weights(rounds, draw_time)):
+            assert 0 <= aggregate - weight < len(tickets)
+        hash_numbers, hash_full = keccak(text=f"numbers_{i}"), keccak(text=f"full_{i}")
+        changed += select_mini_prize_winner(aggregate_weights(rounds, draw_time), eligible, hash_numbers, hash_full, draw_time) != \
+            select_mini_prize_winner(model_weights(rounds, draw_time), eligible, hash_numbers, hash_full, draw_time)
+    assert changed > 0
+
+
+def test_extra_draws_keep_first_winner():
+    """The first of several draws picks the single winner draw's participant, and a participant
+    wins at most once per ticket it has left"""
+    rng = random.Random(3)
+    draw_time = 1_700_000_000
+    for i in range(RANDOM_ROUNDS):
+        rounds, _ = random_round(rng, draw_time, 3)
+        ticket_counts = [len(tickets) for tickets in rounds]
+        wins = [rng.randint(0, count) for count in ticket_counts]
+        if sum(ticket_counts) == sum(wins):
+            continue
+        weights = model_weights(rounds, draw_time)
+        hash_numbers, hash_full = keccak(text=f"numbers_{i}"), keccak(text=f"full_{i}")
+
+        winners = select_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, draw_time, 5)
+        eligible = [n for n, count in enumerate(ticket_counts) if count > wins[n]]
+        assert winners[0] == select_mini_prize_winner(weights, eligible, hash_numbers, hash_full, draw_time)
+        assert len(winners) == min(5, sum(ticket_counts) - sum(wins))
+        for participant in set(winners):
+            assert winners.count(participant) <= ticket_counts[participant] - wins[participant]
+
+
+def test_tree_draws_match_the_scan():
+    """Descending the Fenwick tree picks the winners of the model's scan, whether a draw's target
+    falls within the eligible participants' weight or past it, as winners run out of tickets"""
+    rng = random.Random(4)
+    fallbacks = 0
+    for i in range(RANDOM_ROUNDS):
+        participants = rng.randint(1, 70)
+        weights = [rng.randint(1, 40) for _ in range(participants)]
+        ticket_counts = [rng.randint(1, 3) for _ in range(participants)]
+        wins = [rng.randint(0, count) for count in ticket_counts]
+        hash_numbers, hash_full = keccak(text=f"numbers_{i}"), keccak(text=f"full_{i}")
+        draws = rng.randint(1, 10)
+
+        winners = select_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, 1_700_000_000, draws)
+        assert tree_mini_prize_winners(weights, ticket_counts, wins, hash_numbers, hash_full, 1_700_000_000, draws) == winners
+        eligible_count = sum(count > won for count, won in zip(ticket_counts, wins))
+        fallbacks += sum(softmax_weights(weights)[:eligible_count]) <= draw_seed(hash_numbers, hash_full) % SCALE_FACTOR
+    assert 0 < fallbacks < RANDOM_ROUNDS, "Both the weighted descent and the fallback should be exercised"
+
+
+@pytest.mark.parametrize("step_tickets", [None, 1])
+def test_on_chain_mini_prize_matches_model(ticket_system_contract, owner_account, step_tickets):
+    """The mini prize winners drawn on chain, in one transaction or one phase slot, participant or
+    draw per step, are the ones the model picks from the ticket timestamps. The hold times are off the
+    hour so that flooring the summed hold time would lift the second player into the top softmax
+    class, and the draw hashes are picked so that this would change the winners"""
+    main_ticket_system = ticket_system_contract.deploy({'from': owner_account})
+    ticket_price = main_ticket_system.getTicketPrice()
+    main_ticket_system.setBlocksWait(100, 1, {'from': owner_account})
+    main_ticket_system.setMiniPrizeWinners(5, {'from': owner_account})
+    assert main_ticket_system.getMiniPrizeWinners() == 5
+
+    # Held about 45.5 hours, 17 tickets held 2h33m each (34 hours ticket by ticket, 43 summed,
+    # two phase slots) and a ticket bought right before the round closes: weights 46, 35 and 1
+    players = accounts[1:4]
+    tickets = {}
+    for player, count, hold in zip(players, [1, 17, 1], [43 * HOUR, 153 * 60 + 30, 0]):
+        tickets[player] = main_ticket_system.purchaseTickets(count, {'from': player, 'value': ticket_price * count}).return_value
+        chain.sleep(hold)
+    for player in players:
+        main_ticket_system.selectTicketsForLotteryBatch(
+            tickets[player],
+            [web3.keccak(text=f"model_hash_{ticket_id}") for ticket_id in tickets[player]],
+            [web3.keccak(text=f"model_strong_hash_{ticket_id}") for ticket_id in tickets[player]],
+            {'from': player}
+        )
+
+    main_ticket_system.setBlocksWait(1, 1, {'from': owner_account})
+    chain.mine(1)
+    main_ticket_system.closeLotteryRound({'from': owner_account})
+    chain.mine(1)
+
+    creation_timestamps = [[ticket[2] for ticket in main_ticket_system.getPlayerTickets(player)] for player in players]
+    ticket_counts = [len(timestamps) for timestamps in creation_timestamps]
+
+    def winners(weigh, hash_numbers, draw_time):
+        return select_mini_prize_winners(weigh(creation_timestamps, draw_time), ticket_counts, [0] * len(players),
+                                         hash_numbers, hash_full, draw_time, 5)
+
+    # No ticket matches, every prize but the mini prize goes to the commission
+    hash_full = bytes(web3.keccak(text="model_no_match_strong"))
+    expected_draw_time = chain.time()
+    hash_numbers = next(
+        hash_numbers for hash_numbers in (bytes(web3.keccak(text=f"model_no_match_{i}")) for i in range(LABEL_SEARCH))
+        if winners(model_weights, hash_numbers, expected_draw_time) != winners(aggregate_weights, hash_numbers, expected_draw_time)
+    )
+    draw_args = (hash_numbers, hash_full, [1,2,3,4,5,6], 7)
+    if step_tickets is None:
+        txs = [main_ticket_system.drawLotteryWinner(*draw_args, {'from': owner_account})]
+    else:
+        txs = [main_ticket_system.drawLotteryWinnerStep(*draw_args, step_tickets, {'from': owner_account})]
+        while not txs[-1].return_value:
+            txs.append(main_ticket_system.drawLotteryWinnerStep(*draw_args, step_tickets, {'from': owner_account}))
+        assert len(txs) > 2 * len(players), "The weights, the tree and the draws should take several steps"
+    draw_time = web3.eth.get_block(txs[0].block_number).timestamp
+
+    round_info = main_ticket_system.getLotteryRoundInfo(1)
+    assert list(round_info[2][0]) == [player.address for player in players]
+    assert model_weights(creation_timestamps, draw_time) == [46, 35, 1]
+    assert aggregate_weights(creation_timestamps, draw_time) == [46, 44, 1]
+    expected = [players[index].address for index in winners(model_weights, hash_numbers, draw_time)]
+    assert list(round_info[2][3]) == expected
+    assert expected != [players[index].address for index in winners(aggregate_weights, hash_numbers, draw_time)]
@@ -0,0 +1,81 @@
+import pytest
+from brownie import accounts, web3, chain, reverts
+
+HISTORY_TICKETS = 2_000 # Tickets in the history paged through
+PURCHASE_BATCH = 100 # Tickets bought per transaction while building the history
+PAGE_SIZE = 100
+PAGE_GAS_BUDGET = 2_000_000 # Gas of the eth_call serving one page
+PAGE_RESPONSE_BUDGET = 32 * 1024 # Bytes returned by the eth_call serving one page
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def call_cost(method, *args):
+    """Gas and response size in bytes of a view call"""
+    call = {'to': method._address, 'data': method.encode_input(*args)}
+    return web3.eth.estimate_gas(call), len(web3.eth.call(call))
+
+
+def test_player_tickets_in_pages(main_ticket_system):
+    """A 2,000 ticket history is read in pages that each stay within the gas and response size budgets"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    ticket_ids = []
+    for _ in range(HISTORY_TICKETS // PURCHASE_BATCH):
+        tx = main_ticket_system.purchaseTickets(PURCHASE_BATCH, {'from': accounts[1], 'value': ticket_price * PURCHASE_BATCH})
+        ticket_ids += list(tx.return_value)
+
+    paged = []
+    for offset in range(0, HISTORY_TICKETS, PAGE_SIZE):
+        tickets, total = main_ticket_system.getPlayerTicketsPage(accounts[1], offset, PAGE_SIZE)
+        assert total == HISTORY_TICKETS
+        gas, response_size = call_cost(main_ticket_system.getPlayerTicketsPage, accounts[1], offset, PAGE_SIZE)
+        assert gas < PAGE_GAS_BUDGET, f"Page at {offset} costs {gas} gas"
+        assert response_size < PAGE_RESPONSE_BUDGET, f"Page at {offset} returns {response_size} bytes"
+        paged += tickets
+
+    assert [ticket[0] for ticket in paged] == ticket_ids
+    assert all(ticket[1] == accounts[1].address and ticket[3] == 0 for ticket in paged)
+    assert main_ticket_system.getPlayerTicketsPage(accounts[1], HISTORY_TICKETS - 10, PAGE_SIZE)[0][-1][0] == ticket_ids[-1]
+    assert main_ticket_system.getPlayerTicketsPage(accounts[1], HISTORY_TICKETS, PAGE_SIZE) == ([], HISTORY_TICKETS)
+    assert main_ticket_system.getPlayerTicketsPage(accounts[2], 0, PAGE_SIZE) == ([], 0)
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [HISTORY_TICKETS, 0, 0, 0, 0, 0]
+
+
+def test_round_participants_in_pages(main_ticket_system, owner_account):
+    """Participants of a round come back page by page in entry order, and the ticket counts
+    per status follow the tickets through the draw"""
+    ticket_price = main_ticket_system.getTicketPrice()
+    main_ticket_system.setBlocksWait(100, 1, {'from': owner_account})
+    players = accounts[1:10]
+    for i, player in enumerate(players):
+        ticket_ids = main_ticket_system.purchaseTickets(2, {'from': player, 'value': ticket_price * 2}).return_value
+        main_ticket_system.selectTicketsForLotteryBatch(
+            ticket_ids[:1], [web3.keccak(text=f"page_hash_{i}")], [web3.keccak(text=f"page_strong_hash_{i}")], {'from': player})
+
+    participants = []
+    for offset in range(0, len(players), 4):
+        page, total = main_ticket_system.getRoundParticipants(1, offset, 4)
+        assert total == len(players) and len(page) == min(4, len(players) - offset)
+        participants += page
+    assert participants == [player.address for player in players] == list(main_ticket_system.getLotteryRoundInfo(1)[2][0])
+    assert main_ticket_system.getRoundParticipants(1, 100, 4) == ([], len(players))
+    with reverts("Invalid lottery round index"):
+        main_ticket_system.getRoundParticipants(2, 0, 4)
+
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [1, 1, 0, 0, 0, 0]
+    main_ticket_system.setBlocksWait(1, 1, {'from': owner_account})
+    chain.mine(1)
+    main_ticket_system.closeLotteryRound({'from': owner_account})
+    chain.mine(1)
+    main_ticket_system.drawLotteryWinner(
+        web3.keccak(text="page_hash_0"), web3.keccak(text="page_strong_hash_1"), [1,2,3,4,5,6], 7, {'from': owner_account})
+
+    # accounts[1] wins the small prize, accounts[2] the big one, the other tickets are used or won the mini prize
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [1, 0, 0, 1, 0, 0]
+    assert main_ticket_system.getTicketCountsByStatus(accounts[2]) == [1, 0, 0, 0, 1, 0]
+    counts = [main_ticket_system.getTicketCountsByStatus(player) for player in players[2:]]
+    assert sum(count[2] for count in counts) == len(players) - 3 and sum(count[5] for count in counts) == 1
@@ -0,0 +1,50 @@
+import numpy as np
+from scripts.simulate_payouts import Traffic, sample_mini_prize_winners, simulate, summarize
+
+
+def test_mini_prize_sampling_follows_softmax_scan():
+    """Participants within SOFTMAX_SPAN hours of the heaviest share the draws, lighter ones only
+    win by the fallback, ineligible ones never; the scan pairs eligible positions with participant
+    indexes, so the last eligible participant takes the place of an ineligible top one"""
+    rng = np.random.default_rng(0)
+    rounds = 20_000
+    weights = np.tile([25, 30, 5], (rounds, 1))
+    wins = sample_mini_prize_winners(weights, np.ones((rounds, 3), dtype=bool), 1, rng).sum(axis=0)
+    assert wins[2] == 0 and wins.sum() == rounds
+    assert 0.9 < wins[1] / wins[0] < 1.1
+
+    eligible = np.tile([True, False, True], (rounds, 1))
+    wins = sample_mini_prize_winners(np.tile([30, 30, 5], (rounds, 1)), eligible, 1, rng).sum(axis=0)
+    assert wins[1] == 0 and wins.sum() == rounds
+    assert 0.9 < wins[2] / wins[0] < 1.1
+
+    every = sample_mini_prize_winners(weights, np.tile([True, True, False], (rounds, 1)), 3, rng)
+    assert (every.sum(axis=1) == 2).all(), "Only the eligible participants can be drawn, once each"
+
+
+def test_simulation_splits_and_hold_time_buckets():
+    """Without big and small winners the commission takes 90% of every pool, the mini prize the
+    rest, and longer held tickets win the mini prize more often; the process pool gives the same totals"""
+    traffic = Traffic(tickets=50, mean_hold_hours=24, big_odds=0, small_odds=0)
+    totals = simulate(traffic, 20_000, workers=1, seed=3, chunk_rounds=5_000)
+    summary = summarize(traffic, totals)
+
+    assert summary["rounds"] == 20_000
+    assert summary["prize_pool_split"]["commission"] == 0.9 and summary["prize_pool_split"]["mini_prize"] == 0.1
+    assert summary["rounds_without_winner"] == {"small": 1.0, "big": 1.0, "mini": 0.0}
+    assert int(totals.bucket_wins.sum()) == 20_000
+    probabilities = [bucket["win_probability"] for bucket in summary["mini_prize_by_hold_time"]]
+    assert probabilities == sorted(probabilities)
+
+    pooled = simulate(traffic, 20_000, workers=2, seed=3, chunk_rounds=5_000)
+    assert (pooled.bucket_wins == totals.bucket_wins).all() and pooled.prizes == totals.prizes
+
+
+def test_simulation_with_certain_winners():
+    """When every ticket wins the small prize none is left for the mini prize, the big and mini
+    pools go to the commission"""
+    traffic = Traffic(tickets=20, big_odds=0, small_odds=1)
+    summary = summarize(traffic, simulate(traffic, 1_000))
+    assert summary["rounds_without_winner"] == {"small": 0.0, "big": 1.0, "mini": 1.0}
+    split = summary["prize_pool_split"]
+    assert split["small_prize"] == 0.3 and split["commission"] == 0.7
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from brownie import accounts, web3
+from eth_account import Account
+from scripts.purchase_pipeline import percentiles, run_pipeline
+from scripts.round_driver import HELD_OPEN_BLOCKS
+from scripts.ticket_client import TicketSystemClient
+
+PLAYERS = 12
+TICKETS_PER_PLAYER = 3
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def test_percentiles():
+    """Nearest-rank percentiles of the latencies"""
+    assert percentiles(list(range(1, 101))) == {"p50": 50, "p90": 90, "p95": 95, "p99": 99, "max": 100}
+    assert percentiles([7]) == {"p50": 7, "p90": 7, "p95": 7, "p99": 7, "max": 7}
+    assert percentiles([]) == {}
+
+
+def test_pipelined_purchases_and_entries(main_ticket_system):
+    """Every pipelined purchase and entry is confirmed, the round holds every ticket and the
+    report covers both stages"""
+    main_ticket_system.setBlocksWait(HELD_OPEN_BLOCKS, 1, {'from': accounts[0]})
+    ticket_price = main_ticket_system.getTicketPrice()
+    players = [Account.create() for _ in range(PLAYERS)]
+    for player in players:
+        accounts[0].transfer(player.address, ticket_price * TICKETS_PER_PLAYER + 10**18)
+
+    async def run():
+        async with await TicketSystemClient.connect(
+                web3.provider.endpoint_uri, main_ticket_system.address, main_ticket_system.abi) as client:
+            return await run_pipeline(client, players, TICKETS_PER_PLAYER, max_in_flight=4)
+
+    purchase, entry = asyncio.run(run())
+    tickets = PLAYERS * TICKETS_PER_PLAYER
+    for report in (purchase, entry):
+        assert (report.transactions, report.confirmed, report.reverted, report.failed) == (tickets, tickets, 0, 0)
+        assert report.tx_per_sec > 0
+        assert report.confirm_latency_ms["p50"] <= report.confirm_latency_ms["p95"] <= report.confirm_latency_ms["max"]
+        assert report.send_latency_ms["max"] <= report.confirm_latency_ms["max"]
+
+    assert main_ticket_system.getCurrentTotalTickets() == tickets
+    assert main_ticket_system.getCurrentPrizePool() == tickets * ticket_price
+    for player in players:
+        assert web3.eth.get_transaction_count(player.address) == 2 * TICKETS_PER_PLAYER
+        assert main_ticket_system.getTicketCountsByStatus(player.address) == [0, TICKETS_PER_PLAYER, 0, 0, 0, 0]
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+from brownie import accounts, web3
+from scripts.randomness_service import Draw, DrawCache, draw_hashes, serve_in_background
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+@pytest.fixture(scope="module")
+def draw_url():
+    """URL of a local randomness service, shut down with the module"""
+    server, url = serve_in_background(DrawCache(size=20, seed=25))
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def fetch_draw(url):
+    """The draw served at `url`, parsed the way contractService.fetchWinningDraw parses it"""
+    with urllib.request.urlopen(url, timeout=5) as response:
+        body = json.loads(json.load(response)["body"])
+    return Draw(
+        bytes.fromhex(body["keccak256_hash_numbers"]),
+        bytes.fromhex(body["keccak256_hash_full"]),
+        body["random_numbers"],
+        body["strong_number"],
+    )
+
+
+def test_draw_hashes_match_validate_hash():
+    """Hashes are sha3_256 of the numbers sorted numerically and joined, then with the strong number"""
+    draw = Draw.of([30, 5, 12, 1, 2, 9], 4)
+    assert draw.numbers == [1, 2, 5, 9, 12, 30]
+    assert draw.hash_numbers == hashlib.sha3_256(b"12591230").digest()
+    assert draw.hash_full == hashlib.sha3_256(b"125912304").digest()
+    assert draw.hash_numbers != web3.keccak(text="12591230"), "validateHash uses sha3_256, not keccak"
+    assert draw_hashes([6, 5, 4, 3, 2, 1], 7) == (hashlib.sha3_256(b"123456").digest(), hashlib.sha3_256(b"1234567").digest())
+
+
+def test_cache_pregenerates_and_refills():
+    """Draws are generated up front, refilled once the cache runs low and reproducible with a seed"""
+    cache = DrawCache(size=8, seed=1)
+    assert len(cache) == 8 and cache.generated == 8
+    draws = [cache.next() for _ in range(7)]
+    assert len(cache) == 8 and cache.generated == 15, "Topped up when the seventh draw left one"
+    assert DrawCache(size=8, seed=1).next() == draws[0]
+    for draw in draws:
+        assert draw.is_valid()
+        assert len(set(draw.numbers)) == 6 and all(1 <= number <= 37 for number in draw.numbers)
+        assert 1 <= draw.strong_number <= 7
+
+
+def test_service_serves_lambda_response(draw_url):
+    """The service answers in the response shape of the remote endpoint, a new valid draw each time"""
+    with urllib.request.urlopen(draw_url, timeout=5) as response:
+        assert response.headers["Access-Control-Allow-Origin"] == "*"
+        data = json.load(response)
+    body = json.loads(data["body"])
+    assert set(body) == {"random_numbers", "strong_number", "keccak256_hash_numbers", "keccak256_hash_full"}
+    assert not body["keccak256_hash_numbers"].startswith("0x") and len(body["keccak256_hash_full"]) == 64
+
+    draws = [fetch_draw(draw_url) for _ in range(3)]
+    assert all(draw.is_valid() for draw in draws)
+    assert len({tuple(draw.numbers) + (draw.strong_number,) for draw in draws}) > 1
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(draw_url.replace("random", "other"), timeout=5)
+
+
+def test_end_to_end_draw(main_ticket_system, draw_url):
+    """A round drawn with a served draw pays the big prize to the ticket entered with its hashes"""
+    draw = fetch_draw(draw_url)
+    winning_ticket = draw_hashes(draw.numbers, draw.strong_number)
+    result = RoundDriver(main_ticket_system, accounts[0]).run(RoundSpec.from_draw(
+        players=[PlayerSpec(accounts[1], hashes=[winning_ticket]), PlayerSpec(accounts[2], tickets=2)],
+        draw=draw,
+        label="served",
+    ))
+
+    assert result.big_prize_winners == [accounts[1].address]
+    assert accounts[2].address not in result.big_prize_winners + result.small_prize_winners
+    assert result.claimed[accounts[1].address] >= result.big_prize
@@ -0,0 +1,191 @@
+import random
+import numpy as np
+import pytest
+from brownie import accounts, web3
+from eth_utils import keccak
+from scripts.reference_model import (
+    HOUR, TicketEntry, classify_winners, hold_time_weights, select_mini_prize_winners, settle_round, settle_rounds,
+    split_prize_pool,
+)
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec
+
+MODEL_ROUNDS = 10_000 # Rounds settled by the vectorized model in one call
+DIFF_ROUNDS = 300 # Rounds of those also settled one by one with the scalar steps
+MAX_TICKETS = 24 # Tickets of a random model round, padded to this many
+MAX_PARTICIPANTS = 8
+TICKET_PRICE = 10**16
+CHAIN_ROUNDS = 20 # Randomized rounds played on chain and diffed against the model
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def test_prize_split_accounts_for_the_whole_pool():
+    """Over random pools and winner counts the prizes and commission add up to the pool and
+    every winner's share of a prize leaves less than one wei per winner undistributed"""
+    rng = np.random.default_rng(0)
+    pools = rng.integers(1, 10_000, MODEL_ROUNDS).astype(object) * 10**18 + rng.integers(0, 10**6, MODEL_ROUNDS)
+    counts = [rng.integers(0, 5, MODEL_ROUNDS) for _ in range(3)]
+    split = split_prize_pool(pools, *counts)
+
+    assert (split.small_prize + split.big_prize + split.mini_prize + split.commission == pools).all()
+    assert (split.commission >= pools * 5 // 100).all()
+    for prize, per_winner, count in zip(
+        (split.small_prize, split.big_prize, split.mini_prize),
+        (split.small_per_winner, split.big_per_winner, split.mini_per_winner),
+        counts,
+    ):
+        assert (prize[count == 0] == 0).all()
+        undistributed = prize - per_winner * count
+        assert (undistributed >= 0).all() and (undistributed < np.maximum(count, 1)).all()
+
+
+def random_rounds(rng, rounds):
+    """settle_rounds arguments of random rounds, empty ones included, with hashes picked among a few
+    so that every prize is won in some rounds and missed in others"""
+    owners = np.full((rounds, MAX_TICKETS), -1, dtype=np.int64)
+    for r in range(rounds):
+        count = rng.integers(0, MAX_TICKETS + 1)
+        labels = rng.integers(0, rng.integers(1, MAX_PARTICIPANTS + 1), count)
+        # Participants numbered in the order of their first entry
+        _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        owners[r, :count] = np.argsort(np.argsort(first))[inverse]
+    number_hashes = np.array([keccak(text=f"model_numbers_{i}") for i in range(3)], dtype=object)
+    strong_hashes = np.array([keccak(text=f"model_strong_{i}") for i in range(3)], dtype=object)
+    draw_times = 1_700_000_000 + rng.integers(0, HOUR, rounds)
+    return dict(
+        owners=owners,
+        creation_timestamps=draw_times[:, None] - rng.integers(0, 72 * HOUR, (rounds, MAX_TICKETS)),
+        ticket_hashes=number_hashes[rng.integers(0, 3, (rounds, MAX_TICKETS))],
+        ticket_hashes_with_strong=strong_hashes[rng.integers(0, 3, (rounds, MAX_TICKETS))],
+        winning_hashes=list(np.append(number_hashes, keccak(text="model_nobody"))[rng.integers(0, 4, rounds)]),
+        winning_strong_hashes=list(np.append(strong_hashes, keccak(text="model_nobody_strong"))[rng.integers(0, 4, rounds)]),
+        draw_times=draw_times,
+        ticket_price=TICKET_PRICE,
+        mini_prize_winners=rng.integers(1, 4, rounds),
+    )
+
+
+def participant_counts(owners, mask):
+    """(rounds, participants) count of the tickets in `mask` owned by every participant"""
+    return ((owners[:, :, None] == np.arange(MAX_PARTICIPANTS)) & mask[:, :, None]).sum(axis=1)
+
+
+def test_settle_rounds_in_one_call():
+    """MODEL_ROUNDS random rounds settled in one call: a ticket wins at most one prize, the mini
+    prizes go to participants with a ticket left, and the credits and the commission account for
+    every pool"""
+    rounds = random_rounds(np.random.default_rng(3), MODEL_ROUNDS)
+    outcome = settle_rounds(**rounds)
+    owners = rounds["owners"]
+    tickets = owners >= 0
+
+    assert not (outcome.big & outcome.small).any() and not ((outcome.big | outcome.small) & ~tickets).any()
+    assert outcome.big.any(axis=1).sum() > 0 and outcome.small.any(axis=1).sum() > 0
+    left = participant_counts(owners, tickets) - participant_counts(owners, outcome.big | outcome.small)
+    mini_counts = (outcome.mini[:, :, None] == np.arange(MAX_PARTICIPANTS)).sum(axis=1)
+    assert (mini_counts <= left).all()
+    assert ((outcome.mini >= 0).sum(axis=1) == np.minimum(rounds["mini_prize_winners"], left.sum(axis=1))).all()
+
+    pools = TICKET_PRICE * tickets.sum(axis=1).astype(object)
+    split = outcome.split
+    assert (split.small_prize + split.big_prize + split.mini_prize + split.commission == pools).all()
+    undistributed = pools - outcome.pending.sum(axis=1) - split.commission
+    winners = (outcome.big | outcome.small).sum(axis=1) + (outcome.mini >= 0).sum(axis=1)
+    assert (undistributed >= 0).all() and (undistributed < np.maximum(winners, 1)).all()
+
+
+def test_settle_rounds_match_the_scalar_model():
+    """Rounds settled in one call are the rounds settled one by one with the scalar steps, and
+    settle_round gives the same winners and credits from the round's entries"""
+    rounds = random_rounds(np.random.default_rng(4), DIFF_ROUNDS)
+    outcome = settle_rounds(**rounds)
+    for r in range(DIFF_ROUNDS):
+        count = int((rounds["owners"][r] >= 0).sum())
+        owners = rounds["owners"][r, :count]
+        participants = int(owners.max(initial=-1)) + 1
+        hashes, strong_hashes = rounds["ticket_hashes"][r, :count], rounds["ticket_hashes_with_strong"][r, :count]
+        winning_hash, winning_strong_hash = rounds["winning_hashes"][r], rounds["winning_strong_hashes"][r]
+        draw_time, draws = int(rounds["draw_times"][r]), int(rounds["mini_prize_winners"][r])
+
+        big, small = classify_winners(hashes, strong_hashes, winning_hash, winning_strong_hash)
+        assert (outcome.big[r, :count] == big).all() and (outcome.small[r, :count] == small).all()
+        ticket_counts = np.bincount(owners, minlength=participants)
+        wins = np.bincount(owners[big | small], minlength=participants)
+        weights = hold_time_weights(owners, rounds["creation_timestamps"][r, :count], draw_time, participants)
+        mini = select_mini_prize_winners(weights, ticket_counts, wins, winning_hash, winning_strong_hash, draw_time, draws)
+        assert list(outcome.mini[r][outcome.mini[r] >= 0]) == mini
+
+        split = split_prize_pool(TICKET_PRICE * count, int(small.sum()), int(big.sum()), len(mini))
+        assert [getattr(outcome.split, name)[r] for name in vars(split)] == list(vars(split).values())
+        pending = (np.bincount(owners[small], minlength=participants) * split.small_per_winner
+                   + np.bincount(owners[big], minlength=participants) * split.big_per_winner
+                   + np.bincount(mini, minlength=participants) * split.mini_per_winner)
+        assert list(outcome.pending[r, :participants]) == list(pending)
+
+        names = [f"participant_{owner}" for owner in owners]
+        entries = [
+            TicketEntry(name, ticket_id, int(created), ticket_hash, strong_hash)
+            for ticket_id, (name, created, ticket_hash, strong_hash)
+            in enumerate(zip(names, rounds["creation_timestamps"][r, :count], hashes, strong_hashes))
+        ]
+        single = settle_round(entries, TICKET_PRICE, winning_hash, winning_strong_hash, draw_time, draws)
+        assert single.big_prize_winners == [name for name, won in zip(names, big) if won]
+        assert single.small_prize_winners == [name for name, won in zip(names, small) if won]
+        assert single.mini_prize_winners == [f"participant_{winner}" for winner in mini]
+        assert single.split == split
+        assert single.pending == {f"participant_{index}": amount for index, amount in enumerate(pending)
+                                  if f"participant_{index}" in single.big_prize_winners + single.small_prize_winners
+                                  + single.mini_prize_winners}
+
+
+def test_randomized_rounds_match_chain(main_ticket_system):
+    """Winners, prizes, commission and pending prizes of random rounds played on chain are the model's"""
+    rng = random.Random(2)
+    owner = accounts[0]
+    driver = RoundDriver(main_ticket_system, owner)
+    ticket_price = main_ticket_system.getTicketPrice()
+
+    for round_index in range(CHAIN_ROUNDS):
+        number_hashes = [web3.keccak(text=f"diff_{round_index}_numbers_{i}") for i in range(3)]
+        strong_hashes = [web3.keccak(text=f"diff_{round_index}_strong_{i}") for i in range(3)]
+        players = []
+        for account in rng.sample(list(accounts[1:10]), rng.randint(1, 6)):
+            tickets = rng.randint(1, 4)
+            hashes = [(rng.choice(number_hashes), rng.choice(strong_hashes)) for _ in range(tickets)]
+            players.append(PlayerSpec(account, tickets=tickets, hashes=hashes))
+        winning_hash = rng.choice(number_hashes + [web3.keccak(text="diff_nobody")])
+        winning_strong_hash = rng.choice(strong_hashes + [web3.keccak(text="diff_nobody_strong")])
+        mini_prize_winners = rng.randint(1, 3)
+        main_ticket_system.setMiniPrizeWinners(mini_prize_winners, {'from': owner})
+        pending_before = {account.address: main_ticket_system.getPendingPrize(account) for account in accounts[:10]}
+
+        result = driver.run(RoundSpec(
+            players=players,
+            winning_hash=winning_hash,
+            winning_strong_hash=winning_strong_hash,
+            label=f"diff_{round_index}",
+            claim=False,
+        ))
+
+        entries = []
+        for player in players:
+            creation_timestamps = {ticket[0]: ticket[2] for ticket in main_ticket_system.getPlayerTickets(player.account)}
+            entries += [
+                TicketEntry(player.account.address, ticket_id, creation_timestamps[ticket_id], ticket_hash, strong_hash)
+                for ticket_id, (ticket_hash, strong_hash) in zip(result.ticket_ids[player.account.address], player.hashes)
+            ]
+        draw_time = web3.eth.get_block(result.draw_txs[0].block_number).timestamp
+        outcome = settle_round(entries, ticket_price, winning_hash, winning_strong_hash, draw_time,
+                               mini_prize_winners, commission_recipient=owner.address)
+
+        assert result.big_prize_winners == outcome.big_prize_winners
+        assert result.small_prize_winners == outcome.small_prize_winners
+        assert result.mini_prize_winners == outcome.mini_prize_winners
+        assert (result.big_prize, result.small_prize, result.mini_prize, result.commission) == (
+            outcome.split.big_prize, outcome.split.small_prize, outcome.split.mini_prize, outcome.split.commission)
+        for address, before in pending_before.items():
+            assert main_ticket_system.getPendingPrize(address) - before == outcome.pending.get(address, 0)
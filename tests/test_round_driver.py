@@ -0,0 +1,66 @@
+import pytest
+from brownie import accounts
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec, ticket_hashes
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def test_round_driver_full_round(main_ticket_system):
+    """A spec'd round is bought, entered, drawn and claimed, the result reports winners and prizes"""
+    driver = RoundDriver(main_ticket_system, accounts[0])
+    result = driver.run(RoundSpec(
+        players=[PlayerSpec(accounts[1], tickets=3), PlayerSpec(accounts[2])],
+        winning_hash=ticket_hashes("full", accounts[2], 0)[0],
+        winning_strong_hash=ticket_hashes("full", accounts[1], 0)[1],
+        label="full",
+    ))
+
+    ticket_price = main_ticket_system.getTicketPrice()
+    assert result.round_number == 1
+    assert result.total_tickets == 4 and result.total_prize_pool == 4 * ticket_price
+    assert len(result.ticket_ids[accounts[1].address]) == 3
+    assert result.big_prize_winners == [accounts[1].address]
+    assert result.small_prize_winners == [accounts[2].address]
+    assert len(result.purchase_txs) == 2 and len(result.entry_txs) == 2, "Each player buys and enters in one transaction"
+
+    assert result.claimed[accounts[1].address] >= result.big_prize
+    assert result.claimed[accounts[2].address] >= result.small_prize
+    for winner in result.winners:
+        assert main_ticket_system.getPendingPrize(winner) == 0
+    assert main_ticket_system.isLotteryActive() and main_ticket_system.getCurrentRound() == 2
+
+
+def test_round_driver_batches_and_steps(main_ticket_system):
+    """Purchases are split at max_batch and the draw can run in steps, rounds follow each other"""
+    driver = RoundDriver(main_ticket_system, accounts[0], max_batch=2)
+    players = [PlayerSpec(accounts[1], tickets=5), PlayerSpec(accounts[3], tickets=2)]
+    first = driver.run(RoundSpec(
+        players=players,
+        winning_hash=ticket_hashes("steps", accounts[3], 1)[0],
+        winning_strong_hash=ticket_hashes("steps", accounts[1], 4)[1],
+        label="steps",
+        draw_step_tickets=1,
+        claim=False,
+    ))
+    assert len(first.purchase_txs) == 3 + 1
+    assert first.ticket_ids[accounts[1].address] == sorted(first.ticket_ids[accounts[1].address])
+    # One big winner, one small winner, two participants weighed and put in the mini prize tree,
+    # the mini prize draw and the credits of the small, big and mini prize winners
+    assert len(first.draw_txs) == 1 + 1 + 2 + 2 + 1 + 3
+    assert first.claim_txs == [] and first.claimed == {}
+    assert main_ticket_system.getPendingPrize(accounts[1]) > 0
+
+    second = driver.run(RoundSpec(
+        players=players,
+        winning_hash=ticket_hashes("second", accounts[0], 0)[0],
+        winning_strong_hash=ticket_hashes("second", accounts[0], 0)[1],
+        label="second",
+    ))
+    assert second.round_number == first.round_number + 1
+    assert second.big_prize_winners == [] and second.small_prize_winners == []
+    assert len(second.mini_prize_winners) == 1
+    assert main_ticket_system.getBlocksWait()[0] == 4, "The driver restores the close wait"
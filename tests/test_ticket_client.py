@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from brownie import accounts, web3
+from eth_account import Account
+from web3.exceptions import ContractLogicError, Web3RPCError
+from scripts.ticket_client import ReceiptPolling, TicketSystemClient
+
+PURCHASES_PER_SENDER = 5
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def connect(main_ticket_system, uri=None, senders=()):
+    return TicketSystemClient.connect(uri or web3.provider.endpoint_uri, main_ticket_system.address, main_ticket_system.abi, senders)
+
+
+def test_concurrent_senders(main_ticket_system):
+    """Purchases sent concurrently by unlocked and locally signing senders all get mined, with
+    every sender's nonces in sequence, and the batched reads match the chain"""
+    signer = Account.create()
+    accounts[0].transfer(signer.address, "20 ether")
+    senders = [account.address for account in accounts[1:5]] + [signer]
+
+    async def purchase():
+        async with await connect(main_ticket_system, senders=senders) as client:
+            price = await client.call("getTicketPrice")
+            tx_hashes = await asyncio.gather(*[
+                client.transact("purchaseTickets", 2, sender=sender, value=2 * price)
+                for _ in range(PURCHASES_PER_SENDER) for sender in senders
+            ])
+            receipts = await asyncio.gather(*[client.wait_for_receipt(tx_hash) for tx_hash in tx_hashes])
+            reads = await client.batch_call([("getCurrentRound",)] + [("getPlayerTickets", getattr(s, "address", s)) for s in senders])
+            return tx_hashes, receipts, reads
+
+    tx_hashes, receipts, (current_round, *player_tickets) = asyncio.run(purchase())
+    assert all(receipt["status"] == 1 for receipt in receipts)
+    sent = [web3.eth.get_transaction(tx_hash) for tx_hash in tx_hashes]
+    for sender in senders:
+        nonces = sorted(tx["nonce"] for tx in sent if tx["from"] == getattr(sender, "address", sender))
+        assert nonces == list(range(nonces[0], nonces[0] + PURCHASES_PER_SENDER))
+
+    assert current_round == main_ticket_system.getCurrentRound()
+    for sender, tickets in zip(senders, player_tickets):
+        address = getattr(sender, "address", sender)
+        assert [ticket[0] for ticket in tickets] == [ticket[0] for ticket in main_ticket_system.getPlayerTickets(address)]
+        assert len(tickets) == 2 * PURCHASES_PER_SENDER
+    assert len({ticket[0] for tickets in player_tickets for ticket in tickets}) == 2 * PURCHASES_PER_SENDER * len(senders)
+
+
+def test_failed_send_and_receipt_timeout(main_ticket_system):
+    """A reverting transaction does not leave a gap in the sender's nonces, and waiting for an
+    unknown transaction gives up after the polling timeout"""
+    async def scenario():
+        async with await connect(main_ticket_system) as client:
+            price = await client.call("getTicketPrice")
+            with pytest.raises((ContractLogicError, Web3RPCError)):
+                await client.transact("purchaseTickets", 2, sender=accounts[5].address, value=price)
+            receipt = await client.transact_and_wait("purchaseTickets", 2, sender=accounts[5].address, value=2 * price)
+            with pytest.raises(TimeoutError):
+                await client.wait_for_receipt(bytes(32), ReceiptPolling(interval=0.01, timeout=0.2))
+            return receipt
+
+    receipt = asyncio.run(scenario())
+    assert receipt["status"] == 1
+    assert len(main_ticket_system.getPlayerTickets(accounts[5])) == 2
+
+
+def test_websocket_connection(main_ticket_system):
+    """The client works the same over the node's WebSocket endpoint"""
+    uri = web3.provider.endpoint_uri.replace("http", "ws", 1)
+
+    async def scenario():
+        async with await connect(main_ticket_system, uri) as client:
+            price, = await client.batch_call([("getTicketPrice",)])
+            receipt = await client.transact_and_wait("purchaseTicket", sender=accounts[6].address, value=price)
+            return price, receipt
+
+    price, receipt = asyncio.run(scenario())
+    assert price == main_ticket_system.getTicketPrice() and receipt["status"] == 1
+    assert len(main_ticket_system.getPlayerTickets(accounts[6])) == 1
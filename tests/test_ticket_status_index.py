@@ -0,0 +1,53 @@
+import pytest
+from brownie import accounts, web3
+from scripts.round_driver import RoundDriver, RoundSpec, PlayerSpec
+
+USED_TICKETS = 1_000
+ACTIVE_TICKETS = 3
+CONSTANT_GAS_MARGIN = 5_000 # Gas a lookup may grow by between a fresh player and one with a long history
+
+
+@pytest.fixture(scope="module")
+def main_ticket_system(module_isolation, ticket_system_contract):
+    """Fixture to deploy the ticket system selected with --ticket-system once per module"""
+    return ticket_system_contract.deploy({'from': accounts[0]})
+
+
+def view_gas(method, sender, *args):
+    """Gas of a view call made by `sender`"""
+    return web3.eth.estimate_gas({'from': sender.address, 'to': method._address, 'data': method.encode_input(*args)})
+
+
+def test_active_tickets_cost_independent_of_history(main_ticket_system):
+    """Active tickets and status counts of a player with 1,000 USED tickets cost as much gas as
+    those of a player holding only its 3 active tickets"""
+    # A single player fills the round, so the mini prize goes to one of its tickets and the rest are USED
+    RoundDriver(main_ticket_system, accounts[0]).run(RoundSpec(
+        players=[PlayerSpec(accounts[1], tickets=USED_TICKETS + 1)],
+        winning_hash=web3.keccak(text="no_ticket_hash"),
+        winning_strong_hash=web3.keccak(text="no_ticket_strong_hash"),
+        label="history",
+        claim=False,
+    ))
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [0, 0, USED_TICKETS, 0, 0, 1]
+
+    ticket_price = main_ticket_system.getTicketPrice()
+    active = {}
+    for player in (accounts[1], accounts[2]):
+        tx = main_ticket_system.purchaseTickets(ACTIVE_TICKETS, {'from': player, 'value': ticket_price * ACTIVE_TICKETS})
+        active[player] = list(tx.return_value)
+        assert sorted(main_ticket_system.getActiveTickets({'from': player})) == active[player]
+
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [ACTIVE_TICKETS, 0, USED_TICKETS, 0, 0, 1]
+    for method, args in ((main_ticket_system.getActiveTickets, ()), (main_ticket_system.getTicketCountsByStatus, (accounts[1],))):
+        with_history = view_gas(method, accounts[1], *args)
+        fresh = view_gas(method, accounts[2], *(accounts[2],) * len(args))
+        assert with_history - fresh < CONSTANT_GAS_MARGIN, f"{method.abi['name']}: {with_history} gas against {fresh}"
+
+    # Entering the middle ticket moves the last one into its place
+    main_ticket_system.setBlocksWait(100, 1, {'from': accounts[0]})
+    first, middle, last = active[accounts[1]]
+    main_ticket_system.selectTicketsForLottery(
+        middle, web3.keccak(text="index_hash"), web3.keccak(text="index_strong_hash"), {'from': accounts[1]})
+    assert list(main_ticket_system.getActiveTickets({'from': accounts[1]})) == [first, last]
+    assert main_ticket_system.getTicketCountsByStatus(accounts[1]) == [ACTIVE_TICKETS - 1, 1, USED_TICKETS, 0, 0, 1]